@@ -1,15 +1,27 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from sklearn.ensemble import IsolationForest
 
 import sys
 import os
+import time
+from datetime import date, timedelta
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from db_utils import get_all_activity_as_df
+from db_utils import (IncrementalActivityLoader, count_alerts, get_alert_heatmap, get_alert_histogram,
+                      get_alert_users, get_alert_watermark, get_current_data_version, get_hourly_rollup_as_df,
+                      get_user_baselines, query_alerts)
+from chart_data import RISK_BINS, alert_heatmap, bucket_counts_to_histogram, heatmap_frame, risk_histogram
+from results_cache import get_results_cache
 from navigation import render_sidebar
+from alert_view import filter_frame, page_of, render_alert_filters, render_page_picker, style_risk
+from parallel_scoring import DEFAULT_WORKERS
+from baselines import DEFAULT_Z_THRESHOLD
+from engine import BaselineDetector, IsolationForestDetector, RuleDetector, detect
+from windowing import WINDOWS, WindowAggregator, windowed_view
+from archive import archive_date_range, read_activity
+from instrumentation import finish_profile, maybe_write_metrics, observe, span, start_profile
+# scikit-learn (ml_engine) and plotly.express are imported where they are used,
+# so sessions that never pick the ML engine or draw a chart don't pay for them.
 
 # Render the custom sidebar
 render_sidebar()
@@ -25,95 +37,201 @@ if st.session_state.get('role') != 'Admin':
     st.info("This page is for Administrators only.")
     st.stop()
 
-# --- HELPER & DETECTION LOGIC ---
-@st.cache_data
-def convert_df_to_csv(df):
-    return df.to_csv(index=False).encode('utf-8')
-
-def style_risk(df):
-    """Applies color styling to the DataFrame based on Risk Score."""
-    def get_color(score):
-        if score > 0.66:
-            return 'background-color: #ff4d4d; color: white;' # High Risk - Red
-        elif score > 0.33:
-            return 'background-color: #ffa500;' # Medium Risk - Orange
+# --- INSTRUMENTATION ---
+# The Diagnostics page can ask for this session's next run to be profiled.
+run_started = time.perf_counter()
+profiler = start_profile() if st.session_state.pop('profile_next_run', False) else None
+
+def finish_run():
+    """Records this run's total time, ends a requested profile and refreshes the metrics file.
+
+    Called from the finally below, so st.stop, a rerun or an error never leaves the profiler enabled.
+    """
+    observe('page.threat_dashboard', time.perf_counter() - run_started)
+    if profiler:
+        finish_profile(profiler, "Threat Dashboard")
+    maybe_write_metrics()
+
+try:
+    # --- HELPER & DETECTION LOGIC ---
+    @st.cache_resource
+    def get_activity_loader():
+        """One incremental loader shared by every session, so reruns only fetch new rows."""
+        return IncrementalActivityLoader()
+
+    @st.cache_resource
+    def get_window_aggregator():
+        """Window features shared by every session, extended only for new rows."""
+        return WindowAggregator()
+
+    @st.cache_data
+    def convert_df_to_csv(df):
+        return df.to_csv(index=False).encode('utf-8')
+
+    # --- SIDEBAR CONTROLS ---
+    with st.sidebar:
+        st.title("🛡️ Threat Detection Engine")
+        detection_method = st.radio("Select Detection Method", ("Rule-Based Engine", "Machine Learning Engine", "Baseline Deviation Engine", "Real-Time Alerts"))
+        score_hourly = st.checkbox("Score hourly per-user totals", help="Scores the per-user, per-hour rollup instead of individual events.")
+        history = None
+        archived = archive_date_range()
+        if archived and not score_hourly and detection_method != "Real-Time Alerts":
+            dates = st.date_input("Include archived history", value=(), min_value=date.fromisoformat(archived[0]),
+                                  help="Also score archived activity between these dates; only those Parquet partitions are read.")
+            if len(dates) == 2:
+                history = (dates[0].strftime("%Y-%m-%d"), (dates[1] + timedelta(days=1)).strftime("%Y-%m-%d"))
+        window = "Per event"
+        if not score_hourly and history is None and detection_method in ("Rule-Based Engine", "Machine Learning Engine"):
+            window = st.selectbox("Aggregation Window", ("Per event", *WINDOWS),
+                                  help="Sum each user's counters over a trailing window so bursts are scored as bursts.")
+        if detection_method == "Rule-Based Engine":
+            thresholds = {
+                'late_hour': st.slider("Late Hour", 20, 23, 22), 'early_hour': st.slider("Early Hour", 0, 6, 5),
+                'files_accessed': st.slider("File Access", 10, 100, 40), 'emails_sent': st.slider("Email Volume", 10, 100, 50),
+                'usb_devices': st.slider("USB Count", 1, 5, 2)
+            }
+        elif detection_method == "Baseline Deviation Engine":
+            z_threshold = st.slider("Deviation (std devs)", 1.0, 6.0, DEFAULT_Z_THRESHOLD, 0.5,
+                                    help="Flag events this many standard deviations above the user's own average.")
+        elif detection_method == "Machine Learning Engine":
+            contamination_rate = st.slider("Anomaly Rate (%)", 1, 25, 10) / 100
+            scoring_workers = st.number_input("Scoring Workers", 1, os.cpu_count() or 1, min(DEFAULT_WORKERS, os.cpu_count() or 1),
+                                              help="CPU cores used to train and score the model.")
+            online = False
+            if not score_hourly and history is None:
+                online = st.checkbox("Learn online", help="Keep a sliding-window ensemble current with new activity "
+                                                           "instead of refitting on the whole log.")
+            retrain = st.button("Retrain Model", help="Fit a new model on the current activity log." if not online
+                                else "Rebuild the online model from the most recent activity.")
         else:
-            return 'background-color: #ffe4b2;' # Low Risk - Light Orange
-            
-    return df.style.applymap(get_color, subset=['Risk_Score'])
-
-def detect_threats_rules(df, thresholds):
-    df['Risk_Score'] = 0
-    df['Reason'] = ''
-    score_increment = 1.0 / len(thresholds)
-    rule1 = (df['Login_Hour'] >= thresholds['late_hour']) | (df['Login_Hour'] <= thresholds['early_hour'])
-    df.loc[rule1, 'Risk_Score'] += score_increment; df.loc[rule1, 'Reason'] += 'Unusual Login; '
-    rule2 = df['Files_Accessed'] > thresholds['files_accessed']
-    df.loc[rule2, 'Risk_Score'] += score_increment; df.loc[rule2, 'Reason'] += 'Excessive Files; '
-    rule3 = df['Emails_Sent'] > thresholds['emails_sent']
-    df.loc[rule3, 'Risk_Score'] += score_increment; df.loc[rule3, 'Reason'] += 'High Emails; '
-    rule4 = df['USB_Devices_Used'] >= thresholds['usb_devices']
-    df.loc[rule4, 'Risk_Score'] += score_increment; df.loc[rule4, 'Reason'] += 'Multiple USBs; '
-    suspicious_df = df[df['Risk_Score'] > 0].copy()
-    suspicious_df['Reason'] = suspicious_df['Reason'].str.strip().str.rstrip(';')
-    return suspicious_df.sort_values(by='Risk_Score', ascending=False)
-
-def detect_threats_ml(df, contamination=0.1):
-    features = ['Login_Hour', 'Files_Accessed', 'Emails_Sent', 'USB_Devices_Used']
-    X = df[features]
-    model = IsolationForest(contamination=contamination, random_state=42)
-    df['Anomaly'] = model.fit_predict(X)
-    df['Risk_Score'] = model.decision_function(X)
-    df['Risk_Score'] = (df['Risk_Score'].min() - df['Risk_Score']) / (df['Risk_Score'].min() - df['Risk_Score'].max())
-    suspicious_df = df[df['Anomaly'] == -1].copy()
-    suspicious_df['Reason'] = 'ML Anomaly Detected'
-    return suspicious_df.sort_values(by='Risk_Score', ascending=False)
-
-# --- SIDEBAR CONTROLS ---
-with st.sidebar:
-    st.title("🛡️ Threat Detection Engine")
-    detection_method = st.radio("Select Detection Method", ("Rule-Based Engine", "Machine Learning Engine"))
-    if detection_method == "Rule-Based Engine":
-        thresholds = {
-            'late_hour': st.slider("Late Hour", 20, 23, 22), 'early_hour': st.slider("Early Hour", 0, 6, 5),
-            'files_accessed': st.slider("File Access", 10, 100, 40), 'emails_sent': st.slider("Email Volume", 10, 100, 50),
-            'usb_devices': st.slider("USB Count", 1, 5, 2)
-        }
+            st.caption("Alerts raised by the rule engine as each event was logged, using the default thresholds.")
+        cache_stats = get_results_cache().stats()
+        st.caption(f"Results cache: {cache_stats['hits']:,} hits · {cache_stats['misses']:,} misses · "
+                   f"{cache_stats['bytes'] / 2**20:.1f} MiB")
+
+    # --- MAIN PANEL ---
+    st.title("📊 Insider Threat Dashboard")
+    if score_hourly:
+        data_version = get_current_data_version()
+        df = get_hourly_rollup_as_df()
+    elif history:
+        # Archived plus live rows in the chosen range; cached until activity is logged or archived.
+        data_version = (*get_current_data_version(), *history)
+        df = get_results_cache().get_or_compute((data_version, 'history'), lambda: read_activity(*history)).copy(deep=False)
     else:
-        contamination_rate = st.slider("Anomaly Rate (%)", 1, 25, 10) / 100
+        df, data_version = get_activity_loader().snapshot()
+        if window != "Per event":
+            df = windowed_view(get_window_aggregator().update(df, data_version), window)
 
-# --- MAIN PANEL ---
-st.title("📊 Insider Threat Dashboard")
-df = get_all_activity_as_df()
+    # Results are shared across sessions and reused until new activity is logged.
+    results_cache = get_results_cache()
+    results_cache.retain_version(data_version)
+    view = 'hourly' if score_hourly else ('history', *history) if history else window
 
-if df.empty:
-    st.warning("No activity logged yet. Use the simulation pages to generate data.")
-    st.stop()
+    if df.empty:
+        st.warning("No activity logged yet. Use the simulation pages to generate data.")
+        st.stop()
 
-if detection_method == "Rule-Based Engine":
-    suspicious_df = detect_threats_rules(df, thresholds)
-else:
-    suspicious_df = detect_threats_ml(df, contamination_rate)
-
-st.markdown("### 📈 Dashboard Overview")
-col1, col2 = st.columns([1, 1])
-with col1:
-    st.metric("Total Activities Logged", f"{len(df):,}")
-    st.metric("Alerts Generated", f"{len(suspicious_df):,}")
-with col2:
-    if not suspicious_df.empty:
-        fig = px.histogram(suspicious_df, x='Risk_Score', nbins=20, title='Distribution of Alert Risk Scores', color_discrete_sequence=['#ff4d4d'])
-        st.plotly_chart(fig, width='stretch')
+    realtime = detection_method == "Real-Time Alerts"
+    if detection_method == "Rule-Based Engine":
+        # Reasons are decoded later, for the rows on the current page only.
+        results_key = (data_version, 'rules', view, tuple(sorted(thresholds.items())))
+        suspicious_df = results_cache.get_or_compute(
+            results_key,
+            lambda: detect(df, [RuleDetector(thresholds, with_reasons=False)]))
+    elif detection_method == "Baseline Deviation Engine":
+        results_key = (data_version, 'baseline', view, z_threshold)
+        suspicious_df = results_cache.get_or_compute(
+            results_key,
+            lambda: detect(df, [BaselineDetector(*get_user_baselines(), z_threshold=z_threshold)]))
+    elif realtime:
+        # Scored at ingest time by the alert worker; counts and charts come from SQL, rows are paged below.
+        suspicious_df = None
+    else:
+        from ml_engine import MODELS_DIR, get_model, get_online_model
+
+        # Hourly and windowed totals live on a different scale, so they get their own models.
+        models_dir = MODELS_DIR
+        if score_hourly:
+            models_dir = os.path.join(MODELS_DIR, 'hourly')
+        elif window != "Per event":
+            models_dir = os.path.join(MODELS_DIR, f'window_{window}')
+        if online:
+            # Only rows logged since the last run are learned from; the loader keeps them in arrival order.
+            model, model_info = get_online_model(df, contamination_rate, models_dir, data_epoch=data_version[0],
+                                                 reset=retrain)
+            st.sidebar.caption(f"Online model {model_info['version']}: {model_info['members']} member(s) over the "
+                               f"latest {min(model_info['row_count'], model_info['window_rows']):,} rows, "
+                               f"updated at {model_info['trained_at']}")
+        else:
+            model, model_info = get_model(df, contamination_rate, force_retrain=retrain, models_dir=models_dir,
+                                          n_workers=scoring_workers)
+            st.sidebar.caption(f"Model {model_info['version']} trained on {model_info['row_count']:,} rows at {model_info['trained_at']}")
+        results_key = (data_version, 'ml', view, model_info['version'])
+        suspicious_df = results_cache.get_or_compute(
+            results_key,
+            lambda: detect(df, [IsolationForestDetector(model, n_workers=scoring_workers)]))
+
+    # Charts are pre-aggregated server-side and cached with the results, so the
+    # browser only receives RISK_BINS bars and a users x 24 heatmap.
+    if realtime:
+        alerts_key = (data_version, 'alerts', get_alert_watermark())
+        alert_count, histogram, heatmap = results_cache.get_or_compute(alerts_key, lambda: (
+            count_alerts(),
+            bucket_counts_to_histogram(get_alert_histogram(RISK_BINS)),
+            heatmap_frame(get_alert_heatmap()),
+        ))
+    else:
+        alert_count = len(suspicious_df)
+        histogram, heatmap = results_cache.get_or_compute(
+            (*results_key, 'charts'),
+            lambda: (risk_histogram(suspicious_df['Risk_Score']), alert_heatmap(suspicious_df)))
+
+    if alert_count:
+        import plotly.express as px
+
+    st.markdown("### 📈 Dashboard Overview")
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        total_activities = int(df['Event_Count'].sum()) if score_hourly else len(df)
+        st.metric("Total Activities Logged", f"{total_activities:,}")
+        st.metric("Alerts Generated", f"{alert_count:,}")
+    with col2:
+        if alert_count:
+            with span('render.charts'):
+                fig = px.bar(histogram, x='bin_start', y='count', title='Distribution of Alert Risk Scores',
+                             labels={'bin_start': 'Risk_Score', 'count': 'Alerts'}, color_discrete_sequence=['#ff4d4d'])
+                fig.update_traces(width=1.0 / RISK_BINS, offset=0)
+                st.plotly_chart(fig, width='stretch')
+        else:
+            st.info("No alerts to display.")
+    if alert_count and not heatmap.empty:
+        with span('render.charts'):
+            fig = px.imshow(heatmap, labels={'x': 'Login Hour', 'y': 'User', 'color': 'Alerts'}, aspect='auto',
+                            title='Alerts per User and Hour', color_continuous_scale='Reds')
+            st.plotly_chart(fig, width='stretch')
+
+    st.markdown("### 🚨 Alert Log")
+    if alert_count:
+        if realtime:
+            filters = render_alert_filters(get_alert_users())
+            sort = filters.pop('sort')
+            page, page_size = render_page_picker(count_alerts(**filters))
+            page_df = query_alerts(sort, page, page_size, **filters)
+        else:
+            user_column = 'username' if 'username' in suspicious_df.columns else 'User_ID'
+            filters = render_alert_filters(sorted(suspicious_df[user_column].astype(str).unique()))
+            filtered_df = filter_frame(suspicious_df, **filters)
+            page, page_size = render_page_picker(len(filtered_df))
+            page_df = page_of(filtered_df, page, page_size)
+
+        # Only the visible page is styled and sent to the browser; Login_Hour is left out of the table.
+        display_df = page_df.drop(columns=['Login_Hour', 'Reason_Mask'], errors='ignore')
+        # The Styler is applied while the table is serialized, so this span covers styling too.
+        with span('render.table') as s:
+            st.dataframe(style_risk(display_df), use_container_width=True)
+            s.add(rows=len(display_df))
     else:
-        st.info("No alerts to display.")
-
-st.markdown("### 🚨 Alert Log")
-if not suspicious_df.empty:
-    # New code
-# Create a new DataFrame for display that excludes the 'Login_Hour' column
-    display_df = suspicious_df.drop(columns=['Login_Hour'])
-
-# Display the styled version of the new DataFrame
-    st.dataframe(style_risk(display_df), use_container_width=True)
-else:
-    st.success("✅ No threats detected with the current settings.")
\ No newline at end of file
+        st.success("✅ No threats detected with the current settings.")
+finally:
+    finish_run()
\ No newline at end of file
@@ -6,7 +6,7 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Now the imports for your custom modules will work
-from db_utils import log_activity
+from db_utils import log_activity, log_activities_bulk
 from navigation import render_sidebar
 from datetime import datetime
 
@@ -46,9 +46,11 @@ with col2:
 
 st.markdown("---")
 st.subheader("🔥 High-Risk Simulation")
-if st.button("Send 50 Emails to External Address"):
+# The alert rule fires when a user's 1-hour email total is above 50, so the burst must exceed it.
+BURST_EMAILS = 60
+if st.button(f"Send {BURST_EMAILS} Emails to External Address"):
     current_hour = datetime.now().hour
-    for _ in range(50):
-        log_activity(username, current_hour, 0, 1, 0)
-    st.warning("Logged sending 50 separate emails. This should trigger an alert.")
+    log_activities_bulk([(username, current_hour, 0, 1, 0)] * BURST_EMAILS)
+    st.warning(f"Logged sending {BURST_EMAILS} separate emails. Their 1-hour total is above the 50-email "
+               "rule, so this should trigger an alert.")
     st.rerun()
\ No newline at end of file
@@ -6,7 +6,7 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Now the imports for your custom modules will work
-from db_utils import log_activity
+from db_utils import get_activity_buffer
 from navigation import render_sidebar
 from datetime import datetime
 import random
@@ -35,14 +35,14 @@ for file in files:
         if st.button("Download", key=f"download_{file}"):
             files_accessed = random.randint(1, 5)
             current_hour = datetime.now().hour
-            log_activity(username, current_hour, files_accessed, 0, 0)
+            get_activity_buffer().append(username, current_hour, files_accessed, 0, 0)
             st.success(f"'{file}' downloaded. Logged access of {files_accessed} files.")
             st.rerun()
     with col3:
         if st.button("Copy to USB", key=f"usb_{file}"):
             files_accessed = random.randint(1, 5)
             current_hour = datetime.now().hour
-            log_activity(username, current_hour, files_accessed, 0, 1)
+            get_activity_buffer().append(username, current_hour, files_accessed, 0, 1)
             st.warning(f"'{file}' copied to USB. High-risk activity logged.")
             st.rerun()
 
@@ -51,6 +51,6 @@ st.subheader("🔥 High-Risk Simulation")
 if st.button("Download All Project Files at 3 AM"):
     suspicious_hour = 3
     files_to_log = random.randint(100, 150)
-    log_activity(username, suspicious_hour, files_to_log, 0, 0)
+    get_activity_buffer().append(username, suspicious_hour, files_to_log, 0, 0)
     st.warning(f"Simulated mass download of {files_to_log} files at {suspicious_hour}:00.")
     st.rerun()
\ No newline at end of file
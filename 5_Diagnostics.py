@@ -0,0 +1,134 @@
+import streamlit as st
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import instrumentation
+import maintenance
+from navigation import render_sidebar
+from results_cache import get_results_cache
+
+# Render the custom sidebar
+render_sidebar()
+
+st.set_page_config(page_title="Diagnostics", page_icon="🩺", layout="wide")
+
+# --- ROLE-BASED ACCESS CONTROL ---
+if not st.session_state.get('logged_in'):
+    st.error("Please log in first to access diagnostics.")
+    st.stop()
+if st.session_state.get('role') != 'Admin':
+    st.error("🔒 You do not have permission to view this page.")
+    st.info("This page is for Administrators only.")
+    st.stop()
+
+# Creating the cache registers its gauges even before the dashboard has run.
+get_results_cache()
+
+st.title("🩺 Diagnostics")
+if not instrumentation.ENABLED:
+    st.warning("Instrumentation is off (INSTRUMENTATION=0); only the profiler below is available.")
+
+# --- PROFILING ---
+st.markdown("### 🔬 Profile a Dashboard Run")
+col1, col2 = st.columns([1, 2])
+with col1:
+    if st.button("Profile my next Threat Dashboard run"):
+        st.session_state['profile_next_run'] = True
+    if st.session_state.get('profile_next_run'):
+        st.info("Your next Threat Dashboard run will be captured with cProfile.")
+        st.page_link("pages/1_Threat_Dashboard.py", label="Open the Threat Dashboard", icon="📊")
+with col2:
+    profiles = instrumentation.latest_profiles()
+    if not profiles:
+        st.caption("No profile captured yet.")
+    for label, report in profiles.items():
+        st.caption(f"{label}: {report['total_s'] * 1000:,.0f} ms profiled at {report['captured_at']}")
+        with st.expander("Top functions by cumulative time"):
+            st.code(report['text'], language=None)
+        if os.path.exists(report['path']):
+            with open(report['path'], 'rb') as f:
+                st.download_button("📥 Download .prof (snakeviz, pstats)", f.read(),
+                                   file_name=os.path.basename(report['path']), key=f"profile_{label}")
+
+# --- STAGE LATENCIES ---
+stages, counters, gauges = instrumentation.snapshot()
+st.markdown("### ⏱️ Stage Latencies")
+if stages:
+    st.dataframe([{
+        'Stage': stage,
+        'Calls': values['count'],
+        'Total (s)': round(values['total_s'], 3),
+        'Mean (ms)': round(values['mean_s'] * 1000, 2),
+        'p50 (ms)': round(values['p50_s'] * 1000, 2),
+        'p95 (ms)': round(values['p95_s'] * 1000, 2),
+        'Max (ms)': round(values['max_s'] * 1000, 2),
+    } for stage, values in sorted(stages.items())], use_container_width=True)
+    st.caption(f"Percentiles cover the last {instrumentation.RECENT_SAMPLES} calls per stage; totals cover "
+               f"everything since the server started.")
+else:
+    st.info("Nothing recorded yet. Open the Threat Dashboard to generate measurements.")
+
+# --- COUNTERS ---
+col1, col2 = st.columns([1, 1])
+with col1:
+    st.markdown("### 🔢 Counters")
+    if counters:
+        st.dataframe([{'Counter': name, 'Stage': stage or '', 'Total': value}
+                      for (name, stage), value in sorted(counters.items(), key=str)], use_container_width=True)
+    else:
+        st.caption("No counters yet.")
+with col2:
+    st.markdown("### 🗄️ Results Cache")
+    st.dataframe([{'Metric': name, 'Value': value} for name, value in sorted(gauges.items())],
+                 use_container_width=True)
+
+# --- STORAGE ---
+st.markdown("### 🧹 Storage Maintenance")
+st.caption("Retention: " + ", ".join(f"{table} {'forever' if days is None else f'{days} days'}"
+                                     for table, days in maintenance.RETENTION.items())
+           + ". Run `python maintenance.py --every 3600` or the ingest service with --maintenance-every "
+             "to apply it on a schedule.")
+col1, col2 = st.columns([1, 1])
+with col1:
+    if st.button("Estimate reclaimable space (dry run)"):
+        st.session_state['maintenance_report'] = maintenance.dry_run()
+with col2:
+    if st.button("Run maintenance now"):
+        with st.spinner("Expiring old rows and compacting..."):
+            st.session_state['maintenance_report'] = maintenance.run_maintenance()
+report = st.session_state.get('maintenance_report')
+if report:
+    if 'tables' in report:
+        st.dataframe([{'Table': table, **values} for table, values in report['tables'].items()],
+                     use_container_width=True)
+        if report['reclaim_bytes'] is not None:
+            st.info(f"About {report['reclaim_bytes'] / 2**20:,.1f} MiB of {report['db_bytes'] / 2**20:,.1f} MiB "
+                    f"would be reclaimed.")
+        if 'note' in report:
+            st.warning(report['note'])
+    else:
+        archived = report['deleted'].get('activity_logs', {}).get('archived', 0)
+        st.success(f"Deleted {sum(t['rows'] for t in report['deleted'].values()):,} rows and archived "
+                   f"{archived:,} in {report['seconds']:.1f} s; the database went from {report['size_before'] / 2**20:,.1f} MiB "
+                   f"to {report['size_after'] / 2**20:,.1f} MiB.")
+        st.json(report, expanded=False)
+
+# --- EXPORT ---
+st.markdown("### 📤 Prometheus Export")
+st.caption(f"The dashboard rewrites `{instrumentation.METRICS_FILE}` at most every "
+           f"{instrumentation.WRITE_INTERVAL:.0f} s; point node_exporter's textfile collector at its directory.")
+col1, col2, col3 = st.columns([1, 1, 1])
+with col1:
+    if st.button("Write metrics file now"):
+        st.success(f"Wrote {instrumentation.write_metrics()}")
+with col2:
+    st.download_button("📥 Download metrics", instrumentation.prometheus_text(), file_name='insider_threat.prom',
+                       mime='text/plain')
+with col3:
+    if st.button("Reset measurements"):
+        instrumentation.reset()
+        st.rerun()
+with st.expander("Metrics text"):
+    st.code(instrumentation.prometheus_text(), language=None)
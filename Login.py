@@ -1,5 +1,5 @@
 import streamlit as st
-from auth import verify_user
+from auth import RateLimited, verify_user
 from db_utils import log_login
 
 st.set_page_config(
@@ -25,7 +25,12 @@ with st.form("login_form"):
     submitted = st.form_submit_button("Login")
 
     if submitted:
-        user_role = verify_user(username, password) # Function now returns the role or None
+        try:
+            # Attempts are rate-limited per username and per client address.
+            user_role = verify_user(username, password, client=st.context.ip_address) # Function now returns the role or None
+        except RateLimited as e:
+            st.error(f"Too many login attempts. Try again in {e.retry_after:.0f} seconds.")
+            st.stop()
         if user_role:
             st.session_state['logged_in'] = True
             st.session_state['username'] = username
@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+import numpy as np
+import streamlit as st
+
+from rule_engine import RULES, decode_reasons
+
+PAGE_SIZES = (25, 50, 100, 250)
+# Sort keys shared with db_utils.query_alerts: label -> (key, frame column, ascending).
+SORTS = {
+    "Highest risk": ('risk', 'Risk_Score', False),
+    "Newest first": ('time', 'timestamp', False),
+    "User": ('user', 'username', True),
+}
+
+HIGH_RISK = 'background-color: #ff4d4d; color: white;'
+MEDIUM_RISK = 'background-color: #ffa500;'
+LOW_RISK = 'background-color: #ffe4b2;'
+
+def risk_colors(scores):
+    """Maps risk scores to cell styles in one vectorized pass."""
+    scores = np.asarray(scores, dtype=float)
+    return np.select([scores > 0.66, scores > 0.33], [HIGH_RISK, MEDIUM_RISK], LOW_RISK)
+
+def style_risk(df):
+    """Applies color styling to the DataFrame based on Risk Score."""
+    return df.style.apply(lambda column: risk_colors(column.to_numpy()), subset=['Risk_Score'])
+
+def render_alert_filters(users, key='alerts'):
+    """Draws the sort and filter controls; returns them as query_alerts keyword arguments."""
+    col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
+    with col1:
+        sort_label = st.selectbox("Sort by", tuple(SORTS), key=f"{key}_sort")
+    with col2:
+        user = st.selectbox("User", ("All users", *users), key=f"{key}_user")
+    with col3:
+        reason = st.text_input("Reason contains", key=f"{key}_reason")
+    with col4:
+        dates = st.date_input("Date range", value=(), key=f"{key}_dates")
+    start = end = None
+    if len(dates) == 2:
+        start = dates[0].strftime("%Y-%m-%d")
+        end = (dates[1] + timedelta(days=1)).strftime("%Y-%m-%d")
+    return {
+        'sort': SORTS[sort_label][0],
+        'user': None if user == "All users" else user,
+        'reason': reason or None,
+        'start': start,
+        'end': end,
+    }
+
+def render_page_picker(total, key='alerts'):
+    """Draws page size and page number controls; returns (page, page_size)."""
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+    pages = max(1, -(-total // page_size))
+    with col2:
+        page = st.number_input("Page", 1, pages, 1, key=f"{key}_page") - 1
+    with col3:
+        st.caption(f"{total:,} alerts · page {page + 1} of {pages}")
+    return page, page_size
+
+def filter_frame(df, sort='risk', user=None, reason=None, start=None, end=None, rules=RULES):
+    """Applies the alert filters and sort to an in-memory result frame."""
+    keep = np.ones(len(df), dtype=bool)
+    user_column = 'username' if 'username' in df.columns else 'User_ID'
+    time_column = 'timestamp' if 'timestamp' in df.columns else 'hour_start'
+    if user is not None and user_column in df.columns:
+        keep &= (df[user_column].astype(str) == user).to_numpy()
+    if reason is not None:
+        if 'Reason' in df.columns:
+            keep &= df['Reason'].str.contains(reason, case=False, regex=False).to_numpy()
+        elif 'Reason_Mask' in df.columns:
+            # Match against the rule names, then test the bits, without decoding every row.
+            bits = sum(1 << bit for bit, rule in enumerate(rules) if reason.lower() in rule['reason'].lower())
+            keep &= (df['Reason_Mask'].to_numpy() & bits) != 0
+    if time_column in df.columns:
+        if start is not None:
+            keep &= (df[time_column].astype(str) >= start).to_numpy()
+        if end is not None:
+            keep &= (df[time_column].astype(str) < end).to_numpy()
+    filtered = df[keep]
+    _, column, ascending = next(spec for spec in SORTS.values() if spec[0] == sort)
+    column = {'username': user_column, 'timestamp': time_column}.get(column, column)
+    if column in filtered.columns:
+        filtered = filtered.sort_values(by=column, ascending=ascending, kind='stable')
+    return filtered
+
+def page_of(df, page=0, page_size=50, rules=RULES):
+    """Returns one page of a filtered result frame.
+
+    Reasons are decoded from Reason_Mask for the rows on the page only.
+    """
+    page_df = df.iloc[page * page_size:(page + 1) * page_size].copy()
+    if 'Reason' not in page_df.columns and 'Reason_Mask' in page_df.columns:
+        page_df['Reason'] = decode_reasons(page_df['Reason_Mask'].to_numpy(), rules)
+    return page_df
@@ -0,0 +1,230 @@
+import atexit
+import os
+import queue
+import threading
+from datetime import datetime
+
+from db_pool import DB_NAME
+
+# Also score new events with the latest saved IsolationForest when set to 1,
+# or with a SlidingWindowForest that learns from each new range when 'online'.
+USE_MODEL = os.environ.get("ALERT_WITH_MODEL") in ("1", "online")
+ONLINE_MODEL = os.environ.get("ALERT_WITH_MODEL") == "online"
+# Largest log_id range evaluated in one pass, to bound worker memory.
+MAX_BATCH_ROWS = 50_000
+# Rules see each user's counters summed over this trailing window, so a burst
+# of small events is scored as one burst. None scores events one by one.
+ALERT_WINDOW = '1h'
+
+def create_tables(cursor):
+    """Creates the alerts table written by the ingest-time evaluator."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alerts (
+            alert_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            log_id INTEGER NOT NULL,
+            username TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            engine TEXT NOT NULL,
+            risk_score REAL NOT NULL,
+            reason_mask INTEGER NOT NULL DEFAULT 0,
+            reasons TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            UNIQUE (log_id, engine)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_risk ON alerts (risk_score DESC, log_id DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_user_time ON alerts (username, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_time ON alerts (timestamp)")
+
+def evaluate_range(first_log_id, last_log_id, db_name=DB_NAME, thresholds=None, use_model=USE_MODEL):
+    """Scores activity rows first_log_id..last_log_id and stores any hits as alerts.
+
+    Returns the number of alerts written.
+    """
+    # Imported here, on the worker thread, so logging activity stays cheap to import.
+    import pandas as pd
+    from db_utils import get_db
+    from rule_engine import DEFAULT_THRESHOLDS, RULES, decode_reasons, evaluate_rules
+
+    pool = get_db(db_name)
+    with pool.read() as conn:
+        df = pd.read_sql_query("SELECT * FROM activity_logs WHERE log_id BETWEEN ? AND ?",
+                               conn, params=(first_log_id, last_log_id))
+    if df.empty:
+        return 0
+    scored = _windowed(pool, df) if ALERT_WINDOW else df
+
+    created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    thresholds = thresholds or DEFAULT_THRESHOLDS
+    mask, hits = evaluate_rules(scored, thresholds, RULES)
+    flagged = hits > 0
+    reasons = decode_reasons(mask[flagged], RULES)
+    alerts = [(int(log_id), username, timestamp, 'rules', float(score), int(bits), reason, created_at)
+              for log_id, username, timestamp, score, bits, reason in zip(
+                  df['log_id'].to_numpy()[flagged], df['username'].to_numpy()[flagged],
+                  df['timestamp'].to_numpy()[flagged], hits[flagged] / len(thresholds), mask[flagged], reasons)]
+
+    if use_model:
+        alerts.extend(_online_model_alerts(pool, df, created_at) if ONLINE_MODEL else _model_alerts(df, created_at))
+
+    if alerts:
+        with pool.write() as conn:
+            conn.executemany('''
+                INSERT OR IGNORE INTO alerts (log_id, username, timestamp, engine, risk_score, reason_mask,
+                                              reasons, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', alerts)
+    return len(alerts)
+
+def _windowed(pool, df):
+    """Returns `df` with counters replaced by their ALERT_WINDOW sums per user."""
+    import pandas as pd
+    from windowing import WINDOWS, build_window_features, windowed_view
+
+    users = sorted(df['username'].unique())
+    placeholders = ', '.join('?' * len(users))
+    since = (pd.Timestamp(df['timestamp'].min()) - pd.Timedelta(seconds=WINDOWS[ALERT_WINDOW])).strftime("%Y-%m-%d %H:%M:%S")
+    with pool.read() as conn:
+        # Earlier events inside the window, found through the (username, timestamp) index.
+        context = pd.read_sql_query(f'''
+            SELECT * FROM activity_logs
+            WHERE username IN ({placeholders}) AND timestamp > ? AND log_id < ?
+        ''', conn, params=(*users, since, int(df['log_id'].min())))
+    combined = pd.concat([context, df], ignore_index=True) if len(context) else df.reset_index(drop=True)
+    features = build_window_features(combined, {ALERT_WINDOW: WINDOWS[ALERT_WINDOW]})
+    return windowed_view(features.iloc[len(context):], ALERT_WINDOW).reset_index(drop=True)
+
+def _model_alerts(df, created_at):
+    from ml_engine import FEATURES, load_latest_model, normalize_scores
+
+    model, metadata = load_latest_model()
+    if model is None:
+        return []
+    scores = model.decision_function(df[FEATURES].to_numpy())
+    flagged = scores < 0
+    reference = metadata.get('score_range') or scores
+    risk = normalize_scores(scores[flagged], reference)
+    return [(int(log_id), username, timestamp, 'ml', float(score), 0, 'ML Anomaly Detected', created_at)
+            for log_id, username, timestamp, score in zip(
+                df['log_id'].to_numpy()[flagged], df['username'].to_numpy()[flagged],
+                df['timestamp'].to_numpy()[flagged], risk)]
+
+# One online forest per database, so workers for different files never train the same model.
+_online_forests = {}
+_online_forests_lock = threading.Lock()
+
+def _online_model_alerts(pool, df, created_at):
+    """Scores `df` with the database's online forest, then teaches it the same rows.
+
+    The forest is warmed up from the rows logged just before `df` the
+    first time it is used, so a restart does not start from nothing.
+    """
+    import pandas as pd
+    from ml_engine import FEATURES, SlidingWindowForest, normalize_scores
+
+    with _online_forests_lock:
+        forest = _online_forests.get(pool.db_name)
+        if forest is None:
+            forest = SlidingWindowForest()
+            with pool.read() as conn:
+                warmup = pd.read_sql_query(f"SELECT {', '.join(FEATURES)} FROM activity_logs WHERE log_id < ? "
+                                           "ORDER BY log_id DESC LIMIT ?",
+                                           conn, params=(int(df['log_id'].min()), forest.window_rows))
+            if len(warmup):
+                forest.partial_fit(warmup[FEATURES].to_numpy()[::-1])
+            _online_forests[pool.db_name] = forest
+        X = df[FEATURES].to_numpy()
+        scores = forest.decision_function(X) if forest.members else None
+        score_range = forest.score_range_
+        forest.partial_fit(X)
+    if scores is None:
+        return []
+    flagged = scores < 0
+    risk = normalize_scores(scores[flagged], score_range)
+    return [(int(log_id), username, timestamp, 'online', float(score), 0, 'Online Model Anomaly', created_at)
+            for log_id, username, timestamp, score in zip(
+                df['log_id'].to_numpy()[flagged], df['username'].to_numpy()[flagged],
+                df['timestamp'].to_numpy()[flagged], risk)]
+
+class AlertWorker:
+    """Background thread that evaluates newly logged activity off the request path.
+
+    `submit` only puts a log_id range on a queue. The worker merges queued
+    ranges into one pass, so bursts of inserts are evaluated as a batch.
+    """
+
+    def __init__(self, db_name=DB_NAME):
+        self.db_name = db_name
+        self._queue = queue.Queue()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="alert-worker", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, first_log_id, last_log_id):
+        """Queues log_ids first_log_id..last_log_id for evaluation."""
+        if self._stopped:
+            # Late writes during shutdown are evaluated inline so they are not lost.
+            evaluate_range(first_log_id, last_log_id, self.db_name)
+            return
+        self._queue.put((first_log_id, last_log_id))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            first, last = item
+            # Coalesce whatever else is already waiting into one range.
+            stop = False
+            while last - first < MAX_BATCH_ROWS:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                first, last = min(first, item[0]), max(last, item[1])
+            try:
+                evaluate_range(first, last, self.db_name)
+            except Exception as e:
+                print(f"Alert evaluation failed for log_ids {first}-{last}: {e}")
+            if stop:
+                return
+
+    def close(self):
+        """Evaluates everything still queued, then stops the worker."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._queue.put(None)
+        self._thread.join()
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+def get_alert_worker(db_name=DB_NAME):
+    """Returns the process-wide AlertWorker for `db_name`, starting it on first use."""
+    with _workers_lock:
+        worker = _workers.get(db_name)
+        if worker is None:
+            worker = AlertWorker(db_name)
+            _workers[db_name] = worker
+        return worker
+
+def backfill_alerts(db_name=DB_NAME, batch_rows=MAX_BATCH_ROWS):
+    """Evaluates every row already in activity_logs; returns the number of alerts written."""
+    from db_utils import get_db
+
+    with get_db(db_name).read() as conn:
+        low, high = conn.execute("SELECT MIN(log_id), MAX(log_id) FROM activity_logs").fetchone()
+    if low is None:
+        return 0
+    written = 0
+    for start in range(low, high + 1, batch_rows):
+        written += evaluate_range(start, min(start + batch_rows - 1, high), db_name)
+    return written
+
+if __name__ == '__main__':
+    print(f"Wrote {backfill_alerts():,} alerts.")
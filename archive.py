@@ -0,0 +1,223 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from db_pool import DB_NAME
+from db_utils import bump_data_epoch, get_db
+from instrumentation import span
+
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "archive")
+# Activity older than this many days is moved out of SQLite by archive_activity.
+DEFAULT_MAX_AGE_DAYS = int(os.environ.get("ARCHIVE_MAX_AGE_DAYS", "90"))
+ARCHIVE_BATCH_ROWS = 100_000
+
+ACTIVITY_COLUMNS = ['log_id', 'username', 'timestamp', 'Login_Hour', 'Files_Accessed', 'Emails_Sent',
+                    'USB_Devices_Used']
+# Compact on-disk types; counters never approach 2**32 and hours/USB fit in a byte.
+COMPACT_DTYPES = {
+    'Login_Hour': 'uint8',
+    'Files_Accessed': 'uint32',
+    'Emails_Sent': 'uint32',
+    'USB_Devices_Used': 'uint8',
+}
+
+# pyarrow is imported on first use, so the dashboard can check the archive's
+# date range without loading it.
+def archive_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('log_id', pa.int64()),
+        ('username', pa.dictionary(pa.int32(), pa.string())),
+        ('timestamp', pa.string()),
+        ('Login_Hour', pa.uint8()),
+        ('Files_Accessed', pa.uint32()),
+        ('Emails_Sent', pa.uint32()),
+        ('USB_Devices_Used', pa.uint8()),
+    ])
+
+def _partitioning():
+    """Partitions are directories named date=YYYY-MM-DD under <archive_dir>/activity."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    return ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive')
+
+def _dataset_dir(archive_dir):
+    return os.path.join(archive_dir, 'activity')
+
+# --- TIERING ---
+def archive_activity(max_age_days=DEFAULT_MAX_AGE_DAYS, db_name=DB_NAME, archive_dir=ARCHIVE_DIR,
+                     batch_rows=ARCHIVE_BATCH_ROWS):
+    """Moves activity older than `max_age_days` into date-partitioned Parquet files.
+
+    Rows are copied in log_id order, `batch_rows` at a time. Each batch is
+    written (atomically, via rename) before its rows are deleted, so an
+    interrupted run loses nothing; rerunning it archives what was left.
+    Only whole days are archived. The hourly rollup and baselines are kept.
+    Returns a summary dict.
+    """
+    import pandas as pd
+
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime("%Y-%m-%d")
+    pool = get_db(db_name)
+    root = _dataset_dir(archive_dir)
+    archived, partitions, last_id = 0, set(), 0
+    while True:
+        with pool.read() as conn:
+            batch = pd.read_sql_query(
+                f"SELECT {', '.join(ACTIVITY_COLUMNS)} FROM activity_logs "
+                "WHERE timestamp < ? AND log_id > ? ORDER BY log_id LIMIT ?",
+                conn, params=(cutoff, last_id, batch_rows))
+        if batch.empty:
+            break
+        first_id, last_id = int(batch['log_id'].iloc[0]), int(batch['log_id'].iloc[-1])
+        for date, rows in batch.groupby(batch['timestamp'].str[:10], sort=True):
+            partitions.add(date)
+            _write_partition(root, date, rows, first_id, last_id)
+        with pool.write() as conn:
+            conn.execute("DELETE FROM activity_logs WHERE timestamp < ? AND log_id BETWEEN ? AND ?",
+                         (cutoff, first_id, last_id))
+            bump_data_epoch(conn)
+        archived += len(batch)
+    return {'cutoff': cutoff, 'rows': archived, 'partitions': sorted(partitions)}
+
+def _compact(frame):
+    """Casts `frame`'s counters to COMPACT_DTYPES.
+
+    NULLs become 0, as the hourly rollup's COALESCE treats them, except a
+    missing Login_Hour, which is taken from the timestamp when there is one.
+    Values outside a dtype's range are clipped rather than wrapped.
+    """
+    import numpy as np
+    import pandas as pd
+
+    frame = frame.copy()
+    for column, dtype in COMPACT_DTYPES.items():
+        if column not in frame.columns:
+            continue
+        values = pd.to_numeric(frame[column], errors='coerce')
+        if column == 'Login_Hour' and 'timestamp' in frame.columns:
+            values = values.fillna(pd.to_numeric(frame['timestamp'].str[11:13], errors='coerce'))
+        frame[column] = values.fillna(0).clip(0, np.iinfo(dtype).max).astype(dtype)
+    return frame
+
+def _write_partition(root, date, rows, first_id, last_id):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    directory = os.path.join(root, f"date={date}")
+    os.makedirs(directory, exist_ok=True)
+    table = pa.Table.from_pandas(_compact(rows), schema=archive_schema(), preserve_index=False)
+    # Named by log_id range, so a rerun after a crash overwrites rather than duplicates.
+    name = f"part-{first_id}-{last_id}.parquet"
+    # Dot-prefixed files are skipped by the reader, so a half-written file is never read.
+    tmp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex}.tmp")
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, os.path.join(directory, name))
+
+# --- READING ---
+def read_archive(start=None, end=None, users=None, columns=None, archive_dir=ARCHIVE_DIR):
+    """Reads archived activity in [start, end) for `users`, or an empty frame.
+
+    Date bounds prune whole partitions; the remaining filters are pushed
+    down to Parquet row groups. Files are memory-mapped and only `columns`
+    are decoded.
+    """
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+
+    columns = list(columns or ACTIVITY_COLUMNS)
+    root = _dataset_dir(archive_dir)
+    if not os.path.isdir(root):
+        return _empty_frame(columns)
+    dataset = ds.dataset(root, format='parquet', partitioning=_partitioning(),
+                         filesystem=pafs.LocalFileSystem(use_mmap=True))
+    predicate = None
+    for condition in _predicates(start, end, users):
+        predicate = condition if predicate is None else predicate & condition
+    table = dataset.to_table(columns=columns, filter=predicate)
+    df = table.to_pandas()
+    if 'log_id' in df.columns:
+        df = df.sort_values('log_id', kind='stable', ignore_index=True)
+    return df
+
+def _predicates(start, end, users):
+    import pyarrow.dataset as ds
+
+    if start is not None:
+        yield ds.field('date') >= str(start)[:10]
+        yield ds.field('timestamp') >= str(start)
+    if end is not None:
+        yield ds.field('date') <= str(end)[:10]
+        yield ds.field('timestamp') < str(end)
+    if users is not None:
+        yield ds.field('username').isin(list(users))
+
+def _empty_frame(columns):
+    return archive_schema().empty_table().to_pandas()[[c for c in columns if c in ACTIVITY_COLUMNS]]
+
+def read_activity(start=None, end=None, users=None, columns=None, db_name=DB_NAME, archive_dir=ARCHIVE_DIR):
+    """Returns activity in [start, end) from the Parquet archive and the SQLite tail together.
+
+    Archived rows come first, then live rows, each in log_id order; both
+    use the archive's compact dtypes. `users` limits the result to those
+    usernames and `columns` to those columns.
+    """
+    import pandas as pd
+
+    columns = list(columns or ACTIVITY_COLUMNS)
+    with span('db.archive') as s:
+        cold = read_archive(start, end, users, columns, archive_dir)
+        s.add(rows=len(cold))
+    query = f"SELECT {', '.join(columns)} FROM activity_logs WHERE 1 = 1"
+    params = []
+    if start is not None:
+        query += " AND timestamp >= ?"
+        params.append(str(start))
+    if end is not None:
+        query += " AND timestamp < ?"
+        params.append(str(end))
+    if users is not None:
+        users = list(users)
+        query += f" AND username IN ({', '.join('?' * len(users))})"
+        params.extend(users)
+    if 'log_id' in columns:
+        query += " ORDER BY log_id"
+    with get_db(db_name).read() as conn:
+        hot = pd.read_sql_query(query, conn, params=params)
+    hot = _compact(hot)
+    if cold.empty:
+        return hot
+    if 'username' in cold.columns:
+        cold['username'] = cold['username'].astype(str)
+    return pd.concat([cold, hot], ignore_index=True) if len(hot) else cold
+
+def clear_archive(archive_dir=ARCHIVE_DIR):
+    """Deletes every archived partition; returns True if there was an archive."""
+    import shutil
+
+    root = _dataset_dir(archive_dir)
+    if not os.path.isdir(root):
+        return False
+    shutil.rmtree(root)
+    return True
+
+def archive_date_range(archive_dir=ARCHIVE_DIR):
+    """Returns (first_date, last_date) of the archived partitions, or None if there are none."""
+    root = _dataset_dir(archive_dir)
+    if not os.path.isdir(root):
+        return None
+    dates = sorted(name[len('date='):] for name in os.listdir(root) if name.startswith('date='))
+    return (dates[0], dates[-1]) if dates else None
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Move old activity from SQLite into the Parquet archive.")
+    parser.add_argument('--max-age-days', type=int, default=DEFAULT_MAX_AGE_DAYS)
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    parser.add_argument('--db', default=DB_NAME)
+    args = parser.parse_args()
+    print(json.dumps(archive_activity(args.max_age_days, args.db, args.archive_dir), indent=2))
@@ -1,40 +1,234 @@
-import sqlite3
+import base64
 import hashlib
+import hmac
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from db_pool import DB_NAME, get_pool
+
+# --- PASSWORD HASHING ---
+# Hashes are stored as "<scheme>$<parameters>$<salt>$<hash>", so each user's
+# KDF settings live with their hash and can be raised without a migration.
+# Unsalted SHA-256 hex digests from older versions are still accepted and
+# are rehashed with the current settings on the next successful login.
+SCRYPT_N = int(os.environ.get("AUTH_SCRYPT_N", str(2**14)))
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = int(os.environ.get("AUTH_PBKDF2_ITERATIONS", "600000"))
+SALT_BYTES = 16
+# Some OpenSSL builds lack scrypt; PBKDF2 is always available.
+DEFAULT_SCHEME = 'scrypt' if hasattr(hashlib, 'scrypt') else 'pbkdf2_sha256'
+
+def _b64(data):
+    return base64.b64encode(data).decode()
+
+def _derive(scheme, params, password, salt):
+    if scheme == 'scrypt':
+        return hashlib.scrypt(password.encode(), salt=salt, n=params['n'], r=params['r'], p=params['p'],
+                              maxmem=256 * params['n'] * params['r'] + 2**20)
+    if scheme == 'pbkdf2_sha256':
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, params['i'])
+    raise ValueError(f"Unknown password hash scheme: {scheme}")
+
+def current_params(scheme=DEFAULT_SCHEME):
+    if scheme == 'scrypt':
+        return {'n': SCRYPT_N, 'r': SCRYPT_R, 'p': SCRYPT_P}
+    return {'i': PBKDF2_ITERATIONS}
+
+def hash_password(password, scheme=DEFAULT_SCHEME, params=None):
+    """Hashes a password for storing, with a fresh random salt."""
+    params = params or current_params(scheme)
+    salt = os.urandom(SALT_BYTES)
+    encoded = ','.join(f"{key}={value}" for key, value in params.items())
+    return f"{scheme}${encoded}${_b64(salt)}${_b64(_derive(scheme, params, password, salt))}"
+
+def parse_hash(stored_hash):
+    """Returns (scheme, params) for a stored hash; legacy digests are ('sha256', {})."""
+    if '$' not in stored_hash:
+        return 'sha256', {}
+    scheme, encoded, _, _ = stored_hash.split('$')
+    return scheme, {key: int(value) for key, value in (item.split('=') for item in encoded.split(','))}
+
+def check_password(password, stored_hash):
+    """Compares `password` with a stored hash in constant time."""
+    scheme, params = parse_hash(stored_hash)
+    if scheme == 'sha256':
+        return hmac.compare_digest(stored_hash, hashlib.sha256(password.encode()).hexdigest())
+    _, _, salt, expected = stored_hash.split('$')
+    return hmac.compare_digest(base64.b64decode(expected), _derive(scheme, params, password, base64.b64decode(salt)))
+
+def needs_rehash(stored_hash):
+    """True when a hash uses an older scheme or weaker parameters than the current ones."""
+    return parse_hash(stored_hash) != (DEFAULT_SCHEME, current_params())
+
+# Checked for unknown users so that a miss costs as much as a wrong password.
+_DUMMY_HASH = None
+
+def _dummy_hash():
+    global _DUMMY_HASH
+    if _DUMMY_HASH is None:
+        _DUMMY_HASH = hash_password(os.urandom(8).hex())
+    return _DUMMY_HASH
+
+# --- RATE LIMITING ---
+class RateLimited(Exception):
+    """Raised by verify_user when a username or client has used up its login attempts."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many login attempts; retry in {retry_after:.0f}s.")
+        self.retry_after = retry_after
+
+class TokenBucketLimiter:
+    """Token buckets keyed by an arbitrary string, at most `max_keys` of them.
+
+    Each key may spend `burst` tokens at once, refilled at `rate` per
+    second. Idle buckets are dropped least-recently-used first; a dropped
+    bucket was idle long enough to be nearly full anyway.
+    """
+
+    def __init__(self, rate, burst, max_keys=10_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
 
-DB_NAME = "insider_threat.db"
+    def _level(self, key, now):
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated) * self.rate)
 
-def hash_password(password):
-    """Hashes a password for storing."""
-    return hashlib.sha256(password.encode()).hexdigest()
+    def retry_after(self, key):
+        """Seconds until `key` has a token again; 0 if it has one now."""
+        with self._lock:
+            tokens = self._level(key, time.monotonic())
+            return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
 
-def add_user(username, password, role):
+    def take(self, key, now=None):
+        """Spends one token for `key`; returns False if it has none left."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens = self._level(key, now)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed
+
+# Five quick tries per username, then one every 30 seconds; clients (IP or
+# session) get a larger allowance across all usernames.
+USER_LIMITER = TokenBucketLimiter(rate=1 / 30, burst=5)
+CLIENT_LIMITER = TokenBucketLimiter(rate=1.0, burst=20)
+
+def check_rate_limit(username, client=None):
+    """Raises RateLimited before any hashing or database work if either bucket is empty."""
+    keys = [(USER_LIMITER, username)]
+    if client is not None:
+        keys.append((CLIENT_LIMITER, client))
+    for limiter, key in keys:
+        if not limiter.take(key):
+            raise RateLimited(limiter.retry_after(key))
+
+# --- USER CACHE ---
+class UserCache:
+    """Bounded LRU cache of (db_name, username) -> (password_hash, role), or None for unknown users.
+
+    Entries expire after `ttl` seconds so changes made by other processes
+    are picked up; writes through this module invalidate immediately. An
+    entry loaded under another `epoch` (see _data_epoch) is reloaded, so
+    clearing the database, even from another process, takes effect at once.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, load, epoch=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < self.ttl and entry[2] == epoch:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        record = load(key)
+        with self._lock:
+            self._entries[key] = (record, now, epoch)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return record
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+_user_cache = UserCache()
+
+def _data_epoch(db_name=DB_NAME):
+    """db_utils' data epoch, which clear_db bumps when it deletes the users; None before it exists."""
+    try:
+        with get_pool(db_name).read() as conn:
+            row = conn.execute("SELECT value FROM db_meta WHERE key = 'data_epoch'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+def _load_user(username, db_name=DB_NAME):
+    with get_pool(db_name).read() as conn:
+        return conn.execute("SELECT password_hash, role FROM users WHERE username = ?", (username,)).fetchone()
+
+# --- ACCOUNTS ---
+def add_user(username, password, role, db_name=DB_NAME):
     """Adds a new user with a specific role to the database."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
     password_hash = hash_password(password)
-    
+
     try:
-        cursor.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)", 
-                       (username, password_hash, role))
-        conn.commit()
+        with get_pool(db_name).write() as conn:
+            conn.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+                         (username, password_hash, role))
         return True
     except sqlite3.IntegrityError:
         return False
     finally:
-        conn.close()
-
-def verify_user(username, password):
-    """Verifies credentials and returns the user's role if successful."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT password_hash, role FROM users WHERE username = ?", (username,))
-    record = cursor.fetchone()
-    conn.close()
-    
+        _user_cache.invalidate((db_name, username))
+
+def verify_user(username, password, client=None, db_name=DB_NAME):
+    """Verifies credentials and returns the user's role if successful.
+
+    `client` identifies the caller (an IP address or session id) for rate
+    limiting. Raises RateLimited without touching the database when the
+    username or client has run out of attempts. Hashes from older schemes
+    or weaker parameters are upgraded after a successful check.
+    """
+    check_rate_limit(username, client)
+    record = _user_cache.get((db_name, username), lambda key: _load_user(username, db_name), _data_epoch(db_name))
+
     if record:
         stored_hash, user_role = record
-        if stored_hash == hash_password(password):
+        if check_password(password, stored_hash):
+            if needs_rehash(stored_hash):
+                _upgrade_hash(username, password, stored_hash, db_name)
             return user_role  # Return the role string ('Admin' or 'User')
-    return None # Return None if login fails
\ No newline at end of file
+    else:
+        check_password(password, _dummy_hash())
+    return None # Return None if login fails
+
+def _upgrade_hash(username, password, old_hash, db_name=DB_NAME):
+    new_hash = hash_password(password)
+    with get_pool(db_name).write() as conn:
+        # Only replace the hash we verified, in case the password changed meanwhile.
+        conn.execute("UPDATE users SET password_hash = ? WHERE username = ? AND password_hash = ?",
+                     (new_hash, username, old_hash))
+    _user_cache.invalidate((db_name, username))
@@ -0,0 +1,190 @@
+import math
+
+# Per-user running statistics, updated as activity is logged so that an
+# event can be compared with the user's own history in O(1).
+BASELINE_FEATURES = ['Files_Accessed', 'Emails_Sent', 'USB_Devices_Used']
+EWMA_ALPHA = 0.1
+# Users with fewer events than this have no usable baseline yet.
+MIN_EVENTS = 10
+DEFAULT_Z_THRESHOLD = 3.0
+# Login hours seen in less than this share of a user's events are unusual for them.
+RARE_HOUR_SHARE = 0.02
+
+# Column positions in the activity rows written by db_utils.
+_ROW_COLUMNS = {'Login_Hour': 2, 'Files_Accessed': 3, 'Emails_Sent': 4, 'USB_Devices_Used': 5}
+
+def create_tables(cursor):
+    """Creates the baseline tables."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_baselines (
+            username TEXT NOT NULL,
+            feature TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            m2 REAL NOT NULL,
+            ewma REAL NOT NULL,
+            PRIMARY KEY (username, feature)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_hour_histogram (
+            username TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (username, hour)
+        ) WITHOUT ROWID
+    ''')
+
+def update_baselines(conn, rows):
+    """Folds activity rows into the per-user baselines.
+
+    `rows` are (username, timestamp, Login_Hour, Files_Accessed, Emails_Sent,
+    USB_Devices_Used) tuples, as inserted into activity_logs. Call this in
+    the same transaction as the insert so baselines never drift from the log.
+    """
+    rows = [row for row in rows if row[0] is not None]
+    if not rows:
+        return
+    users = sorted({row[0] for row in rows})
+    placeholders = ', '.join('?' * len(users))
+    stats = {(username, feature): [n, mean, m2, ewma] for username, feature, n, mean, m2, ewma in conn.execute(
+        f"SELECT username, feature, n, mean, m2, ewma FROM user_baselines WHERE username IN ({placeholders})", users)}
+
+    hours = {}
+    for row in rows:
+        username = row[0]
+        for feature in BASELINE_FEATURES:
+            value = row[_ROW_COLUMNS[feature]]
+            if value is None:
+                continue
+            state = stats.setdefault((username, feature), [0, 0.0, 0.0, 0.0])
+            # Welford's online mean/variance plus an exponentially weighted mean.
+            state[0] += 1
+            delta = value - state[1]
+            state[1] += delta / state[0]
+            state[2] += delta * (value - state[1])
+            state[3] = value if state[0] == 1 else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * state[3]
+        hour = row[_ROW_COLUMNS['Login_Hour']]
+        if hour is not None:
+            hours[(username, hour)] = hours.get((username, hour), 0) + 1
+
+    conn.executemany('''
+        INSERT OR REPLACE INTO user_baselines (username, feature, n, mean, m2, ewma) VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(username, feature, *state) for (username, feature), state in stats.items()])
+    conn.executemany('''
+        INSERT INTO user_hour_histogram (username, hour, count) VALUES (?, ?, ?)
+        ON CONFLICT (username, hour) DO UPDATE SET count = count + excluded.count
+    ''', [(username, hour, count) for (username, hour), count in hours.items()])
+
+def rebuild_baselines(conn):
+    """Recomputes every baseline from activity_logs."""
+    conn.execute("DELETE FROM user_baselines")
+    conn.execute("DELETE FROM user_hour_histogram")
+    cursor = conn.execute('''
+        SELECT username, timestamp, Login_Hour, Files_Accessed, Emails_Sent, USB_Devices_Used
+        FROM activity_logs ORDER BY log_id
+    ''')
+    while True:
+        rows = cursor.fetchmany(10_000)
+        if not rows:
+            break
+        update_baselines(conn, rows)
+
+def _std(n, m2):
+    return math.sqrt(m2 / (n - 1)) if n > 1 else 0.0
+
+def score_event(conn, username, event, z_threshold=DEFAULT_Z_THRESHOLD):
+    """Scores one event against the user's baseline without touching history.
+
+    `event` maps feature names (and optionally Login_Hour) to values. Returns
+    a dict of deviations: a z-score per feature plus 'Login_Hour_Share', the
+    share of the user's events seen at that hour, and 'Reason' listing what
+    crossed the thresholds. Returns None while the user has no baseline.
+    """
+    stats = {feature: (n, mean, m2, ewma) for feature, n, mean, m2, ewma in conn.execute(
+        "SELECT feature, n, mean, m2, ewma FROM user_baselines WHERE username = ?", (username,))}
+    if not stats or min(n for n, *_ in stats.values()) < MIN_EVENTS:
+        return None
+    result = {}
+    reasons = []
+    for feature in BASELINE_FEATURES:
+        if feature not in event or feature not in stats:
+            continue
+        n, mean, m2, _ = stats[feature]
+        std = _std(n, m2)
+        z = (event[feature] - mean) / std if std > 0 else 0.0
+        result[feature] = z
+        if z >= z_threshold:
+            reasons.append(f"{feature} z={z:.1f}")
+    if 'Login_Hour' in event:
+        total = stats[BASELINE_FEATURES[0]][0]
+        count = conn.execute("SELECT count FROM user_hour_histogram WHERE username = ? AND hour = ?",
+                             (username, event['Login_Hour'])).fetchone()
+        share = (count[0] if count else 0) / total
+        result['Login_Hour_Share'] = share
+        if share < RARE_HOUR_SHARE:
+            reasons.append("Unusual Hour For User")
+    result['Reason'] = '; '.join(reasons)
+    return result
+
+def get_baselines(conn):
+    """Returns (baselines_df, hour_share_df) for vectorized scoring."""
+    import pandas as pd
+
+    baselines = pd.read_sql_query("SELECT username, feature, n, mean, m2, ewma FROM user_baselines", conn)
+    hours = pd.read_sql_query('''
+        SELECT h.username, h.hour AS Login_Hour, CAST(h.count AS REAL) / t.total AS hour_share
+        FROM user_hour_histogram h
+        JOIN (SELECT username, SUM(count) AS total FROM user_hour_histogram GROUP BY username) t
+          ON t.username = h.username
+    ''', conn)
+    return baselines, hours
+
+def detect_threats_baseline(df, baselines, hour_shares, z_threshold=DEFAULT_Z_THRESHOLD):
+    """Flags events that deviate from their user's own baseline.
+
+    Returns the flagged rows, highest risk first, with Risk_Score and
+    Reason columns; see deviation_scores. The input DataFrame is left
+    untouched.
+    """
+    from engine import BaselineDetector, detect
+
+    return detect(df, [BaselineDetector(baselines, hour_shares, z_threshold)])
+
+def deviation_scores(df, baselines, hour_shares, z_threshold=DEFAULT_Z_THRESHOLD):
+    """Returns (positions, columns) for the events that deviate from their user's own baseline.
+
+    A row is suspicious when any feature lies `z_threshold` or more standard
+    deviations above the user's mean, or its Login_Hour is rare for that
+    user. Users with fewer than MIN_EVENTS events are skipped.
+    """
+    import numpy as np
+
+    user_column = 'username' if 'username' in df.columns else 'User_ID'
+    users = df[user_column].astype(str).to_numpy()
+    z_scores = np.zeros((len(df), len(BASELINE_FEATURES)))
+    known = np.ones(len(df), dtype=bool)
+    for i, feature in enumerate(BASELINE_FEATURES):
+        stats = baselines[baselines['feature'] == feature].set_index('username')
+        n, mean, m2 = (stats[column].reindex(users).to_numpy(dtype=float) for column in ('n', 'mean', 'm2'))
+        known &= np.nan_to_num(n) >= MIN_EVENTS
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.sqrt(m2 / np.maximum(n - 1, 1))
+            z = (df[feature].to_numpy(dtype=float) - mean) / std
+        z_scores[:, i] = np.where(std > 0, np.nan_to_num(z), 0.0)
+
+    share = hour_shares.set_index(['username', 'Login_Hour'])['hour_share']
+    keys = list(zip(users, df['Login_Hour'].to_numpy()))
+    rare_hour = share.reindex(keys).to_numpy(dtype=float, na_value=0.0) < RARE_HOUR_SHARE
+
+    deviating = z_scores >= z_threshold
+    flagged = np.flatnonzero(known & (deviating.any(axis=1) | rare_hour))
+    max_z = z_scores[flagged].max(axis=1, initial=0.0)
+    # Rare hours alone count as reaching the threshold; scores saturate at twice it.
+    severity = np.maximum(max_z, np.where(rare_hour[flagged], z_threshold, 0.0))
+    reasons = np.array([
+        '; '.join([f"{feature} z={z[i]:.1f}" for i, feature in enumerate(BASELINE_FEATURES) if z[i] >= z_threshold]
+                  + (["Unusual Hour For User"] if rare else []))
+        for z, rare in zip(z_scores[flagged], rare_hour[flagged])
+    ], dtype=object)
+    return flagged, {'Risk_Score': np.clip(severity / (2 * z_threshold), 0.0, 1.0), 'Reason': reasons}
@@ -0,0 +1,1189 @@
+"""Micro-benchmarks for the insider threat system.
+
+Run `python benchmark.py <name> --help` for the options of each benchmark.
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import db_pool
+import db_utils
+
+# --- HELPERS ---
+def percentile(values, pct):
+    """Returns the `pct` percentile of `values` (nearest-rank)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def fresh_db(tmpdir, name):
+    """Creates an initialized database file under `tmpdir` and returns its path."""
+    path = os.path.join(tmpdir, name)
+    with db_pool.get_pool(path).write() as conn:
+        db_utils._create_schema(conn.cursor())
+    db_pool.get_pool(path).close_all()
+    return path
+
+def run_threads(n_threads, per_thread, insert_one):
+    """Runs `insert_one` from `n_threads` threads; returns (elapsed, latencies, errors)."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        for i in range(per_thread):
+            start = time.perf_counter()
+            try:
+                insert_one(i)
+            except sqlite3.Error as e:
+                with lock:
+                    errors.append(e)
+                continue
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(n_threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, latencies, errors
+
+def synthetic_rows(n, n_users=50, start=0):
+    """Returns `n` simple activity rows spread over `n_users` users."""
+    return [(f"user{i % n_users}", f"2025-01-{1 + i % 28:02d} {i % 24:02d}:00:00", i % 24, i % 60, i % 70, i % 3)
+            for i in range(start, start + n)]
+
+def timed(fn, repeat=5):
+    """Returns the median wall time of `repeat` calls to `fn`."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return percentile(times, 50)
+
+def report(label, elapsed, latencies, errors):
+    rate = len(latencies) / elapsed if elapsed else 0.0
+    print(f"{label:<10} {rate:>12,.0f} inserts/s   p50 {percentile(latencies, 50) * 1000:8.2f} ms"
+          f"   p99 {percentile(latencies, 99) * 1000:8.2f} ms   errors {len(errors)}")
+
+# --- BENCHMARKS ---
+def bench_db(args):
+    """Concurrent log_activity inserts: connect-per-call versus the shared pool."""
+    row = ('bench_user', datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 3, 10, 1, 0)
+    print(f"{args.threads} writer threads x {args.inserts} inserts each")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        legacy_path = fresh_db(tmpdir, 'legacy.db')
+
+        def legacy_insert(_):
+            # The pre-pool code path: new connection, default journal, one commit per row.
+            conn = sqlite3.connect(legacy_path)
+            try:
+                conn.execute(db_utils.INSERT_ACTIVITY_SQL, row)
+                conn.commit()
+            finally:
+                conn.close()
+
+        report('before', *run_threads(args.threads, args.inserts, legacy_insert))
+
+        pooled_path = fresh_db(tmpdir, 'pooled.db')
+        pool = db_pool.get_pool(pooled_path)
+
+        def pooled_insert(_):
+            with pool.write() as conn:
+                conn.execute(db_utils.INSERT_ACTIVITY_SQL, row)
+
+        report('after', *run_threads(args.threads, args.inserts, pooled_insert))
+        pool.close_all()
+
+def bench_loader(args):
+    """Dashboard rerun latency: full re-read versus the incremental loader."""
+    import pandas as pd
+
+    print(f"{'rows':>10} {'full read':>12} {'incremental':>12} {'+100 rows':>12}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in args.sizes:
+            path = os.path.join(tmpdir, f'loader_{size}.db')
+            pool = db_utils.get_db(path)
+            with pool.write() as conn:
+                conn.executemany(db_utils.INSERT_ACTIVITY_SQL, synthetic_rows(size))
+
+            def full_read():
+                with pool.read() as conn:
+                    pd.read_sql_query("SELECT * FROM activity_logs", conn)
+
+            loader = db_utils.IncrementalActivityLoader(path)
+            loader.load()
+            offset = [size]
+
+            def append_and_load():
+                with pool.write() as conn:
+                    conn.executemany(db_utils.INSERT_ACTIVITY_SQL, synthetic_rows(100, start=offset[0]))
+                offset[0] += 100
+                loader.load()
+
+            print(f"{size:>10,} {timed(full_read) * 1000:>10.1f}ms {timed(loader.load) * 1000:>10.2f}ms"
+                  f" {timed(append_and_load) * 1000:>10.2f}ms")
+            pool.close_all()
+
+def write_synthetic_csv(path, n_rows, chunk_rows=1_000_000, n_users=1000, seed=0):
+    """Writes an activity CSV with `n_rows` random rows in the upload format."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    written = 0
+    while written < n_rows:
+        n = min(chunk_rows, n_rows - written)
+        pd.DataFrame({
+            'User_ID': np.char.add('U', rng.integers(0, n_users, n).astype(str)),
+            'Login_Hour': rng.integers(0, 24, n),
+            'Files_Accessed': rng.poisson(15, n),
+            'Emails_Sent': rng.poisson(20, n),
+            'USB_Devices_Used': rng.binomial(3, 0.1, n),
+        }).to_csv(path, mode='a', header=written == 0, index=False)
+        written += n
+
+def measure(fn):
+    """Runs `fn` under tracemalloc and returns (result, seconds, peak_bytes)."""
+    import tracemalloc
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def bench_stream(args):
+    """Chunked CSV scoring: throughput and peak memory on a synthetic upload."""
+    import pandas as pd
+    import stream_scoring
+    from rule_engine import DEFAULT_THRESHOLDS, detect_threats_rules
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'activity.csv')
+        print(f"Writing {args.rows:,} synthetic rows...")
+        write_synthetic_csv(path, args.rows)
+        print(f"{'mode':<22} {'rows/s':>12} {'peak MiB':>10} {'alerts':>10}")
+
+        runs = []
+        if args.compare:
+            runs.append(('whole file (rules)',
+                         lambda: (detect_threats_rules(pd.read_csv(path), DEFAULT_THRESHOLDS), args.rows)))
+        for engine in args.engines:
+            runs.append((f'chunked ({engine})',
+                         lambda engine=engine: stream_scoring.score_csv(
+                             path, engine=engine, thresholds=DEFAULT_THRESHOLDS, chunksize=args.chunksize)))
+        for label, fn in runs:
+            (suspicious, total), elapsed, peak = measure(fn)
+            print(f"{label:<22} {total / elapsed:>12,.0f} {peak / 2**20:>10.1f} {len(suspicious):>10,}")
+
+def bench_parallel(args):
+    """IsolationForest scoring speed-up across worker counts, checked against the serial path."""
+    import numpy as np
+    import pandas as pd
+    import ml_engine
+    import parallel_scoring
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'Login_Hour': rng.integers(0, 24, args.rows),
+        'Files_Accessed': rng.poisson(15, args.rows),
+        'Emails_Sent': rng.poisson(20, args.rows),
+        'USB_Devices_Used': rng.binomial(3, 0.1, args.rows),
+    })
+    model = ml_engine.fit_model(df.sample(min(len(df), 100_000), random_state=0))
+    X = df[ml_engine.FEATURES].to_numpy()
+    print(f"{args.rows:,} rows on {os.cpu_count()} cores")
+    print(f"{'workers':>8} {'seconds':>10} {'speed-up':>10} {'identical':>10}")
+    serial = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        scores = parallel_scoring.decision_function(model, X, workers)
+        elapsed = time.perf_counter() - start
+        if serial is None:
+            serial, serial_time = scores, elapsed
+        risk = ml_engine.normalize_scores(scores, scores)
+        identical = np.array_equal(risk, ml_engine.normalize_scores(serial, serial))
+        print(f"{workers:>8} {elapsed:>10.2f} {serial_time / elapsed:>9.2f}x {str(identical):>10}")
+
+def bench_windows(args):
+    """Window features: recompute from scratch versus incremental update per batch of new rows."""
+    import numpy as np
+    import pandas as pd
+    import windowing
+
+    rng = np.random.default_rng(0)
+    total = args.rows + args.batch
+    seconds = np.sort(rng.integers(0, 86400 * 90, total))
+    df = pd.DataFrame({
+        'log_id': np.arange(1, total + 1),
+        'username': np.char.add('user', rng.integers(0, 500, total).astype(str)),
+        'timestamp': (pd.Timestamp('2025-01-01') + pd.to_timedelta(seconds, unit='s')).strftime("%Y-%m-%d %H:%M:%S"),
+        'Login_Hour': rng.integers(0, 24, total),
+        'Files_Accessed': rng.poisson(3, total),
+        'Emails_Sent': rng.poisson(2, total),
+        'USB_Devices_Used': rng.binomial(1, 0.05, total),
+    })
+    history, full = df.iloc[:args.rows], df
+
+    scratch = timed(lambda: windowing.build_window_features(full), repeat=3)
+
+    def incremental():
+        aggregator = windowing.WindowAggregator()
+        aggregator.update(history, (0, args.rows))
+        start = time.perf_counter()
+        aggregator.update(full, (0, total))
+        return time.perf_counter() - start
+
+    increment = percentile([incremental() for _ in range(3)], 50)
+    print(f"{args.rows:,} rows + {args.batch:,} new")
+    print(f"from scratch   {scratch * 1000:10.1f} ms")
+    print(f"incremental    {increment * 1000:10.1f} ms")
+
+# --- SUITE ---
+SUITE_STAGES = ('ingest', 'rules', 'ml_fit', 'ml_score', 'load')
+
+def environment():
+    """Describes the machine and library versions a suite run was measured on."""
+    import platform
+    import subprocess
+    import numpy as np
+    import pandas as pd
+    import sklearn
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+    }
+
+def stage_result(stage, rows, elapsed, latencies, peak, **extra):
+    return {
+        'stage': stage,
+        'rows': rows,
+        'seconds': round(elapsed, 6),
+        'rows_per_sec': round(rows / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'peak_mib': round(peak / 2**20, 2),
+        **extra,
+    }
+
+def run_batches(batches, fn):
+    """Times `fn` on each batch; returns (rows, elapsed, latencies). Producing the batches is not timed."""
+    rows, latencies = 0, []
+    for batch in batches:
+        start = time.perf_counter()
+        fn(batch)
+        latencies.append(time.perf_counter() - start)
+        rows += len(batch)
+    return rows, sum(latencies), latencies
+
+def _proc_status_kib(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+
+def measure_rss(fn):
+    """Like `measure`, but peak memory is the rise in resident set size.
+
+    tracemalloc slows allocation-heavy code such as tree fitting and misses
+    SQLite's allocations, so on Linux the kernel's high-water mark is reset
+    and read instead. Elsewhere this falls back to `measure`.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        baseline = _proc_status_kib('VmRSS')
+    except OSError:
+        return measure(fn)
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    return result, elapsed, max(0, _proc_status_kib('VmHWM') - baseline) * 1024
+
+def suite_size(args, size, tmpdir):
+    """Runs the selected suite stages on `size` synthetic rows; returns their result dicts."""
+    import pandas as pd
+    import alerting
+    import ml_engine
+    import parallel_scoring
+    import synthetic_data
+    from rule_engine import DEFAULT_THRESHOLDS, detect_threats_rules
+
+    days = synthetic_data.days_for_rows(size, args.users)
+
+    def chunks(chunk_rows=args.chunk_rows):
+        return synthetic_data.iter_activity(args.users, days, seed=args.seed, max_rows=size, chunk_rows=chunk_rows)
+
+    results = []
+    path = os.path.join(tmpdir, f'suite_{size}.db')
+    if 'ingest' in args.stages:
+        db_utils.get_db(path)
+        batches = (synthetic_data.activity_tuples(chunk) for chunk in chunks(args.batch_rows))
+        (rows, elapsed, latencies), _, peak = measure_rss(
+            lambda: run_batches(batches, lambda batch: db_utils._insert_activity_rows(batch, path)))
+        start = time.perf_counter()
+        alerting.get_alert_worker(path).close()
+        results.append(stage_result('ingest', rows, elapsed, latencies, peak, batch_rows=args.batch_rows,
+                                    alert_drain_seconds=round(time.perf_counter() - start, 6)))
+    if 'rules' in args.stages:
+        (rows, elapsed, latencies), _, peak = measure_rss(lambda: run_batches(
+            chunks(), lambda chunk: detect_threats_rules(chunk, DEFAULT_THRESHOLDS, with_reasons=False)))
+        results.append(stage_result('rules', rows, elapsed, latencies, peak))
+    if 'ml_fit' in args.stages or 'ml_score' in args.stages:
+        fit_df = synthetic_data.generate_activity(args.users, days, seed=args.seed, max_rows=min(size, args.fit_rows))
+        model, elapsed, peak = measure_rss(lambda: ml_engine.fit_model(fit_df, n_workers=args.workers))
+        fit_scores = parallel_scoring.decision_function(model, fit_df[ml_engine.FEATURES].to_numpy())
+        score_range = [float(fit_scores.min()), float(fit_scores.max())]
+        if 'ml_fit' in args.stages:
+            results.append(stage_result('ml_fit', len(fit_df), elapsed, [elapsed], peak))
+        if 'ml_score' in args.stages:
+            (rows, elapsed, latencies), _, peak = measure_rss(lambda: run_batches(
+                chunks(), lambda chunk: ml_engine.detect_threats_ml(chunk, model, score_range, args.workers)))
+            results.append(stage_result('ml_score', rows, elapsed, latencies, peak))
+    if 'load' in args.stages:
+        if 'ingest' not in args.stages:
+            synthetic_data.write_activity(chunks(), path)
+        loader = db_utils.IncrementalActivityLoader(path)
+        (df, _), elapsed, peak = measure_rss(loader.snapshot)
+        results.append(stage_result('load_cold', len(df), elapsed, [elapsed], peak))
+        warm = [timed(loader.snapshot, repeat=1) for _ in range(args.repeat)]
+        # A warm load returns the whole frame, so its throughput is rows served per second.
+        results.append(stage_result('load_warm', len(df), sum(warm) / len(warm), warm, 0))
+        pool = db_utils.get_db(path)
+
+        def hourly():
+            with pool.read() as conn:
+                return pd.read_sql_query("SELECT * FROM activity_hourly", conn)
+
+        hourly_df, elapsed, peak = measure_rss(hourly)
+        results.append(stage_result('load_hourly', len(hourly_df), elapsed, [elapsed], peak))
+        del df, hourly_df
+        pool.close_all()
+    return results
+
+def compare_results(results, baseline_path, tolerance):
+    """Prints throughput against a previous run; returns the stages that regressed by more than `tolerance`."""
+    import json
+
+    with open(baseline_path) as f:
+        baseline = {(r['stage'], r['rows']): r for r in json.load(f)['results']}
+    regressions = []
+    print(f"\n{'stage':<12} {'rows':>12} {'before':>14} {'after':>14} {'ratio':>8}")
+    for result in results:
+        before = baseline.get((result['stage'], result['rows']))
+        if not before or not before['rows_per_sec'] or not result['rows_per_sec']:
+            continue
+        ratio = result['rows_per_sec'] / before['rows_per_sec']
+        flag = '  REGRESSION' if ratio < 1 - tolerance else ''
+        print(f"{result['stage']:<12} {result['rows']:>12,} {before['rows_per_sec']:>14,.0f}"
+              f" {result['rows_per_sec']:>14,.0f} {ratio:>7.2f}x{flag}")
+        if flag:
+            regressions.append(result)
+    return regressions
+
+def bench_suite(args):
+    """End-to-end suite on generated activity: ingest, rule and ML scoring, dashboard loads."""
+    import json
+
+    config = {key: getattr(args, key) for key in ('sizes', 'stages', 'users', 'chunk_rows', 'batch_rows',
+                                                  'fit_rows', 'workers', 'repeat', 'seed')}
+    results = []
+    print(f"{'stage':<12} {'rows':>12} {'rows/s':>14} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'peak MiB':>10}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in args.sizes:
+            for result in suite_size(args, size, tmpdir):
+                results.append({**result, 'size': size})
+                print(f"{result['stage']:<12} {result['rows']:>12,} {result['rows_per_sec'] or 0:>14,.0f}"
+                      f" {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} {result['p99_ms']:>10.2f}"
+                      f" {result['peak_mib']:>10.1f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'config': config, 'results': results}, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare and compare_results(results, args.compare, args.tolerance):
+        raise SystemExit(1)
+
+# --- INGEST SERVICE LOAD TEST ---
+async def _http_post(reader, writer, body):
+    writer.write(b"POST /events HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/x-ndjson\r\n"
+                 b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = int(next(line.split(b':')[1] for line in head.split(b"\r\n") if line.lower().startswith(b'content-length')))
+    reply = await reader.readexactly(length)
+    return int(head.split(b' ')[1]), reply
+
+async def _unix_post(reader, writer, body):
+    # An empty line ends the batch.
+    writer.write(body + b"\n\n")
+    await writer.drain()
+    reply = await reader.readline()
+    return (200 if b'accepted' in reply else 400), reply
+
+async def _load_clients(args, payloads):
+    """Stand-in agents: each connection posts payloads back to back until the time is up."""
+    import asyncio
+
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + args.seconds
+    accepted = [0]
+
+    async def client(index):
+        if args.unix:
+            reader, writer = await asyncio.open_unix_connection(args.unix)
+            post = _unix_post
+        else:
+            host, port = args.http.rsplit(':', 1)
+            reader, writer = await asyncio.open_connection(host, int(port))
+            post = _http_post
+        i = index
+        while time.perf_counter() < deadline:
+            body = payloads[i % len(payloads)]
+            start = time.perf_counter()
+            status, _ = await post(reader, writer, body)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                accepted[0] += args.batch
+            elif status == 503:
+                await asyncio.sleep(0.1)
+            i += args.clients
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(args.clients)))
+    return accepted[0], time.perf_counter() - start, latencies, statuses
+
+def bench_ingest(args):
+    """Load-tests ingest_service with local stand-in agents posting JSON-lines batches."""
+    import asyncio
+    import json
+    import socket
+    import subprocess
+    import sys
+    import urllib.request
+    import ingest_service
+    import synthetic_data
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, 'ingest.db')
+        if args.unix:
+            args.unix = os.path.join(tmpdir, 'ingest.sock')
+            args.http = None
+            endpoint = ['--unix', args.unix]
+        else:
+            with socket.socket() as probe:
+                probe.bind(('127.0.0.1', 0))
+                args.http = f"127.0.0.1:{probe.getsockname()[1]}"
+            endpoint = ['--http', args.http]
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ingest_service.py'),
+             '--db', db_path, *endpoint], stdout=subprocess.DEVNULL)
+        try:
+            deadline = time.time() + 30
+            while not (os.path.exists(args.unix) if args.unix else _port_open(args.http)):
+                if time.time() > deadline or server.poll() is not None:
+                    raise SystemExit("ingest_service did not start")
+                time.sleep(0.1)
+
+            # Payloads are encoded up front so the clients spend their time waiting on the server.
+            events = synthetic_data.generate_activity(args.users, 30, max_rows=args.batch * 50)
+            fields = list(ingest_service.FIELDS)
+            lines = [json.dumps(dict(zip(fields, row))) for row in synthetic_data.activity_tuples(events)]
+            payloads = ["\n".join(lines[i:i + args.batch]).encode() for i in range(0, len(lines), args.batch)]
+
+            accepted, elapsed, latencies, statuses = asyncio.run(_load_clients(args, payloads))
+            health = None
+            if args.http:
+                with urllib.request.urlopen(f"http://{args.http}/health") as response:
+                    health = json.load(response)
+        finally:
+            server.terminate()
+            server.wait()
+
+    rate = accepted / elapsed if elapsed else 0.0
+    print(f"{args.clients} clients x {args.batch} events/request for {args.seconds}s over "
+          f"{'Unix socket' if args.unix else 'HTTP'}")
+    print(f"committed   {accepted:>12,} events   {rate:>12,.0f} events/s   (target "
+          f"{ingest_service.TARGET_EVENTS_PER_SEC:,})")
+    print(f"latency     p50 {percentile(latencies, 50) * 1000:8.1f} ms   p95 {percentile(latencies, 95) * 1000:8.1f} ms"
+          f"   p99 {percentile(latencies, 99) * 1000:8.1f} ms")
+    print(f"responses   {statuses}")
+    if health:
+        print(f"server      {health['commits']:,} commits, {health['written'] / max(health['commits'], 1):,.0f} rows/commit")
+    if args.check and rate < ingest_service.TARGET_EVENTS_PER_SEC:
+        raise SystemExit(1)
+
+def _port_open(address):
+    import socket
+
+    host, port = address.rsplit(':', 1)
+    with socket.socket() as probe:
+        return probe.connect_ex((host, int(port))) == 0
+
+# --- AUTHENTICATION ---
+def _login_load(verify, credentials, seconds, n_threads, rate=None):
+    """Calls verify(username, password, client) from `n_threads` threads, at most `rate` calls/s in total.
+
+    Returns the started threads and a dict of per-outcome latencies filled in as they finish.
+    """
+    import random
+
+    outcomes = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(seed):
+        rng = random.Random(seed)
+        local = {}
+        interval = n_threads / rate if rate else 0
+        next_call = time.perf_counter()
+        while time.perf_counter() < deadline:
+            if interval:
+                next_call += interval
+                time.sleep(max(0.0, next_call - time.perf_counter()))
+            username, password, client = rng.choice(credentials)
+            start = time.perf_counter()
+            try:
+                outcome = 'ok' if verify(username, password, client) else 'rejected'
+            except Exception as e:
+                outcome = type(e).__name__
+            local.setdefault(outcome, []).append(time.perf_counter() - start)
+        with lock:
+            for outcome, latencies in local.items():
+                outcomes.setdefault(outcome, []).extend(latencies)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(n_threads)]
+    for t in threads:
+        t.start()
+    return threads, outcomes
+
+def _report_logins(label, outcomes, seconds):
+    for outcome, latencies in sorted(outcomes.items()):
+        print(f"{label:<28} {outcome:<12} {len(latencies) / seconds:>10,.1f}/s   p50 {percentile(latencies, 50) * 1000:8.2f} ms"
+              f"   p99 {percentile(latencies, 99) * 1000:8.2f} ms")
+
+def bench_auth(args):
+    """Logins/sec for legitimate users, alone and during a brute-force attack, with and without rate limits."""
+    import hashlib
+    import hmac
+    import auth
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = fresh_db(tmpdir, 'auth.db')
+        print(f"Creating {args.users} users ({auth.DEFAULT_SCHEME} {auth.current_params()})...")
+        for i in range(args.users):
+            auth.add_user(f"user{i}", f"password{i}", 'User', db_name=path)
+        legit = [(f"user{i}", f"password{i}", f"10.0.{i // 250}.{i % 250}") for i in range(args.users)]
+        attacker = [(legit[0][0], f"guess{i}", '203.0.113.7') for i in range(1000)]
+
+        def legacy_verify(username, password, client):
+            # The pre-KDF code path: a new connection per attempt and one unsalted SHA-256.
+            conn = sqlite3.connect(path)
+            try:
+                record = conn.execute("SELECT password_hash, role FROM users WHERE username = ?", (username,)).fetchone()
+            finally:
+                conn.close()
+            hmac.compare_digest(record[0], hashlib.sha256(password.encode()).hexdigest())
+            return record[1]
+
+        def verify(username, password, client):
+            return auth.verify_user(username, password, client, db_name=path)
+
+        def run(label, verify_fn, attack=False):
+            threads, outcomes = _login_load(verify_fn, legit, args.seconds, args.threads)
+            attack_threads, attack_outcomes = _login_load(verify_fn, attacker, args.seconds, args.attackers,
+                                                                      args.attack_rate) \
+                if attack else ([], {})
+            for t in threads + attack_threads:
+                t.join()
+            _report_logins(label, outcomes, args.seconds)
+            if attack:
+                _report_logins(label + ' (attacker)', attack_outcomes, args.seconds)
+
+        limits = auth.USER_LIMITER, auth.CLIENT_LIMITER, auth.check_rate_limit
+        try:
+            run('legacy sha256 (reference)', legacy_verify)
+            auth.USER_LIMITER = auth.CLIENT_LIMITER = auth.TokenBucketLimiter(rate=1e9, burst=1e9)
+            run('kdf, no limits', verify)
+            run('kdf, no limits', verify, attack=True)
+
+            # The real limits apply to the attacker. The simulated users log in far more often than
+            # real ones would, so their attempts only go through the (unlimited) bucket bookkeeping.
+            auth.USER_LIMITER = auth.TokenBucketLimiter(rate=1 / 30, burst=5)
+            auth.CLIENT_LIMITER = auth.TokenBucketLimiter(rate=1.0, burst=20)
+            unlimited = auth.TokenBucketLimiter(rate=1e9, burst=1e9)
+            limited_check = limits[2]
+
+            def check_rate_limit(username, client=None):
+                if client == attacker[0][2]:
+                    return limited_check(username, client)
+                unlimited.take(username)
+                unlimited.take(client)
+
+            auth.check_rate_limit = check_rate_limit
+            run('kdf, rate limited', verify, attack=True)
+        finally:
+            auth.USER_LIMITER, auth.CLIENT_LIMITER, auth.check_rate_limit = limits
+        print(f"user cache: {auth._user_cache.hits:,} hits, {auth._user_cache.misses:,} misses")
+
+# --- DETECTION ENGINE ---
+def bench_engine(args):
+    """Per-detector throughput for engine.py; the parity tests live in tests/test_engine.py."""
+    import engine
+    import ml_engine
+    import synthetic_data
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, 'engine.db')
+        days = synthetic_data.days_for_rows(args.rows, args.users)
+        df = synthetic_data.generate_activity(args.users, days, max_rows=args.rows, insider_fraction=0.05)
+        df = df.drop(columns=synthetic_data.LABEL_COLUMNS)
+        print(f"Building baselines for {len(df):,} synthetic rows...")
+        synthetic_data.write_activity([df], db_path)
+        with db_pool.get_pool(db_path).read() as conn:
+            import baselines
+            baseline_stats = baselines.get_baselines(conn)
+        model = ml_engine.fit_model(df, 0.05, args.workers)
+
+        detectors = {
+            'rules': lambda: engine.RuleDetector(with_reasons=False),
+            'rules + reasons': lambda: engine.RuleDetector(),
+            'ml': lambda: engine.IsolationForestDetector(model, n_workers=args.workers),
+            'baseline': lambda: engine.BaselineDetector(*baseline_stats),
+        }
+        runs = [(label, lambda make=make: engine.score_batch(df, [make()])) for label, make in detectors.items()]
+        runs.append(('combined (max)', lambda: engine.score_batch(
+            df, [make() for label, make in detectors.items() if label != 'rules + reasons'])))
+        runs.append(('stream, all three', lambda: sum(len(part) for _, part in engine.score_stream(
+            (df.iloc[i:i + args.chunk_rows] for i in range(0, len(df), args.chunk_rows)),
+            [make() for label, make in detectors.items() if label != 'rules + reasons']))))
+
+        print(f"\n{'detector':<20} {'rows/s':>12} {'median ms':>10} {'flagged':>9}")
+        for label, fn in runs:
+            result = fn()
+            elapsed = timed(fn, args.repeat)
+            flagged = result if isinstance(result, int) else len(result)
+            print(f"{label:<20} {len(df) / elapsed:>12,.0f} {elapsed * 1000:>10.1f} {flagged:>9,}")
+
+# --- INSTRUMENTATION ---
+def bench_instrumentation(args):
+    """Cost of instrumentation spans, alone and on a dashboard-style load and detect pass."""
+    import statistics
+    import engine
+    import instrumentation
+    import ml_engine
+    import synthetic_data
+
+    def span_loop():
+        for _ in range(args.spans):
+            with instrumentation.span('benchmark.span') as s:
+                s.add(rows=1)
+
+    per_span = {}
+    for enabled in (False, True):
+        instrumentation.set_enabled(enabled)
+        per_span[enabled] = timed(span_loop, 5) / args.spans
+    print(f"span enter/exit: {per_span[True] * 1e9:,.0f} ns enabled, {per_span[False] * 1e9:,.0f} ns disabled")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, 'instrumented.db')
+        days = synthetic_data.days_for_rows(args.rows, args.users)
+        synthetic_data.write_activity(synthetic_data.iter_activity(args.users, days, max_rows=args.rows), db_path)
+        loader = db_utils.IncrementalActivityLoader(db_path)
+        df = loader.load()
+        model = ml_engine.fit_model(df, 0.05)
+        detectors = [engine.RuleDetector(with_reasons=False), engine.IsolationForestDetector(model),
+                     engine.BaselineDetector(db_name=db_path)]
+
+        def dashboard_pass():
+            frame = loader.load()
+            for detector in detectors:
+                engine.detect(frame, [detector])
+
+        instrumentation.set_enabled(True)
+        instrumentation.reset()
+        dashboard_pass()
+        stages, _, _ = instrumentation.snapshot()
+        spans_per_pass = sum(stage['count'] for stage in stages.values())
+        # Alternate on and off so drift in machine load hits both equally.
+        times = {False: [], True: []}
+        for _ in range(args.repeat):
+            for enabled in (False, True):
+                instrumentation.set_enabled(enabled)
+                start = time.perf_counter()
+                dashboard_pass()
+                times[enabled].append(time.perf_counter() - start)
+        instrumentation.set_enabled(True)
+
+    off, on = statistics.median(times[False]), statistics.median(times[True])
+    estimated = spans_per_pass * per_span[True] / off
+    print(f"dashboard pass over {len(df):,} rows ({spans_per_pass} spans): {off * 1000:,.1f} ms off, "
+          f"{on * 1000:,.1f} ms on")
+    print(f"overhead: measured {(on - off) / off:+.2%} (median of {args.repeat}), "
+          f"spans alone {estimated:.4%}")
+    if args.check and estimated > args.max_overhead:
+        raise SystemExit(f"instrumentation overhead {estimated:.2%} is above {args.max_overhead:.2%}")
+
+# --- MAINTENANCE ---
+def bench_maintenance(args):
+    """DB size and dashboard load time before and after a retention pass over a year of synthetic activity."""
+    from datetime import date, timedelta
+
+    import alerting
+    import engine
+    import maintenance
+    import pandas as pd
+    import synthetic_data
+
+    retention = maintenance.parse_retention(args.retention)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, 'maintenance.db')
+        print(f"Writing {args.days} days of activity for {args.users} users, ending today...")
+        start = date.today() - timedelta(days=args.days - 1)
+        synthetic_data.write_activity(synthetic_data.iter_activity(args.users, args.days, start=start), db_path)
+        alerting.backfill_alerts(db_path)
+        pool = db_utils.get_db(db_path)
+
+        def dashboard_load():
+            # A Threat Dashboard session's first open: the full activity read with
+            # rule scoring, then the hourly rollup view.
+            frame = db_utils.IncrementalActivityLoader(db_path).load()
+            engine.detect(frame, [engine.RuleDetector()])
+            with pool.read() as conn:
+                pd.read_sql_query("SELECT * FROM activity_hourly", conn)
+            return len(frame)
+
+        def state():
+            with pool.read() as conn:
+                alerts = conn.execute("SELECT COUNT(*) FROM alerts").fetchone()[0]
+            rows = dashboard_load()
+            return rows, alerts, maintenance.db_size(db_path), timed(dashboard_load, args.repeat)
+
+        before = state()
+        start_time = time.perf_counter()
+        report = maintenance.dry_run(retention, db_path)
+        dry_run_seconds = time.perf_counter() - start_time
+
+        # A writer logs one row at a time throughout the pass, as ingest would.
+        latencies, stop = [], threading.Event()
+
+        def writer():
+            row = ('maintenance_bench', datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 9, 1, 0, 0)
+            while not stop.is_set():
+                start = time.perf_counter()
+                with pool.write() as conn:
+                    conn.execute(db_utils.INSERT_ACTIVITY_SQL, row)
+                latencies.append(time.perf_counter() - start)
+                time.sleep(args.write_interval)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            summary = maintenance.run_maintenance(retention, db_path, batch_rows=args.batch_rows,
+                                                  archive_dir=os.path.join(tmpdir, 'archive'))
+        finally:
+            stop.set()
+            thread.join()
+        after = state()
+        pool.close_all()
+
+    mib = 2**20
+    print(f"\n{'':<8} {'activity rows':>14} {'alerts':>10} {'DB MiB':>10} {'load ms':>10}")
+    for label, (rows, alerts, size, load) in (('before', before), ('after', after)):
+        print(f"{label:<8} {rows:>14,} {alerts:>10,} {size / mib:>10.1f} {load * 1000:>10.1f}")
+    print(f"load time {after[3] / before[3]:.2f}x, DB size {after[2] / before[2]:.2f}x")
+    for table, deleted in summary['deleted'].items():
+        archived = f", {deleted['archived']:,} archived" if 'archived' in deleted else ""
+        print(f"  {table:<16} cutoff {deleted['cutoff']}  {deleted['rows']:>10,} rows in {deleted['batches']} batches"
+              f"{archived}")
+    reclaimed = before[2] - summary['size_after']
+    error = abs(report['reclaim_bytes'] - reclaimed) / reclaimed if reclaimed else 0.0
+    print(f"dry run ({dry_run_seconds:.2f} s) estimated {report['reclaim_bytes'] / mib:.1f} MiB; "
+          f"the pass ({summary['seconds']:.2f} s) reclaimed {reclaimed / mib:.1f} MiB ({error:.1%} off)")
+    stall = max(latencies, default=0.0)
+    print(f"writer during the pass: {len(latencies)} inserts, p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.1f} ms, max {stall * 1000:.1f} ms")
+    if args.check:
+        if stall > args.max_stall:
+            raise SystemExit(f"a writer waited {stall:.2f} s, above {args.max_stall:.2f} s")
+        if error > args.max_estimate_error:
+            raise SystemExit(f"the dry-run estimate was {error:.1%} off, above {args.max_estimate_error:.0%}")
+
+# --- ONLINE MODEL ---
+def bench_online(args):
+    """Online sliding-window forest versus periodic full refits: update cost, model size and detection quality."""
+    import pickle
+
+    import evaluation
+    import ml_engine
+    import numpy as np
+    import pandas as pd
+    from sklearn.metrics import average_precision_score, roc_auc_score
+
+    df = evaluation.build_dataset(args.users, args.days, args.seed, view=args.view, insider_fraction=args.insiders)
+    X = df[ml_engine.FEATURES].to_numpy(dtype=np.float64)
+    day = df['timestamp'].str[:10].to_numpy()
+    starts = [0, *(np.flatnonzero(day[1:] != day[:-1]) + 1), len(df)]
+    chunks = list(zip(starts[:-1], starts[1:]))
+    warmup_end = chunks[args.warmup_days - 1][1]
+    scenario = df['Scenario'].astype('category')
+    labels = pd.DataFrame({
+        'Is_Insider': df['Is_Insider'].to_numpy(), 'scenario': scenario.cat.codes.to_numpy(),
+        'user': pd.factorize(df['username'])[0],
+        'seconds': pd.to_datetime(df['timestamp']).to_numpy().astype('datetime64[s]').astype(np.int64),
+    }).iloc[warmup_end:].reset_index(drop=True)
+    print(f"{len(df):,} rows ({args.view} view) over {len(chunks)} days, {args.users} users; "
+          f"{args.warmup_days} warm-up days, then each day is scored and then learned from")
+
+    def refit(end):
+        return ml_engine.fit_model(df.iloc[:end], args.contamination, args.workers)
+
+    def refit_every(days):
+        def update(model, state, first, last, chunk_index):
+            return refit(last) if (chunk_index + 1) % days == 0 else None
+        return update
+
+    def refit_on_growth(model, state, first, last, chunk_index):
+        # The dashboard's rule: retrain once the log has grown by MAX_ROW_GROWTH since the last fit.
+        if last > state.setdefault('rows', warmup_end) * (1 + ml_engine.MAX_ROW_GROWTH):
+            state['rows'] = last
+            return refit(last)
+        return None
+
+    def online_update(model, state, first, last, chunk_index):
+        return model.partial_fit(X[first:last])
+
+    def online_start(end):
+        return ml_engine.SlidingWindowForest(args.contamination, batch_rows=args.batch_rows).partial_fit(X[:end])
+
+    strategies = [
+        (f"refit every {args.refit_every}d", refit, refit_every(args.refit_every)),
+        (f"refit at +{ml_engine.MAX_ROW_GROWTH:.0%} rows", refit, refit_on_growth),
+        ("online window", online_start, online_update),
+    ]
+    results = {}
+    for label, start, update in strategies:
+        model, state = start(warmup_end), {}
+        scores, costs = [], []
+        for chunk_index, (first, last) in enumerate(chunks[args.warmup_days:], start=args.warmup_days):
+            scores.append(model.decision_function(X[first:last]))
+            began = time.perf_counter()
+            updated = update(model, state, first, last, chunk_index)
+            if updated is not None:
+                costs.append(time.perf_counter() - began)
+                model = updated
+        scores = np.concatenate(scores)
+        y = labels['Is_Insider'].to_numpy() == 1
+        quality = evaluation.scenario_metrics(labels, scores < 0, list(scenario.cat.categories))
+        results[label] = {
+            'updates': len(costs), 'mean_s': sum(costs) / len(costs) if costs else 0.0,
+            'max_s': max(costs, default=0.0), 'last_s': costs[-1] if costs else 0.0, 'total_s': sum(costs),
+            'model_bytes': len(pickle.dumps(model)),
+            'auc': roc_auc_score(y, -scores), 'ap': average_precision_score(y, -scores),
+            'incidents': sum(s['incidents'] for s in quality['scenarios'].values()),
+            'detected': sum(s['detected'] for s in quality['scenarios'].values()),
+            **{key: quality[key] for key in ('precision', 'recall', 'f1')},
+        }
+
+    print(f"\n{'strategy':<20} {'updates':>7} {'mean ms':>9} {'max ms':>9} {'last ms':>9} {'total s':>8} "
+          f"{'model KiB':>9} {'AUC':>6} {'AP':>6} {'prec':>6} {'recall':>6} {'F1':>6} {'incidents':>9}")
+    for label, r in results.items():
+        print(f"{label:<20} {r['updates']:>7} {r['mean_s'] * 1000:>9.1f} {r['max_s'] * 1000:>9.1f} "
+              f"{r['last_s'] * 1000:>9.1f} {r['total_s']:>8.2f} {r['model_bytes'] / 1024:>9,.0f} {r['auc']:>6.3f} "
+              f"{r['ap']:>6.3f} {r['precision']:>6.3f} {r['recall']:>6.3f} {r['f1']:>6.3f} "
+              f"{r['detected']:>4}/{r['incidents']:<4}")
+    if args.check:
+        online = results['online window']
+        refits = [r for label, r in results.items() if label != 'online window']
+        slowest_refit = max(r['last_s'] for r in refits)
+        best_auc = max(r['auc'] for r in refits)
+        if online['max_s'] >= slowest_refit:
+            raise SystemExit(f"online updates took up to {online['max_s']:.2f} s, no faster than a refit "
+                             f"({slowest_refit:.2f} s)")
+        if online['auc'] < best_auc - args.max_auc_drop:
+            raise SystemExit(f"online AUC {online['auc']:.3f} is more than {args.max_auc_drop} below {best_auc:.3f}")
+
+# --- PAGE LOAD ---
+# (page, needs a logged-in Admin). Pages under pages/ are laid out as Streamlit expects;
+# dashboard.py is the standalone CSV upload app.
+PAGES = [
+    ('Login.py', False),
+    ('pages/2_Sign_Up.py', False),
+    ('pages/3_Email_Client.py', True),
+    ('pages/4_File_Explorer.py', True),
+    ('pages/1_Threat_Dashboard.py', True),
+    ('pages/5_Diagnostics.py', True),
+    ('dashboard.py', False),
+]
+HEAVY_MODULES = ('pandas', 'pyarrow', 'sklearn', 'plotly.express')
+# Pages that only log activity; --check fails if they load any of these.
+LIGHT_PAGES = {'Login.py', 'pages/2_Sign_Up.py', 'pages/3_Email_Client.py', 'pages/4_File_Explorer.py',
+               'dashboard.py'}
+LIGHT_FORBIDDEN = ('pandas', 'pyarrow', 'sklearn')
+
+# Runs in a fresh interpreter per page. Streamlit itself is imported first and
+# not counted: every page pays for it. The page's own top-level imports are
+# then timed, followed by its first and second (warm) script runs.
+_PAGE_PROBE = r"""
+import ast, json, sys, time
+app_dir, page, gated = sys.argv[1], sys.argv[2], sys.argv[3] == '1'
+sys.path.insert(0, app_dir)
+from streamlit.testing.v1 import AppTest
+
+def loaded():
+    return [name for name in HEAVY if name in sys.modules]
+
+HEAVY = json.loads(sys.argv[4])
+with open(page, encoding='utf-8') as f:
+    tree = ast.parse(f.read())
+imports = ast.Module([node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))], [])
+before = len(sys.modules)
+start = time.perf_counter()
+exec(compile(imports, page, 'exec'), {'__name__': '__page__'})
+import_s = time.perf_counter() - start
+result = {'import_s': import_s, 'modules': len(sys.modules) - before, 'heavy_after_import': loaded()}
+
+# Pages under pages/ link back to Login.py, so they are reached from it as in the app.
+multipage = page.startswith('pages/')
+at = AppTest.from_file('Login.py' if multipage else page, default_timeout=300)
+if multipage:
+    at.run()
+    if gated:
+        at.session_state['logged_in'] = True
+        at.session_state['username'] = 'admin'
+        at.session_state['role'] = 'Admin'
+    at.switch_page(page)
+for key in ('first_render_s', 'warm_render_s'):
+    start = time.perf_counter()
+    at.run()
+    result[key] = time.perf_counter() - start
+result['heavy_after_render'] = loaded()
+result['exceptions'] = [str(e.value) for e in at.exception]
+print(json.dumps(result))
+"""
+
+def stage_app(app_dir, rows, users):
+    """Copies the app into `app_dir` with the multipage layout and a synthetic database."""
+    import shutil
+    import synthetic_data
+
+    source = os.path.dirname(os.path.abspath(__file__))
+    os.makedirs(os.path.join(app_dir, 'pages'))
+    for name in os.listdir(source):
+        if name.endswith('.py') or name == 'Insider_Threat.png':
+            shutil.copy(os.path.join(source, name), app_dir)
+    for page, _ in PAGES:
+        if page.startswith('pages/'):
+            os.replace(os.path.join(app_dir, os.path.basename(page)), os.path.join(app_dir, page))
+    days = synthetic_data.days_for_rows(rows, users)
+    synthetic_data.write_activity(synthetic_data.iter_activity(users, days, max_rows=rows),
+                                  os.path.join(app_dir, db_pool.DB_NAME))
+
+def bench_pages(args):
+    """Import time and first-render time per Streamlit page, each in a fresh interpreter."""
+    import json
+    import statistics
+    import subprocess
+    import sys
+
+    pages = [(page, gated) for page, gated in PAGES if not args.pages or page in args.pages]
+    results, failed = [], []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        stage_app(tmpdir, args.rows, args.users)
+        for page, gated in pages:
+            runs = []
+            for _ in range(args.runs):
+                probe = subprocess.run([sys.executable, '-c', _PAGE_PROBE, tmpdir, page, str(int(gated)),
+                                        json.dumps(HEAVY_MODULES)],
+                                       cwd=tmpdir, capture_output=True, text=True)
+                if probe.returncode:
+                    raise SystemExit(f"{page} failed:\n{probe.stderr}")
+                runs.append(json.loads(probe.stdout.strip().splitlines()[-1]))
+            result = {'page': page, 'runs': len(runs)}
+            for key in ('import_s', 'first_render_s', 'warm_render_s'):
+                result[key] = round(statistics.median(run[key] for run in runs), 4)
+            last = runs[-1]
+            result.update(modules=last['modules'], heavy_after_import=last['heavy_after_import'],
+                          heavy_after_render=last['heavy_after_render'], exceptions=last['exceptions'])
+            results.append(result)
+            if page in LIGHT_PAGES and set(result['heavy_after_render']) & set(LIGHT_FORBIDDEN):
+                failed.append(f"{page} loaded {', '.join(sorted(set(result['heavy_after_render']) & set(LIGHT_FORBIDDEN)))}")
+            if result['exceptions']:
+                failed.append(f"{page} raised {result['exceptions'][0]}")
+
+    print(f"{'page':<30} {'import':>9} {'first run':>10} {'warm run':>9} {'modules':>8}  heavy modules loaded")
+    for r in results:
+        print(f"{r['page']:<30} {r['import_s'] * 1000:7.0f}ms {r['first_render_s'] * 1000:8.0f}ms "
+              f"{r['warm_render_s'] * 1000:7.0f}ms {r['modules']:>8}  {', '.join(r['heavy_after_render']) or '-'}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'rows': args.rows, 'pages': results}, f, indent=2)
+        print(f"Results written to {args.output}")
+    for failure in failed:
+        print(f"FAIL: {failure}")
+    if args.check and failed:
+        raise SystemExit(1)
+
+BENCHMARKS = {
+    'db': bench_db,
+    'loader': bench_loader,
+    'stream': bench_stream,
+    'parallel': bench_parallel,
+    'windows': bench_windows,
+    'suite': bench_suite,
+    'ingest': bench_ingest,
+    'auth': bench_auth,
+    'engine': bench_engine,
+    'instrumentation': bench_instrumentation,
+    'maintenance': bench_maintenance,
+    'online': bench_online,
+    'pages': bench_pages,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    db = subparsers.add_parser('db', help=bench_db.__doc__)
+    db.add_argument('--threads', type=int, default=8)
+    db.add_argument('--inserts', type=int, default=500, help="Inserts per thread.")
+
+    loader = subparsers.add_parser('loader', help=bench_loader.__doc__)
+    loader.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+
+    stream = subparsers.add_parser('stream', help=bench_stream.__doc__)
+    stream.add_argument('--rows', type=int, default=10_000_000)
+    stream.add_argument('--chunksize', type=int, default=250_000)
+    stream.add_argument('--engines', nargs='+', choices=['rules', 'ml'], default=['rules', 'ml'])
+    stream.add_argument('--compare', action='store_true', help="Also score the whole file in memory.")
+
+    parallel = subparsers.add_parser('parallel', help=bench_parallel.__doc__)
+    parallel.add_argument('--rows', type=int, default=2_000_000)
+    parallel.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+
+    windows = subparsers.add_parser('windows', help=bench_windows.__doc__)
+    windows.add_argument('--rows', type=int, default=1_000_000)
+    windows.add_argument('--batch', type=int, default=1_000, help="New rows per update.")
+
+    suite = subparsers.add_parser('suite', help=bench_suite.__doc__)
+    suite.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                       help="Row counts to run at; the stages stream, so sizes up to 100M fit in memory.")
+    suite.add_argument('--stages', nargs='+', choices=SUITE_STAGES, default=list(SUITE_STAGES))
+    suite.add_argument('--users', type=int, default=1000)
+    suite.add_argument('--chunk-rows', type=int, default=250_000, help="Rows per scoring chunk.")
+    suite.add_argument('--batch-rows', type=int, default=1_000, help="Rows per ingest transaction.")
+    suite.add_argument('--fit-rows', type=int, default=1_000_000, help="Rows the IsolationForest is fitted on.")
+    suite.add_argument('--workers', type=int, default=None)
+    suite.add_argument('--repeat', type=int, default=20, help="Warm dashboard loads to time.")
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--output', help="Write the results as JSON to this file.")
+    suite.add_argument('--compare', metavar='JSON', help="Compare throughput with an earlier --output file.")
+    suite.add_argument('--tolerance', type=float, default=0.1,
+                       help="Allowed throughput drop before --compare exits non-zero.")
+
+    ingest = subparsers.add_parser('ingest', help=bench_ingest.__doc__)
+    ingest.add_argument('--clients', type=int, default=8, help="Concurrent agent connections.")
+    ingest.add_argument('--batch', type=int, default=500, help="Events per request.")
+    ingest.add_argument('--seconds', type=float, default=20)
+    ingest.add_argument('--users', type=int, default=200)
+    ingest.add_argument('--unix', action='store_true', help="Use the Unix socket instead of HTTP.")
+    ingest.add_argument('--check', action='store_true',
+                        help="Exit non-zero below ingest_service.TARGET_EVENTS_PER_SEC.")
+
+    auth_parser = subparsers.add_parser('auth', help=bench_auth.__doc__)
+    auth_parser.add_argument('--users', type=int, default=50)
+    auth_parser.add_argument('--threads', type=int, default=4, help="Legitimate login threads.")
+    auth_parser.add_argument('--attackers', type=int, default=8, help="Brute-force threads.")
+    auth_parser.add_argument('--attack-rate', type=float, default=1000, help="Brute-force attempts per second.")
+    auth_parser.add_argument('--seconds', type=float, default=5)
+
+    engine_parser = subparsers.add_parser('engine', help=bench_engine.__doc__)
+    engine_parser.add_argument('--rows', type=int, default=200_000)
+    engine_parser.add_argument('--users', type=int, default=500)
+    engine_parser.add_argument('--chunk-rows', type=int, default=50_000, help="Rows per chunk for the streaming runs.")
+    engine_parser.add_argument('--workers', type=int, default=None)
+    engine_parser.add_argument('--repeat', type=int, default=3)
+
+    instrumented = subparsers.add_parser('instrumentation', help=bench_instrumentation.__doc__)
+    instrumented.add_argument('--rows', type=int, default=100_000)
+    instrumented.add_argument('--users', type=int, default=500)
+    instrumented.add_argument('--spans', type=int, default=200_000, help="Spans timed in the tight loop.")
+    instrumented.add_argument('--repeat', type=int, default=9)
+    instrumented.add_argument('--max-overhead', type=float, default=0.01,
+                              help="Largest share of a dashboard pass the spans may take with --check.")
+    instrumented.add_argument('--check', action='store_true')
+
+    maintained = subparsers.add_parser('maintenance', help=bench_maintenance.__doc__)
+    maintained.add_argument('--users', type=int, default=100)
+    maintained.add_argument('--days', type=int, default=365)
+    maintained.add_argument('--retention', nargs='+', default=['activity_logs=180'], metavar='TABLE=DAYS',
+                            help="Override maintenance.RETENTION, e.g. activity_logs=90 activity_hourly=180.")
+    maintained.add_argument('--batch-rows', type=int, default=5_000)
+    maintained.add_argument('--write-interval', type=float, default=0.01,
+                            help="Seconds between the concurrent writer's inserts.")
+    maintained.add_argument('--repeat', type=int, default=3)
+    maintained.add_argument('--max-stall', type=float, default=0.5,
+                            help="Longest a concurrent insert may wait with --check, in seconds.")
+    maintained.add_argument('--max-estimate-error', type=float, default=0.25,
+                            help="Largest relative gap between the dry-run estimate and the space reclaimed.")
+    maintained.add_argument('--check', action='store_true')
+
+    online = subparsers.add_parser('online', help=bench_online.__doc__)
+    online.add_argument('--users', type=int, default=200)
+    online.add_argument('--days', type=int, default=120)
+    online.add_argument('--view', choices=['event', '1h', '24h'], default='1h',
+                        help="Features scored, as in evaluation.py; insider bursts only stand out when windowed.")
+    online.add_argument('--insiders', type=float, default=0.05, help="Share of users given an insider scenario.")
+    online.add_argument('--seed', type=int, default=0)
+    online.add_argument('--warmup-days', type=int, default=14)
+    online.add_argument('--refit-every', type=int, default=7, help="Days between periodic full refits.")
+    online.add_argument('--contamination', type=float, default=0.05)
+    online.add_argument('--batch-rows', type=int, default=20_000, help="Rows per online ensemble member.")
+    online.add_argument('--workers', type=int, default=None)
+    online.add_argument('--max-auc-drop', type=float, default=0.03,
+                        help="How far the online model's ROC AUC may fall below the best refit with --check.")
+    online.add_argument('--check', action='store_true')
+
+    pages = subparsers.add_parser('pages', help=bench_pages.__doc__)
+    pages.add_argument('--pages', nargs='+', choices=[page for page, _ in PAGES], help="Default: all pages.")
+    pages.add_argument('--rows', type=int, default=20_000, help="Synthetic activity rows in the page database.")
+    pages.add_argument('--users', type=int, default=100)
+    pages.add_argument('--runs', type=int, default=3, help="Fresh interpreters per page; medians are reported.")
+    pages.add_argument('--output', help="Write the results as JSON to this file.")
+    pages.add_argument('--check', action='store_true',
+                       help="Exit non-zero if a page raises or a light page loads pandas, pyarrow or scikit-learn.")
+
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+if __name__ == '__main__':
+    main()
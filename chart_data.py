@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+# Risk scores are always in [0, 1], so every chart uses the same fixed bins.
+RISK_BINS = 20
+# The heatmap shows at most this many users, those with the most alerts.
+HEATMAP_USERS = 25
+
+def risk_histogram(scores, bins=RISK_BINS):
+    """Pre-bins risk scores into `bins` equal buckets over [0, 1].
+
+    Returns a frame of bin_start, bin_end and count; it has `bins` rows no
+    matter how many scores there are. A score of exactly 1.0 lands in the
+    last bin.
+    """
+    # floor(score * bins), as in db_utils.get_alert_histogram, so both paths bucket identically.
+    buckets = np.clip(np.floor(np.asarray(scores, dtype=float) * bins), 0, bins - 1).astype(np.int64)
+    counts = np.bincount(buckets, minlength=bins)
+    return histogram_frame(counts, np.linspace(0.0, 1.0, bins + 1))
+
+def histogram_frame(counts, edges):
+    return pd.DataFrame({'bin_start': edges[:-1], 'bin_end': edges[1:], 'count': counts})
+
+def bucket_counts_to_histogram(bucket_counts, bins=RISK_BINS):
+    """Turns (bucket, count) rows from SQL bucketing into a risk_histogram frame."""
+    counts = np.zeros(bins, dtype=np.int64)
+    for bucket, count in bucket_counts:
+        counts[min(max(int(bucket), 0), bins - 1)] += count
+    return histogram_frame(counts, np.linspace(0.0, 1.0, bins + 1))
+
+def alert_heatmap(df, max_users=HEATMAP_USERS):
+    """Counts alerts per user and Login_Hour as a users x 24 frame.
+
+    Alerts without a Login_Hour get -1, the hourly rollup's marker for an
+    unknown hour, and so fall outside the 24 columns.
+    """
+    user_column = 'username' if 'username' in df.columns else 'User_ID'
+    counts = df.groupby([df[user_column].astype(str), df['Login_Hour'].fillna(-1).astype(int)]).size()
+    return heatmap_frame(counts.rename_axis(['username', 'hour']).reset_index(name='count'), max_users)
+
+def heatmap_frame(counts, max_users=HEATMAP_USERS):
+    """Pivots (username, hour, count) rows into a users x 24 frame, busiest users first."""
+    pivot = counts.pivot_table(index='username', columns='hour', values='count', aggfunc='sum', fill_value=0)
+    pivot = pivot.reindex(columns=range(24), fill_value=0)
+    top_users = pivot.sum(axis=1).sort_values(ascending=False, kind='stable').index[:max_users]
+    return pivot.loc[top_users]
@@ -1,30 +1,42 @@
 import sqlite3
 
-DB_NAME = "insider_threat.db"
+from archive import ARCHIVE_DIR, clear_archive
+from db_pool import DB_NAME
+from db_utils import bump_data_epoch, get_db
 
-def clear_all_data():
-    """Deletes all records from users and activity_logs tables."""
+def clear_all_data(db_name=DB_NAME, archive_dir=ARCHIVE_DIR):
+    """Deletes all records from users, activity_logs and the tables derived from it.
+
+    The Parquet archive goes too, since log_ids restart at 1 and would
+    collide with archived parts. Bumping the data epoch also expires auth's
+    cached accounts.
+    """
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-        print("Clearing 'activity_logs' table...")
-        cursor.execute("DELETE FROM activity_logs")
-        
-        print("Clearing 'users' table...")
-        cursor.execute("DELETE FROM users")
-        
-        # Optional: Reset the auto-increment counters for a true fresh start
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name IN ('activity_logs', 'users')")
+        with get_db(db_name).write() as conn:
+            cursor = conn.cursor()
+            
+            print("Clearing 'activity_logs' table...")
+            cursor.execute("DELETE FROM activity_logs")
+            cursor.execute("DELETE FROM activity_hourly")
+            cursor.execute("DELETE FROM activity_daily")
+            cursor.execute("DELETE FROM user_baselines")
+            cursor.execute("DELETE FROM user_hour_histogram")
+            cursor.execute("DELETE FROM alerts")
+            
+            print("Clearing 'users' table...")
+            cursor.execute("DELETE FROM users")
+            
+            # Optional: Reset the auto-increment counters for a true fresh start
+            cursor.execute("DELETE FROM sqlite_sequence WHERE name IN ('activity_logs', 'users', 'alerts')")
+            bump_data_epoch(conn)
 
-        conn.commit()
+        # Only once the tables are cleared, so a failed reset keeps the archive.
+        if clear_archive(archive_dir):
+            print("Removed the Parquet activity archive.")
         print("Database has been cleared successfully.")
         
     except sqlite3.Error as e:
         print(f"An error occurred: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 if __name__ == '__main__':
-    clear_all_data()
\ No newline at end of file
+    clear_all_data()
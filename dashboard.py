@@ -1,7 +1,6 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from sklearn.ensemble import IsolationForest
+
+from alert_view import filter_frame, page_of, render_alert_filters, render_page_picker, style_risk
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
@@ -16,71 +15,6 @@ def convert_df_to_csv(df):
     """Converts a DataFrame to a CSV string for downloading."""
     return df.to_csv(index=False).encode('utf-8')
 
-def style_risk(df):
-    """Applies color styling to the DataFrame based on Risk Score."""
-    def get_color(score):
-        if score > 0.66:
-            return 'background-color: #ff4d4d; color: white;' # High Risk - Red
-        elif score > 0.33:
-            return 'background-color: #ffa500;' # Medium Risk - Orange
-        else:
-            return 'background-color: #ffe4b2;' # Low Risk - Light Orange
-            
-    return df.style.applymap(get_color, subset=['Risk_Score'])
-
-# --- DETECTION LOGIC ---
-def detect_threats_rules(df, thresholds):
-    """Rule-based detection with risk scoring."""
-    df['Risk_Score'] = 0
-    df['Reason'] = ''
-    
-    # Calculate score based on number of rules broken
-    score_increment = 1.0 / len(thresholds)
-    
-    # Rule 1: Unusual Login Hours
-    rule1 = (df['Login_Hour'] >= thresholds['late_hour']) | (df['Login_Hour'] <= thresholds['early_hour'])
-    df.loc[rule1, 'Risk_Score'] += score_increment
-    df.loc[rule1, 'Reason'] += 'Unusual Login; '
-
-    # Rule 2: Excessive File Access
-    rule2 = df['Files_Accessed'] > thresholds['files_accessed']
-    df.loc[rule2, 'Risk_Score'] += score_increment
-    df.loc[rule2, 'Reason'] += 'Excessive Files; '
-    
-    # Rule 3: High Email Volume
-    rule3 = df['Emails_Sent'] > thresholds['emails_sent']
-    df.loc[rule3, 'Risk_Score'] += score_increment
-    df.loc[rule3, 'Reason'] += 'High Emails; '
-    
-    # Rule 4: Multiple USBs
-    rule4 = df['USB_Devices_Used'] >= thresholds['usb_devices']
-    df.loc[rule4, 'Risk_Score'] += score_increment
-    df.loc[rule4, 'Reason'] += 'Multiple USBs; '
-
-    suspicious_df = df[df['Risk_Score'] > 0].copy()
-    suspicious_df['Reason'] = suspicious_df['Reason'].str.strip().str.rstrip(';')
-    return suspicious_df.sort_values(by='Risk_Score', ascending=False)
-
-def detect_threats_ml(df, contamination=0.1):
-    """ML-based anomaly detection using Isolation Forest."""
-    features = ['Login_Hour', 'Files_Accessed', 'Emails_Sent', 'USB_devices_Used'.replace('_','')]
-    # Quick fix for potential column name mismatch
-    if 'USB_devices_Used' not in df.columns and 'USB_Devices_Used' in df.columns:
-        features = ['Login_Hour', 'Files_Accessed', 'Emails_Sent', 'USB_Devices_Used']
-        
-    X = df[features]
-    
-    model = IsolationForest(contamination=contamination, random_state=42)
-    df['Anomaly'] = model.fit_predict(X) # -1 for anomalies, 1 for inliers
-    
-    # Create a risk score from anomaly scores
-    df['Risk_Score'] = model.decision_function(X)
-    df['Risk_Score'] = (df['Risk_Score'].min() - df['Risk_Score']) / (df['Risk_Score'].min() - df['Risk_Score'].max())
-    
-    suspicious_df = df[df['Anomaly'] == -1].copy()
-    suspicious_df['Reason'] = 'ML Anomaly Detected'
-    return suspicious_df.sort_values(by='Risk_Score', ascending=False)
-
 # --- SIDEBAR ---
 with st.sidebar:
     st.title("🛡️ Threat Detection Engine")
@@ -114,29 +48,43 @@ with st.sidebar:
 st.title("🤖 Advanced Insider Threat Dashboard")
 
 if uploaded_file:
-    df = pd.read_csv(uploaded_file)
-    
-    if detection_method == "Rule-Based Engine":
-        suspicious_df = detect_threats_rules(df, thresholds)
-    else:
-        suspicious_df = detect_threats_ml(df, contamination_rate)
+    # pandas, scikit-learn and plotly are only needed once there is a file to score.
+    import plotly.express as px
+
+    from chart_data import RISK_BINS, risk_histogram
+    from stream_scoring import score_csv
+
+    # Score the upload in chunks so only suspicious rows are ever held in memory.
+    try:
+        if detection_method == "Rule-Based Engine":
+            suspicious_df, total_rows = score_csv(uploaded_file, engine='rules', thresholds=thresholds)
+        else:
+            # Uploaded files are scored on their own: the model is fitted on the first chunk and not persisted.
+            suspicious_df, total_rows = score_csv(uploaded_file, engine='ml', contamination=contamination_rate)
+    # Bad values, unparsable CSV (ParserError is a ValueError) and missing columns.
+    except (ValueError, KeyError) as e:
+        st.error(f"Could not score {uploaded_file.name}: {e}")
+        st.stop()
 
     # --- METRICS AND CHARTS ---
     st.markdown("### 📊 Dashboard Overview")
     col1, col2 = st.columns([1, 1])
     with col1:
-        st.metric("Total Activities Logged", f"{len(df):,}")
+        st.metric("Total Activities Logged", f"{total_rows:,}")
         st.metric("Alerts Generated", f"{len(suspicious_df):,}")
     
     with col2:
         if not suspicious_df.empty:
-            fig = px.histogram(
-                suspicious_df, 
-                x='Risk_Score', 
-                nbins=20, 
+            # Send pre-binned counts rather than every alert row to the browser.
+            fig = px.bar(
+                risk_histogram(suspicious_df['Risk_Score']),
+                x='bin_start',
+                y='count',
                 title='Distribution of Alert Risk Scores',
+                labels={'bin_start': 'Risk_Score', 'count': 'Alerts'},
                 color_discrete_sequence=['#ff4d4d']
             )
+            fig.update_traces(width=1.0 / RISK_BINS, offset=0)
             st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("No alerts to generate risk distribution chart.")
@@ -146,9 +94,15 @@ if uploaded_file:
     # --- ALERTS TABLE ---
     st.markdown("### 🚨 Alert Log")
     if not suspicious_df.empty:
-        st.dataframe(style_risk(suspicious_df), use_container_width=True)
+        user_column = 'username' if 'username' in suspicious_df.columns else 'User_ID'
+        filters = render_alert_filters(sorted(suspicious_df[user_column].astype(str).unique()))
+        filtered_df = filter_frame(suspicious_df, **filters)
+        page, page_size = render_page_picker(len(filtered_df))
+        # Only the visible page is styled and sent to the browser.
+        page_df = page_of(filtered_df, page, page_size).drop(columns=['Reason_Mask'], errors='ignore')
+        st.dataframe(style_risk(page_df), use_container_width=True)
         
-        csv_download = convert_df_to_csv(suspicious_df)
+        csv_download = convert_df_to_csv(filtered_df.drop(columns=['Reason_Mask'], errors='ignore'))
         st.download_button(
             label="📥 Download Alerts as CSV",
             data=csv_download,
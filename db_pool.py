@@ -0,0 +1,155 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_NAME = "insider_threat.db"
+
+# Pragmas applied to every pooled connection.
+# auto_vacuum only takes effect on a new file (or after a full VACUUM, see
+# maintenance.compact); it lets freed pages be returned to the filesystem.
+# WAL lets readers run alongside the single writer, NORMAL sync only fsyncs
+# at checkpoints, and a negative cache_size is measured in KiB.
+PRAGMAS = (
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=OFF",
+)
+BUSY_TIMEOUT_SECONDS = 30
+STATEMENT_CACHE_SIZE = 256
+# Idle connections kept for reuse; extra ones opened under load are closed on return.
+POOL_SIZE = 8
+
+
+class ConnectionPool:
+    """Thread-safe connection manager for one SQLite database file.
+
+    Connections are checked out for the length of a read() or write() block
+    and returned afterwards, so connection setup and statement preparation
+    are reused across threads (Streamlit runs every rerun on a new one)
+    while at most `size` idle connections stay open. Nested blocks on one
+    thread share the connection already checked out. Writes are serialized
+    through a process-wide lock so concurrent Streamlit sessions queue up
+    instead of failing with "database is locked".
+    """
+
+    def __init__(self, db_name=DB_NAME, size=POOL_SIZE):
+        self.db_name = db_name
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=BUSY_TIMEOUT_SECONDS,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Checks out a connection for the block, reusing this thread's if it already holds one."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._release(conn)
+
+    def _release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+
+    @contextmanager
+    def read(self):
+        """Yields a connection for read-only queries."""
+        with self.connection() as conn:
+            yield conn
+
+    @contextmanager
+    def write(self):
+        """Yields a connection inside a single write transaction.
+
+        Commits on success and rolls back if the block raises. A write()
+        nested in another on the same thread runs in a savepoint of the
+        outer transaction, so only the outermost block commits.
+        """
+        with self.connection() as conn, self._write_lock:
+            depth = getattr(self._local, 'write_depth', 0)
+            self._local.write_depth = depth + 1
+            try:
+                if depth:
+                    yield from self._savepoint(conn, depth)
+                    return
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    yield conn
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+            finally:
+                self._local.write_depth = depth
+
+    @staticmethod
+    def _savepoint(conn, depth):
+        name = f"nested_write_{depth}"
+        conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute(f"ROLLBACK TO {name}")
+            conn.execute(f"RELEASE {name}")
+            raise
+        conn.execute(f"RELEASE {name}")
+
+    @contextmanager
+    def exclusive(self):
+        """Yields a connection holding the write lock but outside any transaction.
+
+        For statements SQLite refuses to run inside one, such as VACUUM and
+        wal_checkpoint.
+        """
+        with self.connection() as conn, self._write_lock:
+            yield conn
+
+    def close_all(self):
+        """Closes every idle connection held by this pool."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_name=DB_NAME):
+    """Returns the shared pool for `db_name`, creating it on first use."""
+    with _pools_lock:
+        pool = _pools.get(db_name)
+        if pool is None:
+            pool = ConnectionPool(db_name)
+            _pools[db_name] = pool
+        return pool
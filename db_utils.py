@@ -1,14 +1,22 @@
-import sqlite3
-import pandas as pd
+import atexit
+import threading
 from datetime import datetime
 
-DB_NAME = "insider_threat.db"
+# pandas is imported inside the read functions, so pages that only log activity never load it.
+import alerting
+import baselines
+from db_pool import DB_NAME, get_pool
+from instrumentation import span
 
 def init_db():
     """Initializes the database with users and activity_logs tables."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
+    with get_pool().write() as conn:
+        _create_schema(conn.cursor())
+        migrate_db(conn)
+    print("Database initialized successfully with user roles.")
+
+def _create_schema(cursor):
+    """Creates the tables if they do not exist yet."""
     # Add a 'role' column to the users table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -31,32 +39,432 @@ def init_db():
             FOREIGN KEY (username) REFERENCES users (username)
         )
     ''')
-    
-    conn.commit()
-    conn.close()
-    print("Database initialized successfully with user roles.")
 
-# ... (the rest of your db_utils.py file remains the same) ...
-def log_activity(username, login_hour, files_accessed, emails_sent, usb_devices):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+# --- SCHEMA MIGRATIONS ---
+# Each entry upgrades the schema by one version; PRAGMA user_version records
+# how many have been applied, so existing insider_threat.db files pick up
+# new indexes and tables the first time they are opened.
+
+def _migration_1_indexes_and_hourly_rollup(cursor):
+    """Indexes activity_logs and adds the per-user, per-hour rollup table."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_user_time ON activity_logs (username, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_activity_time ON activity_logs (timestamp)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS activity_hourly (
+            username TEXT NOT NULL,
+            hour_start TEXT NOT NULL,
+            Login_Hour INTEGER NOT NULL,
+            Files_Accessed INTEGER NOT NULL DEFAULT 0,
+            Emails_Sent INTEGER NOT NULL DEFAULT 0,
+            USB_Devices_Used INTEGER NOT NULL DEFAULT 0,
+            Event_Count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, hour_start, Login_Hour)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hourly_time ON activity_hourly (hour_start)")
+    # Keep the rollup current at ingest time; deletes from activity_logs are
+    # deliberately not propagated so old raw rows can be pruned while their
+    # hourly aggregates are kept.
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_activity_hourly AFTER INSERT ON activity_logs
+        BEGIN
+            INSERT INTO activity_hourly (username, hour_start, Login_Hour, Files_Accessed,
+                                         Emails_Sent, USB_Devices_Used, Event_Count)
+            VALUES (NEW.username, strftime('%Y-%m-%d %H:00:00', NEW.timestamp), COALESCE(NEW.Login_Hour, -1),
+                    COALESCE(NEW.Files_Accessed, 0), COALESCE(NEW.Emails_Sent, 0),
+                    COALESCE(NEW.USB_Devices_Used, 0), 1)
+            ON CONFLICT (username, hour_start, Login_Hour) DO UPDATE SET
+                Files_Accessed = Files_Accessed + excluded.Files_Accessed,
+                Emails_Sent = Emails_Sent + excluded.Emails_Sent,
+                USB_Devices_Used = USB_Devices_Used + excluded.USB_Devices_Used,
+                Event_Count = Event_Count + 1;
+        END
+    ''')
+    # Backfill from rows logged before the trigger existed.
+    cursor.execute("DELETE FROM activity_hourly")
+    cursor.execute('''
+        INSERT INTO activity_hourly (username, hour_start, Login_Hour, Files_Accessed,
+                                     Emails_Sent, USB_Devices_Used, Event_Count)
+        SELECT username, strftime('%Y-%m-%d %H:00:00', timestamp), COALESCE(Login_Hour, -1),
+               SUM(COALESCE(Files_Accessed, 0)), SUM(COALESCE(Emails_Sent, 0)),
+               SUM(COALESCE(USB_Devices_Used, 0)), COUNT(*)
+        FROM activity_logs
+        GROUP BY 1, 2, 3
+    ''')
+
+def _migration_2_data_epoch(cursor):
+    """Adds db_meta with a data_epoch counter bumped whenever logged rows are removed."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS db_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO db_meta (key, value) VALUES ('data_epoch', 0)")
+
+def _migration_3_user_baselines(cursor):
+    """Adds per-user behavioural baselines and builds them from the existing log."""
+    baselines.create_tables(cursor)
+    baselines.rebuild_baselines(cursor.connection)
+
+def _migration_4_alerts(cursor):
+    """Adds the alerts table filled by the ingest-time evaluator."""
+    alerting.create_tables(cursor)
+
+def _migration_5_daily_rollup(cursor):
+    """Adds activity_daily, which keeps per-user daily totals once hourly rows expire."""
+    # Filled by maintenance.downsample_hourly; Login_Hour -1 (unknown) is left
+    # out of the first/last hour so they stay NULL when no hour was recorded.
     cursor.execute('''
-        INSERT INTO activity_logs (username, timestamp, Login_Hour, Files_Accessed, Emails_Sent, USB_Devices_Used)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (username, timestamp, login_hour, files_accessed, emails_sent, usb_devices))
-    conn.commit()
-    conn.close()
+        CREATE TABLE IF NOT EXISTS activity_daily (
+            username TEXT NOT NULL,
+            day TEXT NOT NULL,
+            Files_Accessed INTEGER NOT NULL DEFAULT 0,
+            Emails_Sent INTEGER NOT NULL DEFAULT 0,
+            USB_Devices_Used INTEGER NOT NULL DEFAULT 0,
+            Event_Count INTEGER NOT NULL DEFAULT 0,
+            First_Login_Hour INTEGER,
+            Last_Login_Hour INTEGER,
+            PRIMARY KEY (username, day)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_daily_day ON activity_daily (day)")
+
+MIGRATIONS = [
+    _migration_1_indexes_and_hourly_rollup,
+    _migration_2_data_epoch,
+    _migration_3_user_baselines,
+    _migration_4_alerts,
+    _migration_5_daily_rollup,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def migrate_db(conn):
+    """Applies any pending migrations inside the caller's write transaction."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        migration(conn.cursor())
+        conn.execute(f"PRAGMA user_version = {number}")
+        print(f"Applied schema migration {number}: {migration.__doc__}")
+
+_migrated = set()
+_schema_lock = threading.Lock()
+
+def get_db(db_name=DB_NAME):
+    """Returns the shared pool, creating or migrating the schema once per process."""
+    if db_name not in _migrated:
+        with _schema_lock:
+            if db_name not in _migrated:
+                with get_pool(db_name).write() as conn:
+                    _create_schema(conn.cursor())
+                    migrate_db(conn)
+                _migrated.add(db_name)
+    return get_pool(db_name)
+
+# --- ACTIVITY LOGGING ---
+INSERT_ACTIVITY_SQL = '''
+    INSERT INTO activity_logs (username, timestamp, Login_Hour, Files_Accessed, Emails_Sent, USB_Devices_Used)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def _insert_activity_rows(rows, db_name=DB_NAME):
+    """Inserts fully-formed (username, timestamp, ...) rows in one transaction.
+
+    The new rows are then handed to the background alert worker, so alert
+    evaluation never delays the caller.
+    """
+    if not rows:
+        return
+    with span('db.insert') as s, get_db(db_name).write() as conn:
+        conn.executemany(INSERT_ACTIVITY_SQL, rows)
+        baselines.update_baselines(conn, rows)
+        # The write lock is held, so the new log_ids are consecutive up to the sequence value.
+        last_log_id = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'activity_logs'").fetchone()[0]
+        s.add(rows=len(rows))
+    alerting.get_alert_worker(db_name).submit(last_log_id - len(rows) + 1, last_log_id)
+
+def log_activity(username, login_hour, files_accessed, emails_sent, usb_devices):
+    _insert_activity_rows([(username, _now(), login_hour, files_accessed, emails_sent, usb_devices)])
+
+def log_activities_bulk(rows, timestamp=None):
+    """Logs many activity rows with a single executemany and one commit.
+
+    `rows` is an iterable of (username, login_hour, files_accessed,
+    emails_sent, usb_devices) tuples. All rows share one timestamp, taken
+    once for the whole batch unless `timestamp` is given.
+    """
+    timestamp = timestamp or _now()
+    _insert_activity_rows([(username, timestamp, login_hour, files_accessed, emails_sent, usb_devices)
+                           for username, login_hour, files_accessed, emails_sent, usb_devices in rows])
+
+class ActivityBuffer:
+    """In-process write buffer for high-rate activity producers.
+
+    `append` only takes a lock and stores the row, so callers never wait on
+    SQLite. A background thread flushes the buffer with one bulk insert once
+    it holds `max_rows` rows or `flush_interval` seconds have passed, and an
+    atexit hook flushes whatever is left when the process shuts down.
+    """
+
+    def __init__(self, max_rows=500, flush_interval=1.0):
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self._rows = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="activity-buffer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append(self, username, login_hour, files_accessed, emails_sent, usb_devices):
+        """Queues one activity row, stamped with the current time."""
+        with self._lock:
+            self._rows.append((username, _now(), login_hour, files_accessed, emails_sent, usb_devices))
+            full = len(self._rows) >= self.max_rows
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Writes all buffered rows to the database; returns how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            try:
+                _insert_activity_rows(rows)
+            except Exception:
+                # Put the rows back so a later flush can retry them.
+                with self._lock:
+                    self._rows[:0] = rows
+                raise
+            return len(rows)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Activity buffer flush failed: {e}")
+
+    def close(self):
+        """Stops the background thread and flushes any remaining rows."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+def get_activity_buffer():
+    """Returns the process-wide ActivityBuffer, starting it on first use."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = ActivityBuffer()
+        return _buffer
 
 def log_login(username):
     log_activity(username, datetime.now().hour, 0, 0, 0)
     print(f"Logged login for user: {username}")
 
 def get_all_activity_as_df():
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT * FROM activity_logs", conn)
-    conn.close()
-    return df
+    import pandas as pd
+
+    with span('db.activity') as s, get_db().read() as conn:
+        df = pd.read_sql_query("SELECT * FROM activity_logs", conn)
+        s.add(rows=len(df))
+        return df
+
+def bump_data_epoch(conn):
+    """Marks previously read activity as stale; call inside any write that deletes rows."""
+    conn.execute("UPDATE db_meta SET value = value + 1 WHERE key = 'data_epoch'")
+
+def get_data_version(conn):
+    """Returns (data_epoch, highest log_id) for the activity_logs table."""
+    epoch = conn.execute("SELECT value FROM db_meta WHERE key = 'data_epoch'").fetchone()[0]
+    max_id = conn.execute("SELECT COALESCE(MAX(log_id), 0) FROM activity_logs").fetchone()[0]
+    return epoch, max_id
+
+class IncrementalActivityLoader:
+    """Keeps activity_logs in memory and only fetches rows past a log_id watermark.
+
+    Each `load` costs two indexed lookups when nothing changed, and one
+    range scan over the new rows otherwise. The cache is rebuilt from
+    scratch when the data epoch moves (rows were deleted, e.g. by
+    clear_db.clear_all_data) or when the highest log_id drops below the
+    watermark (the table or sqlite_sequence was reset behind our back).
+    """
+
+    def __init__(self, db_name=DB_NAME):
+        self.db_name = db_name
+        self.epoch = None
+        self.watermark = 0
+        self._df = None
+        self._lock = threading.Lock()
+
+    @property
+    def data_version(self):
+        """(epoch, watermark) of the rows currently cached."""
+        return self.epoch, self.watermark
+
+    def load(self):
+        """Returns all activity rows, refreshing the cache from the database first."""
+        return self.snapshot()[0]
+
+    def snapshot(self):
+        """Like `load`, but returns (df, data_version) read atomically together."""
+        import pandas as pd
+
+        with self._lock:
+            with span('db.activity') as s, get_db(self.db_name).read() as conn:
+                epoch, max_id = get_data_version(conn)
+                if self._df is None or epoch != self.epoch or max_id < self.watermark:
+                    self._df = pd.read_sql_query("SELECT * FROM activity_logs WHERE log_id <= ? ORDER BY log_id",
+                                                 conn, params=(max_id,))
+                    s.add(rows=len(self._df))
+                elif max_id > self.watermark:
+                    new_rows = pd.read_sql_query(
+                        "SELECT * FROM activity_logs WHERE log_id > ? AND log_id <= ? ORDER BY log_id",
+                        conn, params=(self.watermark, max_id))
+                    self._df = pd.concat([self._df, new_rows], ignore_index=True) if len(self._df) else new_rows
+                    s.add(rows=len(new_rows))
+                self.epoch, self.watermark = epoch, max_id
+            # Shallow copy: callers may add columns without touching the cache.
+            return self._df.copy(deep=False), (self.epoch, self.watermark)
+
+def get_current_data_version():
+    """Returns (data_epoch, highest log_id); changes whenever activity is logged or removed."""
+    with get_db().read() as conn:
+        return get_data_version(conn)
+
+def get_user_baselines():
+    """Returns (baselines_df, hour_share_df) for baselines.detect_threats_baseline."""
+    with get_db().read() as conn:
+        return baselines.get_baselines(conn)
+
+ALERT_COLUMNS_SQL = '''
+    SELECT a.log_id, a.username, a.timestamp, l.Login_Hour, l.Files_Accessed, l.Emails_Sent,
+           l.USB_Devices_Used, a.risk_score AS Risk_Score, a.reasons AS Reason, a.engine AS Engine
+    FROM alerts a LEFT JOIN activity_logs l ON l.log_id = a.log_id
+'''
+ALERT_SORTS = {
+    'risk': "a.risk_score DESC, a.log_id DESC",
+    'time': "a.timestamp DESC, a.log_id DESC",
+    'user': "a.username ASC, a.risk_score DESC, a.log_id DESC",
+}
+
+def _alert_filters(engine=None, user=None, reason=None, start=None, end=None):
+    """Builds the WHERE clause and parameters shared by the alert queries."""
+    clauses, params = [], []
+    if engine is not None:
+        clauses.append("a.engine = ?")
+        params.append(engine)
+    if user is not None:
+        clauses.append("a.username = ?")
+        params.append(user)
+    if reason is not None:
+        clauses.append("a.reasons LIKE ?")
+        params.append(f"%{reason}%")
+    if start is not None:
+        clauses.append("a.timestamp >= ?")
+        params.append(str(start))
+    if end is not None:
+        clauses.append("a.timestamp < ?")
+        params.append(str(end))
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+def get_alerts_as_df(engine=None):
+    """Returns stored alerts joined with their activity rows, highest risk first."""
+    return query_alerts(engine=engine, page_size=None)
+
+def query_alerts(sort='risk', page=0, page_size=50, **filters):
+    """Returns one page of stored alerts, filtered and sorted in SQL.
+
+    `filters` are engine, user, reason (substring), start and end
+    (timestamps, end exclusive). With page_size=None every match is returned.
+    """
+    import pandas as pd
+
+    where, params = _alert_filters(**filters)
+    query = ALERT_COLUMNS_SQL + where + " ORDER BY " + ALERT_SORTS[sort]
+    if page_size is not None:
+        query += " LIMIT ? OFFSET ?"
+        params += [page_size, page * page_size]
+    with span('db.alerts') as s, get_db().read() as conn:
+        df = pd.read_sql_query(query, conn, params=params)
+        s.add(rows=len(df))
+        return df
+
+def count_alerts(**filters):
+    """Counts stored alerts matching the query_alerts filters."""
+    where, params = _alert_filters(**filters)
+    with get_db().read() as conn:
+        return conn.execute("SELECT COUNT(*) FROM alerts a" + where, params).fetchone()[0]
+
+def get_alert_users():
+    """Returns the distinct usernames that have alerts."""
+    with get_db().read() as conn:
+        return [row[0] for row in conn.execute("SELECT DISTINCT username FROM alerts ORDER BY username")]
+
+def get_alert_watermark():
+    """Returns the highest alert_id; changes whenever the alert worker stores alerts."""
+    with get_db().read() as conn:
+        return conn.execute("SELECT COALESCE(MAX(alert_id), 0) FROM alerts").fetchone()[0]
+
+def get_alert_histogram(bins=20, **filters):
+    """Counts stored alerts per risk-score bucket in SQL; returns (bucket, count) rows."""
+    where, params = _alert_filters(**filters)
+    with get_db().read() as conn:
+        return conn.execute(f"""
+            SELECT MIN(CAST(a.risk_score * ? AS INTEGER), ? - 1) AS bucket, COUNT(*)
+            FROM alerts a{where} GROUP BY bucket
+        """, [bins, bins, *params]).fetchall()
+
+def get_alert_heatmap(**filters):
+    """Counts stored alerts per user and Login_Hour in SQL.
+
+    Alerts whose raw row has been archived fall back to the hour of their timestamp.
+    """
+    import pandas as pd
+
+    where, params = _alert_filters(**filters)
+    with span('db.alerts'), get_db().read() as conn:
+        return pd.read_sql_query(f"""
+            SELECT a.username, COALESCE(l.Login_Hour, CAST(substr(a.timestamp, 12, 2) AS INTEGER)) AS hour,
+                   COUNT(*) AS count
+            FROM alerts a LEFT JOIN activity_logs l ON l.log_id = a.log_id{where}
+            GROUP BY 1, 2
+        """, conn, params=params)
+
+def get_hourly_rollup_as_df(start=None, end=None):
+    """Returns per-user, per-hour activity totals, optionally limited to [start, end).
+
+    The frame carries the same feature columns as activity_logs, so the
+    detectors can score aggregated behaviour directly.
+    """
+    import pandas as pd
+
+    query = "SELECT * FROM activity_hourly WHERE 1 = 1"
+    params = []
+    if start is not None:
+        query += " AND hour_start >= ?"
+        params.append(str(start))
+    if end is not None:
+        query += " AND hour_start < ?"
+        params.append(str(end))
+    with span('db.rollup') as s, get_db().read() as conn:
+        df = pd.read_sql_query(query, conn, params=params)
+        s.add(rows=len(df))
+        return df
 
 if __name__ == '__main__':
     init_db()
\ No newline at end of file
@@ -0,0 +1,294 @@
+"""Detection engine shared by the dashboards, the batch CLI and the scoring tools.
+
+A detector scores a frame of activity and returns a Scored result: the
+positions of the rows it flags, their 0-1 Risk_Score and any per-row
+columns it explains them with. RuleDetector, IsolationForestDetector and
+BaselineDetector wrap rule_engine, ml_engine and baselines, and
+OnlineForestDetector wraps ml_engine's SlidingWindowForest, which keeps
+learning from the chunks of a stream; add another by subclassing Detector
+and registering it in DETECTORS.
+
+    detect(df, [RuleDetector(thresholds)])             # flagged rows, highest risk first
+    detect(df, build_detectors(['rules', 'ml'], model=model), method='mean')
+    for rows, suspicious in score_stream(chunks, detectors): ...
+
+With several detectors their results are merged by `combine`.
+"""
+import numpy as np
+
+from baselines import DEFAULT_Z_THRESHOLD
+from db_pool import DB_NAME
+from instrumentation import span
+from rule_engine import DEFAULT_THRESHOLDS, RULES, decode_reasons, rule_scores
+
+# --- RESULTS ---
+class Scored:
+    """Rows one detector (or a combination of them) flagged in a frame.
+
+    `positions` are row positions in the scored frame. `columns` maps
+    column names to arrays aligned with `positions`; it always holds
+    Risk_Score and is added to the flagged rows in order by `frame`.
+    """
+
+    def __init__(self, detector, positions, columns):
+        self.detector = detector
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def risk(self):
+        return self.columns['Risk_Score']
+
+    def reasons(self):
+        """One readable reason string per flagged row."""
+        if 'Reason' in self.columns:
+            return np.asarray(self.columns['Reason'], dtype=object)
+        if 'Reason_Mask' in self.columns:
+            return decode_reasons(self.columns['Reason_Mask'])
+        return np.full(len(self), self.detector, dtype=object)
+
+    def frame(self, df):
+        """Returns the flagged rows of `df` with the result columns, highest risk first."""
+        suspicious_df = df.iloc[self.positions].copy()
+        for column, values in self.columns.items():
+            suspicious_df[column] = values
+        return suspicious_df.sort_values(by='Risk_Score', ascending=False, kind='stable')
+
+# --- DETECTORS ---
+class Detector:
+    """Base class: `score(df)` returns a Scored for one frame and must not modify it."""
+
+    name = None
+
+    def fit(self, df, streaming=False):
+        """Prepares the detector on `df` before it is scored; returns self.
+
+        With `streaming`, `df` is the first of several chunks and anything
+        that should stay fixed across chunks is settled here.
+        """
+        return self
+
+    def update(self, df):
+        """Learns from a frame of a stream once it has been scored; returns self.
+
+        Only online detectors change here; the rest stay as fitted.
+        """
+        return self
+
+    def score(self, df):
+        raise NotImplementedError
+
+class RuleDetector(Detector):
+    """Threshold rules from rule_engine; Risk_Score is the share of thresholds broken."""
+
+    name = 'rules'
+
+    def __init__(self, thresholds=None, rules=RULES, with_reasons=True):
+        self.thresholds = thresholds or DEFAULT_THRESHOLDS
+        self.rules = rules
+        self.with_reasons = with_reasons
+
+    def score(self, df):
+        positions, columns = rule_scores(df, self.thresholds, self.rules)
+        if self.with_reasons:
+            columns['Reason'] = decode_reasons(columns['Reason_Mask'], self.rules)
+        return Scored(self.name, positions, columns)
+
+class IsolationForestDetector(Detector):
+    """An IsolationForest from ml_engine, fitted on the first frame when no model is given.
+
+    Risk scores are rescaled over `score_range`. Left unset, a batch is
+    scaled over its own scores and a stream over its first chunk's, so
+    every chunk shares one scale.
+    """
+
+    name = 'ml'
+
+    def __init__(self, model=None, score_range=None, contamination=0.1, n_workers=None):
+        self.model = model
+        self.score_range = score_range
+        self.contamination = contamination
+        self.n_workers = n_workers
+
+    def fit(self, df, streaming=False):
+        # Imported here so callers that never use the forest don't load scikit-learn.
+        import ml_engine
+        import parallel_scoring
+
+        if self.model is None:
+            with span('detect.ml.fit') as s:
+                self.model = ml_engine.fit_model(df, self.contamination, self.n_workers)
+                s.add(rows=len(df))
+        if streaming and self.score_range is None:
+            scores = parallel_scoring.decision_function(self.model, df[ml_engine.FEATURES].to_numpy(),
+                                                        self.n_workers)
+            self.score_range = (scores.min(), scores.max())
+        return self
+
+    def score(self, df):
+        from ml_engine import anomaly_scores
+
+        if self.model is None:
+            self.fit(df)
+        return Scored(self.name, *anomaly_scores(df, self.model, self.score_range, self.n_workers))
+
+class OnlineForestDetector(IsolationForestDetector):
+    """A SlidingWindowForest from ml_engine that keeps learning as a stream is scored.
+
+    Without a model, `fit` builds one from the first frame, so that frame
+    is scored in-sample, as it is by IsolationForestDetector. In a stream,
+    `update` then feeds each later chunk to it after the chunk is scored,
+    so later chunks are judged by a model that has not yet learned from
+    them. Pass an already trained `model` to score the first chunk the
+    same way.
+    """
+
+    name = 'online'
+
+    def fit(self, df, streaming=False):
+        import ml_engine
+
+        if self.model is None:
+            with span('detect.online.fit') as s:
+                self.model = ml_engine.SlidingWindowForest(self.contamination).partial_fit(
+                    df[ml_engine.FEATURES].to_numpy())
+                s.add(rows=len(df))
+        return super().fit(df, streaming)
+
+    def update(self, df):
+        from ml_engine import FEATURES
+
+        with span('model.update') as s:
+            self.model.partial_fit(df[FEATURES].to_numpy())
+            s.add(rows=len(df))
+        return self
+
+class BaselineDetector(Detector):
+    """Per-user z-scores from baselines; the stored baselines are loaded when none are given."""
+
+    name = 'baseline'
+
+    def __init__(self, baselines=None, hour_shares=None, z_threshold=DEFAULT_Z_THRESHOLD, db_name=DB_NAME):
+        self.baselines = baselines
+        self.hour_shares = hour_shares
+        self.z_threshold = z_threshold
+        self.db_name = db_name
+
+    def fit(self, df, streaming=False):
+        if self.baselines is None or self.hour_shares is None:
+            import baselines
+            from db_utils import get_db
+
+            with get_db(self.db_name).read() as conn:
+                self.baselines, self.hour_shares = baselines.get_baselines(conn)
+        return self
+
+    def score(self, df):
+        from baselines import deviation_scores
+
+        self.fit(df)
+        return Scored(self.name, *deviation_scores(df, self.baselines, self.hour_shares, self.z_threshold))
+
+DETECTORS = {
+    'rules': RuleDetector,
+    'ml': IsolationForestDetector,
+    'online': OnlineForestDetector,
+    'baseline': BaselineDetector,
+}
+
+def build_detectors(names, thresholds=None, model=None, score_range=None, contamination=0.1,
+                    z_threshold=DEFAULT_Z_THRESHOLD, n_workers=None):
+    """Returns a detector per name in DETECTORS, each given the options that apply to it.
+
+    `model` is an IsolationForest for 'ml'; 'online' always starts a new forest.
+    """
+    options = {
+        'rules': lambda: RuleDetector(thresholds),
+        'ml': lambda: IsolationForestDetector(model, score_range, contamination, n_workers),
+        'online': lambda: OnlineForestDetector(contamination=contamination, n_workers=n_workers),
+        'baseline': lambda: BaselineDetector(z_threshold=z_threshold),
+    }
+    return [options[name]() if name in options else DETECTORS[name]() for name in names]
+
+# --- COMBINATION ---
+COMBINE_METHODS = ('max', 'mean')
+
+def combine(results, method='max', weights=None, min_detectors=1):
+    """Merges the results of several detectors on the same frame into one Scored.
+
+    A row is kept when at least `min_detectors` detectors flagged it. Its
+    Risk_Score is the highest detector score ('max') or the mean over all
+    detectors weighted by `weights` (name -> weight), counting 0 for those
+    that did not flag it ('mean'). Detectors lists which detectors flagged
+    the row and Reason joins their reasons.
+    """
+    if method not in COMBINE_METHODS:
+        raise ValueError(f"Unknown combine method {method!r}; use one of {', '.join(COMBINE_METHODS)}.")
+    positions = np.unique(np.concatenate([result.positions for result in results])) if results else \
+        np.array([], dtype=np.int64)
+    risk = np.zeros((len(positions), len(results)))
+    hit = np.zeros((len(positions), len(results)), dtype=bool)
+    reasons = np.full((len(positions), len(results)), '', dtype=object)
+    for i, result in enumerate(results):
+        rows = np.searchsorted(positions, result.positions)
+        risk[rows, i] = result.risk
+        hit[rows, i] = True
+        reasons[rows, i] = result.reasons()
+
+    keep = hit.sum(axis=1) >= min_detectors
+    positions, risk, hit, reasons = positions[keep], risk[keep], hit[keep], reasons[keep]
+    if method == 'max':
+        combined = risk.max(axis=1, initial=0.0)
+    else:
+        w = np.array([(weights or {}).get(result.detector, 1.0) for result in results], dtype=float)
+        combined = risk @ w / w.sum() if len(results) else np.zeros(len(positions))
+    names = [result.detector for result in results]
+    return Scored('+'.join(names), positions, {
+        'Risk_Score': combined,
+        'Detectors': np.array([', '.join(n for n, h in zip(names, row) if h) for row in hit], dtype=object),
+        'Reason': np.array(['; '.join(r for r in row if r) for row in reasons], dtype=object),
+    })
+
+# --- ENTRY POINTS ---
+def _score(detector, df):
+    # Timed as detect.<name>, counting rows scanned and alerts produced.
+    with span(f'detect.{detector.name}') as s:
+        scored = detector.score(df)
+        s.add(rows=len(df), alerts=len(scored))
+    return scored
+
+def _merge(results, method, weights, min_detectors):
+    if len(results) == 1 and min_detectors <= 1:
+        return results[0]
+    with span('detect.combine'):
+        return combine(results, method, weights, min_detectors)
+
+def score_batch(df, detectors, method='max', weights=None, min_detectors=1):
+    """Fits and runs every detector on `df`; returns one Scored, combined when there are several."""
+    return _merge([_score(detector.fit(df), df) for detector in detectors], method, weights, min_detectors)
+
+def detect(df, detectors, **combine_options):
+    """Returns the rows of `df` the detectors flag, highest risk first."""
+    return score_batch(df, detectors, **combine_options).frame(df)
+
+def score_stream(chunks, detectors, method='max', weights=None, min_detectors=1):
+    """Scores an iterable of activity chunks; yields (rows_in_chunk, suspicious_rows) per chunk.
+
+    Detectors are fitted once, on the first chunk, so models and score
+    scales are shared by every chunk; online detectors then learn from each
+    later chunk after scoring it. Only one chunk is held at a time.
+    """
+    fitted = False
+    for chunk in chunks:
+        if not fitted:
+            for detector in detectors:
+                detector.fit(chunk, streaming=True)
+        scored = _merge([_score(detector, chunk) for detector in detectors], method, weights, min_detectors)
+        if fitted:
+            for detector in detectors:
+                detector.update(chunk)
+        fitted = True
+        yield len(chunk), scored.frame(chunk)
@@ -0,0 +1,216 @@
+"""Detection quality on labeled activity.
+
+classification_metrics and true_labels score any labeled frame. The rest
+evaluates the detectors on synthetic_data scenarios: precision, recall and
+F1 overall, and per scenario the share of incidents caught and how long
+after the first malicious event the first alert fired.
+
+    python evaluation.py --users 500 --days 60 --view 1h --files-accessed 20 40 60 --contamination 0.01 0.05
+"""
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Columns recognised as ground-truth labels, in order of preference.
+LABEL_COLUMNS = ('Is_Insider', 'Label', 'Anomaly')
+POSITIVE_LABELS = {1, True, -1, 'Suspicious', 'suspicious', 'insider', 'Insider', '1', 'True', 'true'}
+
+def find_label_column(df):
+    """Returns the first recognised label column in `df`, or None."""
+    return next((column for column in LABEL_COLUMNS if column in df.columns), None)
+
+def true_labels(df, column=None):
+    """Returns a boolean array marking the rows labelled as insider activity."""
+    column = column or find_label_column(df)
+    if column is None:
+        raise ValueError(f"No label column found; expected one of {', '.join(LABEL_COLUMNS)}.")
+    return df[column].isin(POSITIVE_LABELS).to_numpy()
+
+def classification_metrics(y_true, y_pred):
+    """Returns precision, recall, F1 and confusion counts for boolean predictions."""
+    y_true = np.asarray(y_true, dtype=bool)
+    y_pred = np.asarray(y_pred, dtype=bool)
+    tp = int(np.sum(y_true & y_pred))
+    fp = int(np.sum(~y_true & y_pred))
+    fn = int(np.sum(y_true & ~y_pred))
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {'precision': precision, 'recall': recall, 'f1': f1,
+            'true_positives': tp, 'false_positives': fp, 'false_negatives': fn}
+
+# --- SCENARIO EVALUATION ---
+EVAL_CACHE_DIR = os.path.join('.cache', 'evaluation')
+FEATURE_COLUMNS = ['Login_Hour', 'Files_Accessed', 'Emails_Sent', 'USB_Devices_Used']
+VIEWS = ('event', '1h', '24h')
+
+def build_dataset(n_users=200, days=60, seed=0, view='event', insider_fraction=0.05):
+    """Generates labeled activity and returns it as scored by the dashboards' `view`."""
+    import synthetic_data
+    from windowing import build_window_features, windowed_view
+
+    df = synthetic_data.generate_activity(n_users, days, insider_fraction=insider_fraction, seed=seed)
+    if view != 'event':
+        df = windowed_view(build_window_features(df), view)
+    return df
+
+def cached_dataset(cache_dir=EVAL_CACHE_DIR, **params):
+    """Builds the dataset for `params` once and stores its columns as .npy files; returns the directory.
+
+    Sweep workers open the columns memory-mapped, so every configuration
+    scores the same pages instead of regenerating or copying the data.
+    """
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, key)
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        return path
+    df = build_dataset(**params)
+    os.makedirs(path, exist_ok=True)
+    scenario = df['Scenario'].astype('category')
+    arrays = {
+        **{column: df[column].to_numpy() for column in FEATURE_COLUMNS},
+        'seconds': pd.to_datetime(df['timestamp']).to_numpy().astype('datetime64[s]').astype(np.int64),
+        'user': pd.factorize(df['username'])[0].astype(np.int32),
+        'Is_Insider': df['Is_Insider'].to_numpy(dtype=np.int8),
+        'scenario': scenario.cat.codes.to_numpy(dtype=np.int8),
+    }
+    for name, values in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), values)
+    # meta.json is written last, so a half-built cache entry is rebuilt.
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump({'params': params, 'scenarios': list(scenario.cat.categories), 'rows': len(df)}, f)
+    return path
+
+_datasets = {}
+
+def load_dataset(path):
+    """Returns (frame, scenario names) for a cached_dataset directory, memoized per process."""
+    if path not in _datasets:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        names = FEATURE_COLUMNS + ['seconds', 'user', 'Is_Insider', 'scenario']
+        columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in names}
+        _datasets[path] = (pd.DataFrame(columns, copy=False), meta['scenarios'])
+    return _datasets[path]
+
+def scenario_metrics(df, flagged, scenarios):
+    """Returns overall metrics plus, per scenario, incidents caught and detection lag in seconds.
+
+    An incident is one insider's run of a scenario. Its lag is the time from
+    its first event to its first flagged event.
+    """
+    flagged = np.asarray(flagged, dtype=bool)
+    result = classification_metrics(df['Is_Insider'].to_numpy() == 1, flagged)
+    per_scenario = {}
+    codes = df['scenario'].to_numpy()
+    for code, name in enumerate(scenarios):
+        if not name:
+            continue
+        rows = np.flatnonzero(codes == code)
+        if not len(rows):
+            continue
+        incidents = pd.DataFrame({'user': df['user'].to_numpy()[rows], 'seconds': df['seconds'].to_numpy()[rows],
+                                  'flagged': flagged[rows]})
+        first = incidents.groupby('user')['seconds'].min()
+        first_alert = incidents[incidents['flagged']].groupby('user')['seconds'].min()
+        lags = (first_alert - first.reindex(first_alert.index)).to_numpy(dtype=float)
+        per_scenario[name] = {
+            'incidents': len(first),
+            'detected': len(first_alert),
+            'row_recall': float(flagged[rows].mean()),
+            'mean_lag_s': float(lags.mean()) if len(lags) else None,
+            'max_lag_s': float(lags.max()) if len(lags) else None,
+        }
+    result['scenarios'] = per_scenario
+    return result
+
+def evaluate_config(path, engine, params):
+    """Runs one detector configuration on a cached dataset and scores it."""
+    from engine import IsolationForestDetector, RuleDetector, score_batch
+
+    df, scenarios = load_dataset(path)
+    if engine == 'rules':
+        detector = RuleDetector(params, with_reasons=False)
+    else:
+        detector = IsolationForestDetector(contamination=params['contamination'], n_workers=1)
+    # Only the flagged positions are needed, so no result frame is built.
+    flagged = np.zeros(len(df), dtype=bool)
+    flagged[score_batch(df, [detector]).positions] = True
+    return {'engine': engine, 'params': params, **scenario_metrics(df, flagged, scenarios)}
+
+def _evaluate_task(task):
+    return evaluate_config(*task)
+
+def parameter_grid(**values):
+    """Expands lists of values per parameter into one dict per combination."""
+    keys = list(values)
+    return [dict(zip(keys, combination)) for combination in itertools.product(*(values[key] for key in keys))]
+
+def sweep(path, configs, n_workers=None):
+    """Evaluates (engine, params) configurations on the dataset at `path` across `n_workers` processes.
+
+    Results come back in the order of `configs`.
+    """
+    tasks = [(path, engine, params) for engine, params in configs]
+    n_workers = min(n_workers or os.cpu_count() or 1, len(tasks))
+    if n_workers <= 1:
+        return [_evaluate_task(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        return list(pool.map(_evaluate_task, tasks, chunksize=max(1, len(tasks) // (n_workers * 4))))
+
+def format_results(results):
+    """Renders sweep results as a table, best F1 first."""
+    scenarios = sorted({name for result in results for name in result['scenarios']})
+    lines = [f"{'engine':<6} {'params':<60} {'prec':>6} {'recall':>6} {'F1':>6}  "
+             + "  ".join(f"{name + ' (caught/lag)':>28}" for name in scenarios)]
+    for result in sorted(results, key=lambda r: r['f1'], reverse=True):
+        cells = []
+        for name in scenarios:
+            stats = result['scenarios'].get(name)
+            lag = '-' if not stats or stats['mean_lag_s'] is None else f"{stats['mean_lag_s']:.0f}s"
+            cells.append(f"{stats['detected'] if stats else 0}/{stats['incidents'] if stats else 0} {lag:>8}".rjust(28))
+        params = ' '.join(f"{key}={value}" for key, value in result['params'].items())
+        lines.append(f"{result['engine']:<6} {params:<60} {result['precision']:>6.3f} {result['recall']:>6.3f}"
+                     f" {result['f1']:>6.3f}  " + "  ".join(cells))
+    return "\n".join(lines)
+
+if __name__ == '__main__':
+    import argparse
+    from rule_engine import DEFAULT_THRESHOLDS
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--insider-fraction', type=float, default=0.05)
+    parser.add_argument('--view', choices=VIEWS, default='event', help="Score events or trailing-window totals.")
+    parser.add_argument('--engines', nargs='+', choices=['rules', 'ml'], default=['rules', 'ml'])
+    for key, value in DEFAULT_THRESHOLDS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", dest=key, type=int, nargs='+', default=[value])
+    parser.add_argument('--contamination', type=float, nargs='+', default=[0.01, 0.05, 0.1])
+    parser.add_argument('--workers', type=int, default=None, help="Processes for the sweep (default: all cores).")
+    parser.add_argument('--cache-dir', default=EVAL_CACHE_DIR)
+    parser.add_argument('--output', help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    path = cached_dataset(args.cache_dir, n_users=args.users, days=args.days, seed=args.seed, view=args.view,
+                          insider_fraction=args.insider_fraction)
+    configs = []
+    if 'rules' in args.engines:
+        configs += [('rules', params) for params in parameter_grid(
+            **{key: getattr(args, key) for key in DEFAULT_THRESHOLDS})]
+    if 'ml' in args.engines:
+        configs += [('ml', params) for params in parameter_grid(contamination=args.contamination)]
+    results = sweep(path, configs, args.workers)
+    print(format_results(results))
+    if args.output:
+        with open(os.path.join(path, 'meta.json')) as f:
+            dataset = json.load(f)
+        with open(args.output, 'w') as f:
+            json.dump({'dataset': dataset, 'results': results}, f, indent=2)
+        print(f"Results written to {args.output}")
@@ -0,0 +1,329 @@
+"""Asyncio ingestion service for endpoint agents.
+
+Agents send activity events as JSON lines, one object per line with the
+activity_logs columns:
+
+    {"username": "alice", "timestamp": "2025-01-06 09:15:00", "Login_Hour": 9,
+     "Files_Accessed": 3, "Emails_Sent": 0, "USB_Devices_Used": 0}
+
+timestamp defaults to the time of receipt and Login_Hour to its hour.
+
+Over HTTP, POST the lines to /events; the reply is {"accepted": n} once
+they are committed. GET /health returns counters. Over the Unix socket,
+send the lines followed by an empty line; the reply is the same JSON on one
+line. A request is all-or-nothing: one invalid line rejects the batch.
+
+Requests go onto a bounded queue. When it is full, a request waits up to
+PUT_TIMEOUT seconds and is then refused (HTTP 503), so agents back off
+instead of growing the server's memory. One writer task drains the queue
+and commits everything waiting in a single transaction (group commit)
+through db_utils, so baselines and ingest-time alerts stay up to date.
+
+    python ingest_service.py --http 127.0.0.1:8765 --unix /tmp/insider_ingest.sock
+
+With --maintenance-every, the service also runs maintenance passes
+(retention and compaction) in the background; their batches share the
+write lock with ingest.
+"""
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+
+import db_utils
+from db_pool import DB_NAME
+
+# Sustained rate the service is sized for on one core; `benchmark.py ingest` checks it.
+TARGET_EVENTS_PER_SEC = 10_000
+QUEUE_REQUESTS = 1_000
+MAX_REQUEST_EVENTS = 10_000
+MAX_BATCH_ROWS = 20_000
+MAX_BODY_BYTES = 16 * 2**20
+PUT_TIMEOUT = 5.0
+
+FIELDS = ('username', 'timestamp', 'Login_Hour', 'Files_Accessed', 'Emails_Sent', 'USB_Devices_Used')
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+MAX_USERNAME = 64
+MAX_COUNTER = 2**31 - 1
+
+class QueueFull(Exception):
+    pass
+
+# --- VALIDATION ---
+def _counter(event, key, high=MAX_COUNTER):
+    value = event.get(key, 0)
+    # bool is an int subclass; reject it so true/false never count as 1/0.
+    if type(value) is not int or not 0 <= value <= high:
+        raise ValueError(f"{key} must be an integer between 0 and {high}")
+    return value
+
+def validate_event(event, received_at):
+    """Returns an activity_logs row tuple for one decoded event, or raises ValueError."""
+    if not isinstance(event, dict):
+        raise ValueError("event must be a JSON object")
+    unknown = event.keys() - FIELDS
+    if unknown:
+        raise ValueError(f"unknown field(s): {', '.join(sorted(unknown))}")
+    username = event.get('username')
+    if not isinstance(username, str) or not 0 < len(username) <= MAX_USERNAME:
+        raise ValueError(f"username must be a non-empty string of at most {MAX_USERNAME} characters")
+    timestamp = event.get('timestamp', received_at)
+    if not isinstance(timestamp, str):
+        raise ValueError("timestamp must be a string")
+    try:
+        # strptime rejects impossible dates, which the hourly rollup trigger would turn into NULL.
+        datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+    except ValueError:
+        raise ValueError("timestamp must be a valid YYYY-MM-DD HH:MM:SS date") from None
+    login_hour = event['Login_Hour'] if 'Login_Hour' in event else int(timestamp[11:13])
+    if type(login_hour) is not int or not 0 <= login_hour <= 23:
+        raise ValueError("Login_Hour must be an integer between 0 and 23")
+    return (username, timestamp, login_hour, _counter(event, 'Files_Accessed'), _counter(event, 'Emails_Sent'),
+            _counter(event, 'USB_Devices_Used'))
+
+def parse_lines(data):
+    """Decodes and validates a JSON-lines payload; returns the rows or raises ValueError."""
+    received_at = datetime.now().strftime(TIMESTAMP_FORMAT)
+    rows = []
+    for number, line in enumerate(data.splitlines(), 1):
+        if not line.strip():
+            continue
+        if len(rows) == MAX_REQUEST_EVENTS:
+            raise ValueError(f"at most {MAX_REQUEST_EVENTS} events per request")
+        try:
+            rows.append(validate_event(json.loads(line), received_at))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"line {number}: {e}") from None
+    return rows
+
+# --- SERVICE ---
+class IngestService:
+    """Bounded queue of validated batches plus the single writer task that commits them."""
+
+    def __init__(self, db_name=DB_NAME, queue_requests=QUEUE_REQUESTS, max_batch_rows=MAX_BATCH_ROWS,
+                 put_timeout=PUT_TIMEOUT):
+        self.db_name = db_name
+        self.max_batch_rows = max_batch_rows
+        self.put_timeout = put_timeout
+        self.queue = asyncio.Queue(maxsize=queue_requests)
+        self.stats = {'received': 0, 'written': 0, 'commits': 0, 'rejected': 0, 'refused': 0, 'errors': 0}
+        self.started = time.monotonic()
+        self._writer = None
+
+    def start(self):
+        db_utils.get_db(self.db_name)
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def submit(self, rows):
+        """Queues rows and waits until they are committed; raises QueueFull if the queue stays full."""
+        done = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(self.queue.put((rows, done)), self.put_timeout)
+        except asyncio.TimeoutError:
+            self.stats['refused'] += 1
+            raise QueueFull() from None
+        self.stats['received'] += len(rows)
+        await done
+        return len(rows)
+
+    async def _write_loop(self):
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                return
+            batch, size = [item], len(item[0])
+            # Everything that queued up during the previous commit goes into this one.
+            while size < self.max_batch_rows and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                size += len(item[0])
+            rows = [row for item_rows, _ in batch for row in item_rows]
+            try:
+                await asyncio.to_thread(db_utils._insert_activity_rows, rows, self.db_name)
+            except Exception as e:
+                if len(batch) > 1:
+                    # The group transaction rolled back; retry each request alone so one bad
+                    # request only fails its own client.
+                    await self._commit_each(batch)
+                    continue
+                self.stats['errors'] += 1
+                _, done = batch[0]
+                if not done.done():
+                    done.set_exception(e)
+            else:
+                self.stats['written'] += len(rows)
+                self.stats['commits'] += 1
+                for _, done in batch:
+                    if not done.done():
+                        done.set_result(None)
+
+    async def _commit_each(self, batch):
+        for rows, done in batch:
+            try:
+                await asyncio.to_thread(db_utils._insert_activity_rows, rows, self.db_name)
+            except Exception as e:
+                self.stats['errors'] += 1
+                if not done.done():
+                    done.set_exception(e)
+            else:
+                self.stats['written'] += len(rows)
+                self.stats['commits'] += 1
+                if not done.done():
+                    done.set_result(None)
+
+    async def close(self):
+        """Commits what is queued, then stops the writer."""
+        if self._writer:
+            await self.queue.put(None)
+            await self._writer
+            self._writer = None
+
+    def health(self):
+        uptime = time.monotonic() - self.started
+        return {**self.stats, 'queued_requests': self.queue.qsize(), 'uptime_s': round(uptime, 1),
+                'events_per_sec': round(self.stats['written'] / uptime, 1) if uptime else 0.0}
+
+    async def ingest(self, data):
+        """Validates and commits one payload; returns (status, reply dict)."""
+        try:
+            rows = parse_lines(data)
+        except ValueError as e:
+            self.stats['rejected'] += 1
+            return 400, {'error': str(e)}
+        try:
+            return 200, {'accepted': await self.submit(rows)}
+        except QueueFull:
+            return 503, {'error': "ingest queue is full, retry later"}
+        except Exception as e:
+            return 500, {'error': f"write failed: {e}"}
+
+# --- PROTOCOLS ---
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 411: 'Length Required', 413: 'Payload Too Large',
+           500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+async def _write_http(writer, status, reply, keep_alive):
+    body = json.dumps(reply).encode()
+    headers = [f"HTTP/1.1 {status} {REASONS[status]}", "Content-Type: application/json",
+               f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    if status == 503:
+        headers.append("Retry-After: 1")
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + body)
+    await writer.drain()
+
+async def handle_http(service, reader, writer):
+    """Minimal HTTP/1.1 with keep-alive: POST /events and GET /health."""
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                return
+            request_line, *header_lines = head.decode('latin-1').split("\r\n")
+            method, path, version = (request_line.split(' ') + ['', '', ''])[:3]
+            headers = {}
+            for line in header_lines:
+                if ':' in line:
+                    key, value = line.split(':', 1)
+                    headers[key.strip().lower()] = value.strip()
+            keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+            length = headers.get('content-length')
+            body = b''
+            if length is not None:
+                if not length.isdigit() or int(length) > MAX_BODY_BYTES:
+                    await _write_http(writer, 413, {'error': f"body limit is {MAX_BODY_BYTES} bytes"}, False)
+                    return
+                body = await reader.readexactly(int(length))
+            path = path.split('?', 1)[0]
+            if method == 'POST' and path == '/events':
+                if length is None:
+                    status, reply = 411, {'error': "Content-Length is required"}
+                else:
+                    status, reply = await service.ingest(body.decode('utf-8', errors='replace'))
+            elif method == 'GET' and path == '/health':
+                status, reply = 200, service.health()
+            else:
+                status, reply = 404, {'error': "use POST /events or GET /health"}
+            await _write_http(writer, status, reply, keep_alive)
+            if not keep_alive:
+                return
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def handle_lines(service, reader, writer):
+    """Unix socket protocol: JSON lines, an empty line ends a batch, one JSON reply line per batch."""
+    try:
+        lines, size = [], 0
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if line.strip():
+                lines.append(line)
+                size += len(line)
+                if size > MAX_BODY_BYTES:
+                    writer.write(json.dumps({'error': f"batch limit is {MAX_BODY_BYTES} bytes"}).encode() + b"\n")
+                    await writer.drain()
+                    return
+                continue
+            _, reply = await service.ingest(b''.join(lines).decode('utf-8', errors='replace'))
+            lines, size = [], 0
+            writer.write(json.dumps(reply).encode() + b"\n")
+            await writer.drain()
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(http=None, unix=None, db_name=DB_NAME, **options):
+    """Runs the service until cancelled. `http` is 'host:port', `unix` a socket path."""
+    service = IngestService(db_name, **options)
+    service.start()
+    servers = []
+    if http:
+        host, port = http.rsplit(':', 1)
+        servers.append(await asyncio.start_server(lambda r, w: handle_http(service, r, w), host, int(port),
+                                                  limit=MAX_BODY_BYTES))
+        print(f"Listening for HTTP on {http}")
+    if unix:
+        if os.path.exists(unix):
+            os.unlink(unix)
+        servers.append(await asyncio.start_unix_server(lambda r, w: handle_lines(service, r, w), unix,
+                                                       limit=MAX_BODY_BYTES))
+        print(f"Listening on Unix socket {unix}")
+    try:
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+    finally:
+        for server in servers:
+            server.close()
+        await service.close()
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--http', metavar='HOST:PORT', help="e.g. 127.0.0.1:8765")
+    parser.add_argument('--unix', metavar='PATH', help="Unix socket path.")
+    parser.add_argument('--db', default=DB_NAME)
+    parser.add_argument('--queue-requests', type=int, default=QUEUE_REQUESTS)
+    parser.add_argument('--max-batch-rows', type=int, default=MAX_BATCH_ROWS)
+    parser.add_argument('--maintenance-every', type=float, metavar='SECONDS',
+                        help="Also run maintenance.py's retention and compaction pass at this interval.")
+    args = parser.parse_args()
+    if not (args.http or args.unix):
+        parser.error("give --http and/or --unix")
+    if args.maintenance_every:
+        import maintenance
+
+        maintenance.MaintenanceScheduler(args.maintenance_every, args.db).start()
+    try:
+        asyncio.run(serve(args.http, args.unix, args.db, queue_requests=args.queue_requests,
+                          max_batch_rows=args.max_batch_rows))
+    except KeyboardInterrupt:
+        pass
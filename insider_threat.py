@@ -1,41 +1,189 @@
-import pandas as pd
-from sklearn.preprocessing import LabelEncoder
-from sklearn.ensemble import IsolationForest
-import matplotlib.pyplot as plt
-import seaborn as sns
+"""Batch insider threat detection.
+
+    python insider_threat.py train  [inputs...] [--contamination 0.1]
+    python insider_threat.py score  [inputs...] --output alerts.parquet [--engine rules ml] [--jobs 4]
+    python insider_threat.py evaluate labeled.csv [--engine rules ml --combine mean]
+
+Inputs may be CSV or Parquet activity exports, or a SQLite database with an
+activity_logs table (the default is insider_threat.db). Detection runs
+through the same engine module as the dashboards; with several engines their
+scores are combined (see --combine and --min-detectors).
+"""
+import argparse
+import json
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import ml_engine
+from db_pool import DB_NAME
+from evaluation import classification_metrics, true_labels
+from engine import COMBINE_METHODS, build_detectors, detect
+from rule_engine import DEFAULT_THRESHOLDS
+from stream_scoring import read_activity_csv, score_csv
+
+# --- INPUT ---
+def input_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.db', '.sqlite', '.sqlite3'):
+        return 'sqlite'
+    if extension in ('.parquet', '.pq'):
+        return 'parquet'
+    return 'csv'
+
+def load_activity(path, columns=None):
+    """Reads a whole activity file into a DataFrame."""
+    kind = input_format(path)
+    if kind == 'sqlite':
+        # Includes activity already moved to the Parquet archive.
+        from archive import read_activity
+        return read_activity(columns=columns, db_name=path)
+    if kind == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    return read_activity_csv(path, columns)
+
+# --- SCORING ---
+def score_file(path, engines, thresholds, model=None, score_range=None, method='max', min_detectors=1):
+    """Scores one input and returns its suspicious rows tagged with their source."""
+    if input_format(path) == 'csv':
+        # CSVs are streamed in chunks, so file size does not bound memory.
+        suspicious, total = score_csv(path, engine=engines, thresholds=thresholds, model=model,
+                                      score_range=score_range, method=method, min_detectors=min_detectors)
+    else:
+        df = load_activity(path)
+        total = len(df)
+        suspicious = detect(df, build_detectors(engines, thresholds, model, score_range), method=method,
+                            min_detectors=min_detectors)
+    suspicious = suspicious.copy()
+    suspicious.insert(0, 'Source', os.path.basename(path))
+    return suspicious, total
+
+def load_model_or_exit(models_dir, contamination=None):
+    model, metadata = ml_engine.load_latest_model(contamination, models_dir)
+    if model is None:
+        sys.exit(f"No trained model in {models_dir}; run 'python insider_threat.py train' first.")
+    return model, metadata
+
+def write_alerts(df, path):
+    """Writes alerts in a columnar format chosen by the extension (.parquet by default, .feather, .csv)."""
+    extension = os.path.splitext(path)[1].lower()
+    # Mixed per-chunk categories concatenate to object columns; store them as plain strings.
+    df = df.astype({column: str for column in df.columns if df[column].dtype == object})
+    if extension == '.feather':
+        df.reset_index(drop=True).to_feather(path)
+    elif extension == '.csv':
+        df.to_csv(path, index=False)
+    else:
+        df.to_parquet(path, index=False)
+
+# --- PLOTTING ---
+def plot_results(df, hue, path):
+    """Saves a Files_Accessed vs Emails_Sent scatter plot to `path` without opening a window."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    sns.scatterplot(x='Files_Accessed', y='Emails_Sent', hue=hue, data=df, s=100)
+    plt.title('Insider Threat Detection Visualization')
+    plt.savefig(path, bbox_inches='tight')
+    plt.close()
+    print(f"Plot saved to {path}")
+
+# --- COMMANDS ---
+def thresholds_from_args(args):
+    return {key: getattr(args, key) for key in DEFAULT_THRESHOLDS}
+
+def cmd_train(args):
+    df = pd.concat([load_activity(path) for path in args.inputs], ignore_index=True)
+    _, metadata = ml_engine.train_model(df, args.contamination, args.models_dir, args.workers)
+    print(json.dumps(metadata, indent=2))
+
+def cmd_score(args):
+    thresholds = thresholds_from_args(args)
+    model = score_range = None
+    if 'ml' in args.engine:
+        model, metadata = load_model_or_exit(args.models_dir)
+        score_range = metadata.get('score_range')
+    options = (args.engine, thresholds, model, score_range, args.combine, args.min_detectors)
+    jobs = min(args.jobs, len(args.inputs))
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(score_file, path, *options) for path in args.inputs]
+            results = [future.result() for future in futures]
+    else:
+        results = [score_file(path, *options) for path in args.inputs]
 
-# --- Step 1: Load log file ---
-log_file = os.path.join("logs", "user_activity.csv")
-df = pd.read_csv(log_file)
-print("Loaded log data:")
-print(df)
+    alerts = pd.concat([suspicious for suspicious, _ in results], ignore_index=True)
+    alerts = alerts.sort_values(by='Risk_Score', ascending=False, kind='stable')
+    total = sum(rows for _, rows in results)
+    write_alerts(alerts.drop(columns=['Reason_Mask'], errors='ignore'), args.output)
+    print(f"Scored {total:,} rows from {len(args.inputs)} input(s); {len(alerts):,} alerts written to {args.output}")
 
-# --- Step 2: Encode User_ID ---
-le = LabelEncoder()
-df['User_ID'] = le.fit_transform(df['User_ID'])
+    if args.plot and len(alerts):
+        # Only the alerts are plotted; reloading every input would undo the streaming.
+        plot_results(alerts, 'Source', args.plot)
 
-# --- Step 3: Train anomaly detection model ---
-X = df[['Login_Hour','Files_Accessed','Emails_Sent','USB_Devices_Used']]
-model = IsolationForest(contamination=0.2, random_state=42)
-model.fit(X)
+def cmd_evaluate(args):
+    df = load_activity(args.input)
+    labels = true_labels(df, args.label_column)
+    features = df.drop(columns=[args.label_column] if args.label_column else [], errors='ignore')
+    model = load_model_or_exit(args.models_dir)[0] if 'ml' in args.engine else None
+    suspicious = detect(features, build_detectors(args.engine, thresholds_from_args(args), model),
+                        method=args.combine, min_detectors=args.min_detectors)
+    predicted = df.index.isin(suspicious.index)
+    metrics = classification_metrics(labels, predicted)
+    print(json.dumps(metrics, indent=2))
+    if args.plot:
+        plot_results(df.assign(Anomaly=np.where(predicted, 'Suspicious', 'Normal')), 'Anomaly', args.plot)
 
-# --- Step 4: Predict anomalies ---
-df['Anomaly'] = model.predict(X)
-df['Anomaly'] = df['Anomaly'].replace({1:'Normal', -1:'Suspicious'})
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
 
-# --- Step 5: Save alerts ---
-alerts_file = os.path.join("alerts", "suspicious_activity.csv")
-suspicious = df[df['Anomaly'] == 'Suspicious']
-suspicious.to_csv(alerts_file, index=False)
-print(f"\nSuspicious activity saved to {alerts_file}")
-print(suspicious)
+    def add_engine_options(sub):
+        sub.add_argument('--engine', nargs='+', choices=['rules', 'ml', 'online'], default=['rules'],
+                         help="One or more detectors; several are combined. 'online' needs no saved model: "
+                              "it learns a sliding-window forest from the input, chunk by chunk for CSVs.")
+        sub.add_argument('--combine', choices=COMBINE_METHODS, default='max',
+                         help="How several engines' risk scores are merged (default max).")
+        sub.add_argument('--min-detectors', type=int, default=1,
+                         help="Only report rows flagged by at least this many engines.")
+        sub.add_argument('--models-dir', default=ml_engine.MODELS_DIR)
+        for key, value in DEFAULT_THRESHOLDS.items():
+            sub.add_argument(f"--{key.replace('_', '-')}", dest=key, type=int, default=value,
+                             help=f"Rule threshold (default {value}).")
+        sub.add_argument('--plot', metavar='PNG', help="Save a scatter plot of the results to this file.")
 
-# --- Step 6: Visualize results ---
-sns.scatterplot(x='Files_Accessed', y='Emails_Sent', hue='Anomaly', data=df, s=100)
-plt.title('Insider Threat Detection Visualization')
-plt.show()
+    train = subparsers.add_parser('train', help="Fit and save an IsolationForest.")
+    train.add_argument('inputs', nargs='*', default=[DB_NAME])
+    train.add_argument('--contamination', type=float, default=0.1)
+    train.add_argument('--models-dir', default=ml_engine.MODELS_DIR)
+    train.add_argument('--workers', type=int, default=None, help="Cores used to build the forest.")
+    train.set_defaults(func=cmd_train)
 
+    score = subparsers.add_parser('score', help="Score inputs and write the alerts.")
+    score.add_argument('inputs', nargs='*', default=[DB_NAME])
+    score.add_argument('--output', default=os.path.join('alerts', 'suspicious_activity.parquet'))
+    score.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="Inputs scored in parallel.")
+    add_engine_options(score)
+    score.set_defaults(func=cmd_score)
 
+    evaluate = subparsers.add_parser('evaluate', help="Report precision/recall on a labeled input.")
+    evaluate.add_argument('input')
+    evaluate.add_argument('--label-column', help="Defaults to the first of Is_Insider, Label, Anomaly.")
+    add_engine_options(evaluate)
+    evaluate.set_defaults(func=cmd_evaluate)
+    return parser
 
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, 'output', None):
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    args.func(args)
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""Timing spans, counters and profiling for the dashboard's hot paths.
+
+    with span('db.load') as s:
+        df = load()
+        s.add(rows=len(df))         # counted under insider_threat_rows_total{stage="db.load"}
+
+Every span feeds a per-stage latency histogram; `add` bumps counters
+labelled with the stage. Metrics are process-wide, shown on the
+Diagnostics page and written in Prometheus text format to METRICS_FILE
+(for node_exporter's textfile collector) by write_metrics.
+
+Set INSTRUMENTATION=0 to turn spans into no-ops. `benchmark.py
+instrumentation` measures what they cost.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+ENABLED = os.environ.get("INSTRUMENTATION", "1") != "0"
+METRICS_FILE = os.environ.get("METRICS_FILE", os.path.join("metrics", "insider_threat.prom"))
+METRICS_PREFIX = "insider_threat"
+# At most one metrics file write per this many seconds from maybe_write_metrics.
+WRITE_INTERVAL = 15.0
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join("metrics", "profiles"))
+# Upper bounds in seconds, from 1 ms to a minute.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Recent durations kept per stage for exact percentiles on the Diagnostics page.
+RECENT_SAMPLES = 512
+
+# --- METRICS ---
+class Histogram:
+    """Cumulative latency buckets plus the last RECENT_SAMPLES durations."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+
+_histograms = {}
+_counters = {}
+_collectors = {}
+_lock = threading.Lock()
+_last_write = 0.0
+
+def _record(stage, seconds, counts=None):
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = Histogram()
+        histogram.observe(seconds)
+        for name, value in (counts or {}).items():
+            _counters[name, stage] = _counters.get((name, stage), 0) + value
+
+def observe(stage, seconds):
+    """Records one duration for `stage`, for code that cannot use a span."""
+    if ENABLED:
+        _record(stage, seconds)
+
+def count(name, value=1, stage=None):
+    """Adds `value` to the counter `name`, optionally labelled with a stage."""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name, stage] = _counters.get((name, stage), 0) + value
+
+def register_collector(name, collect):
+    """Registers `collect()`, returning {metric: value}, to be read as gauges at export time."""
+    with _lock:
+        _collectors[name] = collect
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+# --- SPANS ---
+class _Span:
+    __slots__ = ('stage', 'start', 'counts')
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.counts = None
+
+    def add(self, **counts):
+        """Adds to counters labelled with this span's stage when it ends."""
+        if self.counts is None:
+            self.counts = {}
+        for name, value in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.stage, time.perf_counter() - self.start, self.counts)
+        return False
+
+class _NoSpan:
+    __slots__ = ()
+
+    def add(self, **counts):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+def span(stage):
+    """Times the with-block under `stage`; a no-op when instrumentation is off."""
+    return _Span(stage) if ENABLED else _NO_SPAN
+
+def set_enabled(enabled):
+    global ENABLED
+    ENABLED = bool(enabled)
+
+# --- EXPORT ---
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+def snapshot():
+    """Returns (stages, counters, gauges) for display.
+
+    `stages` maps each stage to count, total, mean and recent p50/p95/max
+    seconds; `counters` maps (name, stage) to totals.
+    """
+    with _lock:
+        stages = {stage: {
+            'count': h.count,
+            'total_s': h.sum,
+            'mean_s': h.sum / h.count if h.count else 0.0,
+            'p50_s': _percentile(h.recent, 50),
+            'p95_s': _percentile(h.recent, 95),
+            'max_s': max(h.recent, default=0.0),
+        } for stage, h in _histograms.items()}
+        counters = dict(_counters)
+        collectors = dict(_collectors)
+    gauges = {}
+    for name, collect in collectors.items():
+        for metric, value in collect().items():
+            gauges[f"{name}_{metric}"] = value
+    return stages, counters, gauges
+
+def _labels(**labels):
+    text = ','.join(f'{key}="{value}"' for key, value in labels.items() if value is not None)
+    return f"{{{text}}}" if text else ''
+
+def prometheus_text():
+    """Renders every metric in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {stage: (list(h.counts), h.count, h.sum) for stage, h in _histograms.items()}
+        counters = dict(_counters)
+    _, _, gauges = snapshot()
+    name = f"{METRICS_PREFIX}_stage_seconds"
+    lines = [f"# HELP {name} Time spent per instrumented stage.", f"# TYPE {name} histogram"]
+    for stage, (counts, total, seconds) in sorted(histograms.items()):
+        cumulative = 0
+        for bound, bucket in zip((*BUCKETS, '+Inf'), counts):
+            cumulative += bucket
+            lines.append(f"{name}_bucket{_labels(stage=stage, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(stage=stage)} {seconds:.6f}")
+        lines.append(f"{name}_count{_labels(stage=stage)} {total}")
+    for counter in sorted({key[0] for key in counters}):
+        metric = f"{METRICS_PREFIX}_{counter}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for (key, stage), value in sorted(counters.items(), key=lambda item: str(item[0][1])):
+            if key == counter:
+                lines.append(f"{metric}{_labels(stage=stage)} {value}")
+    for gauge, value in sorted(gauges.items()):
+        lines.append(f"# TYPE {METRICS_PREFIX}_{gauge} gauge")
+        lines.append(f"{METRICS_PREFIX}_{gauge} {value}")
+    return "\n".join(lines) + "\n"
+
+def write_metrics(path=METRICS_FILE):
+    """Writes prometheus_text() to `path` atomically; returns the path."""
+    global _last_write
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+    _last_write = time.monotonic()
+    return path
+
+def maybe_write_metrics(path=METRICS_FILE):
+    """Calls write_metrics at most once per WRITE_INTERVAL; cheap to call on every rerun."""
+    if ENABLED and time.monotonic() - _last_write >= WRITE_INTERVAL:
+        write_metrics(path)
+
+# --- PROFILING ---
+_profiles = {}
+
+def start_profile():
+    """Starts a cProfile capture on the calling thread; pass the result to finish_profile."""
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def finish_profile(profiler, label, top=40):
+    """Stops `profiler` and keeps its report as the latest profile for `label`.
+
+    The raw stats are saved under PROFILE_DIR for snakeviz or pstats.
+    Returns the report dict.
+    """
+    import io
+    import pstats
+    from datetime import datetime
+
+    profiler.disable()
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats('cumulative').print_stats(top)
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    captured_at = datetime.now()
+    path = os.path.join(PROFILE_DIR, f"{label.lower().replace(' ', '_')}_{captured_at:%Y%m%d%H%M%S}.prof")
+    stats.dump_stats(path)
+    report = {'label': label, 'captured_at': captured_at.isoformat(timespec='seconds'),
+              'total_s': stats.total_tt, 'text': out.getvalue(), 'path': path}
+    with _lock:
+        _profiles[label] = report
+    return report
+
+def latest_profiles():
+    with _lock:
+        return dict(_profiles)
@@ -0,0 +1,337 @@
+"""Retention, downsampling and compaction for the activity database.
+
+    python maintenance.py --dry-run                        # what a pass would delete and free
+    python maintenance.py                                  # one pass
+    python maintenance.py --every 3600                     # one pass an hour until interrupted
+    python maintenance.py --retention alerts=90 activity_daily=none
+
+A pass first expires rows older than each table's RETENTION, oldest first
+and about `batch_rows` per write transaction with a short pause between
+them, so ingest never waits long for the write lock. Expired
+activity_hourly rows are folded into activity_daily in the same
+transaction that deletes them. Raw activity is kept forever by default;
+given a retention, it is moved to the Parquet archive by
+archive.archive_activity rather than deleted, and the hourly rollup, which
+the insert trigger keeps current, is left alone.
+
+It then compacts: free pages go back to the filesystem with an incremental
+vacuum, planner statistics are refreshed by a bounded ANALYZE and the WAL
+is checkpointed and truncated.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from archive import ARCHIVE_DIR, archive_activity
+from db_pool import DB_NAME
+from db_utils import bump_data_epoch, get_db
+from instrumentation import span
+
+def parse_days(value):
+    """Returns `value` as a number of days; 'none' or an empty value keeps rows forever."""
+    return None if value is None or str(value).strip().lower() in ('', 'none') else int(value)
+
+def parse_retention(items):
+    """Turns TABLE=DAYS strings into a `retention` override dict; raises ValueError on bad input."""
+    retention = {}
+    for item in items:
+        table, _, days = item.partition('=')
+        if table not in TIME_COLUMNS or not days:
+            raise ValueError(f"expected TABLE=DAYS with TABLE one of {', '.join(TIME_COLUMNS)}, got {item!r}")
+        retention[table] = parse_days(days)
+    return retention
+
+def _retention_days(table, default):
+    return parse_days(os.environ.get(f"RETENTION_{table.upper()}_DAYS", default))
+
+# Days each table keeps rows for; None keeps them forever. Override one with
+# RETENTION_<TABLE>_DAYS, e.g. RETENTION_ALERTS_DAYS=90. Raw activity past its
+# retention is archived, not dropped.
+RETENTION = {
+    'activity_hourly': _retention_days('activity_hourly', '730'),
+    'activity_logs': _retention_days('activity_logs', None),
+    'alerts': _retention_days('alerts', '365'),
+    'activity_daily': _retention_days('activity_daily', None),
+}
+# The indexed time column of each table, in the order a pass expires them:
+# hourly rows are folded into activity_daily before it is pruned.
+TIME_COLUMNS = {
+    'activity_hourly': 'hour_start',
+    'activity_logs': 'timestamp',
+    'alerts': 'timestamp',
+    'activity_daily': 'day',
+}
+BATCH_ROWS = 5_000
+# Seconds between batches, so writers queued on the lock get a turn.
+BATCH_PAUSE = 0.005
+# Free pages released per incremental_vacuum call (4 MiB at the default page size).
+VACUUM_PAGES = 1_000
+# Rows ANALYZE samples per index; bounds its cost on large tables.
+ANALYSIS_LIMIT = 1_000
+INTERVAL = float(os.environ.get("MAINTENANCE_INTERVAL", "3600"))
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+INCREMENTAL = 2
+
+FOLD_HOURLY_SQL = '''
+    INSERT INTO activity_daily (username, day, Files_Accessed, Emails_Sent, USB_Devices_Used, Event_Count,
+                                First_Login_Hour, Last_Login_Hour)
+    SELECT username, substr(hour_start, 1, 10), SUM(Files_Accessed), SUM(Emails_Sent), SUM(USB_Devices_Used),
+           SUM(Event_Count), MIN(NULLIF(Login_Hour, -1)), MAX(NULLIF(Login_Hour, -1))
+    FROM activity_hourly
+    WHERE hour_start >= ? AND hour_start < ?
+    GROUP BY 1, 2
+    ON CONFLICT (username, day) DO UPDATE SET
+        Files_Accessed = Files_Accessed + excluded.Files_Accessed,
+        Emails_Sent = Emails_Sent + excluded.Emails_Sent,
+        USB_Devices_Used = USB_Devices_Used + excluded.USB_Devices_Used,
+        Event_Count = Event_Count + excluded.Event_Count,
+        First_Login_Hour = MIN(COALESCE(First_Login_Hour, excluded.First_Login_Hour),
+                               COALESCE(excluded.First_Login_Hour, First_Login_Hour)),
+        Last_Login_Hour = MAX(COALESCE(Last_Login_Hour, excluded.Last_Login_Hour),
+                              COALESCE(excluded.Last_Login_Hour, Last_Login_Hour))
+'''
+
+def cutoffs(retention=None, now=None):
+    """Maps each table kept for a limited time to its cutoff date; older rows are expired.
+
+    `retention` overrides entries of RETENTION.
+    """
+    now = now or datetime.now()
+    retention = {**RETENTION, **(retention or {})}
+    return {table: (now - timedelta(days=days)).strftime("%Y-%m-%d")
+            for table, days in retention.items() if days is not None}
+
+def db_size(db_name=DB_NAME):
+    """Bytes on disk for the database file and its WAL."""
+    return sum(os.path.getsize(path) for path in (db_name, f"{db_name}-wal") if os.path.exists(path))
+
+# --- RETENTION ---
+def _next_batch(conn, table, cutoff, batch_rows):
+    """Returns [start, end) covering about `batch_rows` expired rows, or None when none are left.
+
+    Bounds are values of the time column, so rows sharing a value (one
+    rollup hour) always land in the same batch.
+    """
+    column = TIME_COLUMNS[table]
+    start = conn.execute(f"SELECT MIN({column}) FROM {table} WHERE {column} < ?", (cutoff,)).fetchone()[0]
+    if start is None:
+        return None
+    row = conn.execute(f"SELECT {column} FROM {table} WHERE {column} >= ? AND {column} < ? "
+                       f"ORDER BY {column} LIMIT 1 OFFSET ?", (start, cutoff, batch_rows)).fetchone()
+    if row is None:
+        return start, cutoff
+    if row[0] == start:
+        # More than batch_rows rows share the first value; take just that value.
+        row = conn.execute(f"SELECT MIN({column}) FROM {table} WHERE {column} > ? AND {column} < ?",
+                           (start, cutoff)).fetchone()
+    return start, row[0] or cutoff
+
+def expire(table, cutoff, db_name=DB_NAME, batch_rows=BATCH_ROWS, pause=BATCH_PAUSE):
+    """Deletes rows of `table` older than `cutoff` in short transactions; returns (rows, batches).
+
+    activity_hourly rows are folded into activity_daily by the transaction
+    that deletes them, so an interrupted run never loses or double-counts
+    them. Each batch bumps the data epoch so cached reads are refreshed.
+    """
+    column = TIME_COLUMNS[table]
+    pool = get_db(db_name)
+    deleted = batches = 0
+    with span(f'maintenance.{table}') as s:
+        while True:
+            with pool.write() as conn:
+                bounds = _next_batch(conn, table, cutoff, batch_rows)
+                if bounds is None:
+                    break
+                if table == 'activity_hourly':
+                    conn.execute(FOLD_HOURLY_SQL, bounds)
+                deleted += conn.execute(f"DELETE FROM {table} WHERE {column} >= ? AND {column} < ?",
+                                        bounds).rowcount
+                bump_data_epoch(conn)
+            batches += 1
+            time.sleep(pause)
+        s.add(rows=deleted)
+    return deleted, batches
+
+# --- COMPACTION ---
+def _freelist(conn):
+    return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+def compact(db_name=DB_NAME, convert=False, vacuum_pages=VACUUM_PAGES, analysis_limit=ANALYSIS_LIMIT,
+            pause=BATCH_PAUSE):
+    """Releases free pages, refreshes planner statistics and truncates the WAL; returns a summary dict.
+
+    Pages are released `vacuum_pages` at a time, which needs
+    auto_vacuum=INCREMENTAL. Databases created through db_pool have it;
+    older files are converted by one full VACUUM when `convert` is set,
+    which rewrites the whole file and holds the write lock until it is done.
+    """
+    pool = get_db(db_name)
+    summary = {'converted': False, 'pages_freed': 0}
+    with span('maintenance.vacuum') as s:
+        with pool.exclusive() as conn:
+            mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            if mode != INCREMENTAL and convert:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+                mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+                summary['converted'] = True
+        while mode == INCREMENTAL:
+            with pool.exclusive() as conn:
+                before = _freelist(conn)
+                if not before:
+                    break
+                # executescript steps the pragma to completion; execute() frees a single page.
+                conn.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages)})")
+                freed = before - _freelist(conn)
+            summary['pages_freed'] += freed
+            if not freed:
+                break
+            time.sleep(pause)
+        s.add(pages=summary['pages_freed'])
+    summary['auto_vacuum'] = AUTO_VACUUM_MODES.get(mode, mode)
+    with span('maintenance.analyze'), pool.write() as conn:
+        conn.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+        conn.execute("ANALYZE")
+    with span('maintenance.checkpoint'), pool.exclusive() as conn:
+        busy, wal_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    summary['checkpoint'] = {'busy': bool(busy), 'wal_pages': wal_pages, 'checkpointed_pages': checkpointed}
+    return summary
+
+# --- REPORTING ---
+def _table_bytes(conn):
+    """Maps each table to the bytes its pages and indexes use; empty when SQLite lacks dbstat."""
+    owners = dict(conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')"))
+    try:
+        rows = conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    sizes = {}
+    for name, size in rows:
+        table = owners.get(name, name)
+        sizes[table] = sizes.get(table, 0) + size
+    return sizes
+
+def dry_run(retention=None, db_name=DB_NAME):
+    """Reports what run_maintenance would delete and about how many bytes it would free, without writing.
+
+    Each table's estimate is its share of expired rows times the bytes it
+    and its indexes use; pages already on the freelist and the WAL, which
+    the checkpoint truncates, are added on top.
+    """
+    wal_path = f"{db_name}-wal"
+    wal_bytes = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+    with get_db(db_name).read() as conn:
+        sizes = _table_bytes(conn)
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        free_bytes = _freelist(conn) * page_size
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        tables = {}
+        for table, cutoff in cutoffs(retention).items():
+            column = TIME_COLUMNS[table]
+            rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            expired = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {column} < ?", (cutoff,)).fetchone()[0]
+            size = sizes.get(table)
+            row_bytes = size / rows if size and rows else 0
+            report = {'cutoff': cutoff, 'rows': rows, 'expired_rows': expired, 'bytes': size,
+                      'reclaim_bytes': round(row_bytes * expired) if size is not None else None}
+            if table == 'activity_hourly':
+                # Each folded user-day becomes one activity_daily row of about the same size.
+                report['daily_rows_added'] = conn.execute(
+                    "SELECT COUNT(*) FROM (SELECT DISTINCT username, substr(hour_start, 1, 10) "
+                    "FROM activity_hourly WHERE hour_start < ?)", (cutoff,)).fetchone()[0]
+                if report['reclaim_bytes'] is not None:
+                    report['reclaim_bytes'] -= round(row_bytes * report['daily_rows_added'])
+            tables[table] = report
+    estimates = [report['reclaim_bytes'] for report in tables.values()]
+    summary = {
+        'db_bytes': db_size(db_name),
+        'free_bytes': free_bytes,
+        'wal_bytes': wal_bytes,
+        'tables': tables,
+        'reclaim_bytes': None if None in estimates else sum(estimates) + free_bytes + wal_bytes,
+        'auto_vacuum': AUTO_VACUUM_MODES.get(mode, mode),
+    }
+    if mode != INCREMENTAL:
+        summary['note'] = ("auto_vacuum is off: freed pages are reused but the file only shrinks after "
+                           "one pass with --convert.")
+    return summary
+
+# --- SCHEDULING ---
+def run_maintenance(retention=None, db_name=DB_NAME, convert=False, batch_rows=BATCH_ROWS, pause=BATCH_PAUSE,
+                    archive_dir=ARCHIVE_DIR):
+    """One pass: expires every table per RETENTION (overridden by `retention`), then compacts.
+
+    Expired raw activity is first moved to the Parquet archive in `archive_dir`.
+    Returns a summary dict.
+    """
+    started = time.perf_counter()
+    size_before = db_size(db_name)
+    days = {**RETENTION, **(retention or {})}
+    deleted = {}
+    for table, cutoff in cutoffs(retention).items():
+        report = deleted[table] = {'cutoff': cutoff}
+        if table == 'activity_logs':
+            with span('maintenance.archive') as s:
+                report['archived'] = archive_activity(days[table], db_name, archive_dir, batch_rows)['rows']
+                s.add(rows=report['archived'])
+        report['rows'], report['batches'] = expire(table, cutoff, db_name, batch_rows, pause)
+    summary = {'deleted': deleted, 'compaction': compact(db_name, convert, pause=pause)}
+    summary.update(size_before=size_before, size_after=db_size(db_name),
+                   seconds=round(time.perf_counter() - started, 3))
+    return summary
+
+class MaintenanceScheduler:
+    """Runs run_maintenance every `interval` seconds on a daemon thread until closed."""
+
+    def __init__(self, interval=INTERVAL, db_name=DB_NAME, **options):
+        self.interval = interval
+        self.db_name = db_name
+        self.options = options
+        self.last_run = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.last_run = run_maintenance(db_name=self.db_name, **self.options)
+            except Exception as e:
+                print(f"Maintenance pass failed: {e}")
+
+    def close(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DB_NAME)
+    parser.add_argument('--retention', nargs='+', default=[], metavar='TABLE=DAYS',
+                        help=f"Override retention per table ({', '.join(TIME_COLUMNS)}); 'none' keeps rows forever.")
+    parser.add_argument('--dry-run', action='store_true', help="Report what would be deleted and freed, then exit.")
+    parser.add_argument('--convert', action='store_true',
+                        help="Switch an older database to incremental vacuum with one full VACUUM.")
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS)
+    parser.add_argument('--every', type=float, metavar='SECONDS', help="Keep running, one pass per interval.")
+    args = parser.parse_args()
+    try:
+        overrides = parse_retention(args.retention)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.dry_run:
+        print(json.dumps(dry_run(overrides, args.db), indent=2))
+    else:
+        while True:
+            print(json.dumps(run_maintenance(overrides, args.db, args.convert, args.batch_rows), indent=2))
+            if args.every is None:
+                break
+            time.sleep(args.every)
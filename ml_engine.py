@@ -0,0 +1,349 @@
+import copy
+import glob
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+import joblib
+import numpy as np
+import sklearn
+from sklearn.ensemble import IsolationForest
+
+import parallel_scoring
+from instrumentation import span
+
+MODELS_DIR = "models"
+FEATURES = ['Login_Hour', 'Files_Accessed', 'Emails_Sent', 'USB_Devices_Used']
+
+# A saved model is retrained when it is older than MAX_MODEL_AGE or when the
+# activity log has grown by more than MAX_ROW_GROWTH since it was trained.
+MAX_MODEL_AGE = timedelta(days=1)
+MAX_ROW_GROWTH = 0.2
+
+# SlidingWindowForest defaults: one member per ONLINE_BATCH_ROWS new rows,
+# the newest ONLINE_MAX_MEMBERS kept, so the model covers the latest
+# ONLINE_BATCH_ROWS * ONLINE_MAX_MEMBERS rows with at most
+# ONLINE_MAX_MEMBERS * ONLINE_TREES_PER_MEMBER trees.
+ONLINE_BATCH_ROWS = 20_000
+ONLINE_MAX_MEMBERS = 8
+ONLINE_TREES_PER_MEMBER = 16
+# Rows kept per batch: the members' training sample and the share of it
+# that the anomaly threshold is calibrated on.
+ONLINE_SAMPLE_ROWS = 4_096
+ONLINE_CALIBRATION_ROWS = 1_024
+
+_model_cache = {}
+_model_cache_lock = threading.Lock()
+
+# --- TRAINING ---
+def fit_model(df, contamination=0.1, n_workers=None):
+    """Fits an IsolationForest on the activity features without saving it.
+
+    Trees are built on `n_workers` cores; the fitted forest does not depend
+    on the worker count.
+    """
+    n_workers = n_workers or parallel_scoring.DEFAULT_WORKERS
+    model = IsolationForest(contamination=contamination, random_state=42, n_jobs=n_workers)
+    model.fit(df[FEATURES].to_numpy())
+    # Scoring is parallelized by parallel_scoring, not by joblib threads.
+    model.set_params(n_jobs=None)
+    return model
+
+def train_model(df, contamination=0.1, models_dir=MODELS_DIR, n_workers=None):
+    """Fits an IsolationForest on `df` and saves it with its metadata.
+
+    Returns (model, metadata). The model is written to
+    `<models_dir>/isolation_forest_<version>.joblib` next to a JSON file
+    describing the features, contamination, training window and row count.
+    """
+    with span('model.train') as s:
+        model = fit_model(df, contamination, n_workers)
+        scores = parallel_scoring.decision_function(model, df[FEATURES].to_numpy(), n_workers)
+        s.add(rows=len(df))
+    version = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    metadata = {
+        'version': version,
+        'trained_at': datetime.now().isoformat(timespec='seconds'),
+        'features': FEATURES,
+        'contamination': contamination,
+        'row_count': len(df),
+        'training_window': _training_window(df),
+        'score_range': [float(scores.min()), float(scores.max())] if len(scores) else None,
+        'sklearn_version': sklearn.__version__,
+    }
+    os.makedirs(models_dir, exist_ok=True)
+    base = os.path.join(models_dir, f"isolation_forest_{version}")
+    joblib.dump(model, base + ".joblib")
+    with open(base + ".json", 'w') as f:
+        json.dump(metadata, f, indent=2)
+    with _model_cache_lock:
+        _model_cache[base] = (model, metadata)
+    return model, metadata
+
+def _training_window(df):
+    if 'timestamp' not in df.columns or df.empty:
+        return None
+    return [str(df['timestamp'].min()), str(df['timestamp'].max())]
+
+# --- ONLINE LEARNING ---
+class SlidingWindowForest:
+    """An IsolationForest ensemble that learns from new rows instead of refitting on all history.
+
+    Rows given to `partial_fit` are reservoir-sampled; every `batch_rows`
+    rows the sample trains one small member forest and the oldest member
+    is retired once there are `max_members`. An update therefore costs the
+    same however long the activity log gets, and memory is bounded by the
+    member count. A model with no members yet trains its first one from
+    whatever rows it has, so it can score straight away.
+
+    Scores pool the members' normalized path lengths, which is what a
+    single forest made of all their trees would report. After each new
+    member the threshold is recalibrated so that `contamination` of the
+    recent rows is flagged. decision_function follows IsolationForest
+    (negative means anomalous), so anomaly_scores and parallel_scoring take
+    this model unchanged.
+
+    The members, threshold and score range are replaced together in one
+    assignment, so a scoring call that runs during an update sees either
+    the old model or the new one, never a mix.
+    """
+
+    def __init__(self, contamination=0.1, batch_rows=ONLINE_BATCH_ROWS, max_members=ONLINE_MAX_MEMBERS,
+                 trees_per_member=ONLINE_TREES_PER_MEMBER, sample_rows=ONLINE_SAMPLE_ROWS,
+                 calibration_rows=ONLINE_CALIBRATION_ROWS, random_state=42):
+        self.contamination = contamination
+        self.batch_rows = batch_rows
+        self.max_members = max_members
+        self.trees_per_member = trees_per_member
+        self.sample_rows = sample_rows
+        self.calibration_rows = calibration_rows
+        # ((forest, calibration rows) per member oldest first, offset_, score_range_).
+        self._fitted = ((), None, None)
+        self.rows_seen = 0
+        self.updates = 0
+        self.created_at = datetime.now().strftime("%Y%m%d%H%M%S%f")
+        self.updated_at = None
+        self._rng = np.random.default_rng(random_state)
+        self._sample = None
+        self._pending = 0
+
+    @property
+    def window_rows(self):
+        return self.batch_rows * self.max_members
+
+    @property
+    def members(self):
+        return self._fitted[0]
+
+    @property
+    def offset_(self):
+        return self._fitted[1]
+
+    @property
+    def score_range_(self):
+        return self._fitted[2]
+
+    def partial_fit(self, X):
+        """Learns from new rows (a feature matrix in FEATURES order); returns self.
+
+        Only the last `window_rows` rows can still be in the window once
+        the update is done, so earlier ones are skipped.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        self.rows_seen += len(X)
+        X = X[-self.window_rows:]
+        while len(X):
+            take = min(len(X), self.batch_rows - self._pending)
+            self._reservoir(X[:take])
+            X = X[take:]
+            if self._pending == self.batch_rows:
+                self._add_member()
+        if not self.members and self._pending:
+            self._add_member()
+        return self
+
+    def _reservoir(self, X):
+        """Keeps a uniform sample of up to `sample_rows` of the rows seen since the last member."""
+        if self._sample is None:
+            self._sample = np.empty((0, X.shape[1]))
+        room = self.sample_rows - len(self._sample)
+        if room > 0:
+            self._sample = np.vstack([self._sample, X[:room]])
+        rest = X[max(room, 0):]
+        if len(rest):
+            seen = self._pending + max(room, 0) + np.arange(1, len(rest) + 1)
+            slots = (self._rng.random(len(rest)) * seen).astype(np.int64)
+            keep = slots < self.sample_rows
+            self._sample[slots[keep]] = rest[keep]
+        self._pending += len(X)
+
+    def _add_member(self):
+        sample, self._sample, self._pending = self._sample, None, 0
+        forest = IsolationForest(n_estimators=self.trees_per_member, max_samples=min(256, len(sample)),
+                                 random_state=int(self._rng.integers(2**31)))
+        forest.fit(sample)
+        calibration = sample[self._rng.permutation(len(sample))[:self.calibration_rows]]
+        members = (*self.members, (forest, calibration))[-self.max_members:]
+        scores = _pooled_scores(members, np.vstack([rows for _, rows in members]))
+        offset = float(np.percentile(scores, 100 * self.contamination))
+        self._fitted = (members, offset, (float(scores.min() - offset), float(scores.max() - offset)))
+        self.updates += 1
+        self.updated_at = datetime.now().isoformat(timespec='seconds')
+
+    def score_samples(self, X):
+        """IsolationForest.score_samples over the trees of every member."""
+        return _pooled_scores(self.members, X)
+
+    def decision_function(self, X):
+        members, offset, _ = self._fitted
+        return _pooled_scores(members, X) - offset
+
+    def snapshot(self):
+        """Returns a copy sharing the fitted members, to score with while this forest keeps learning."""
+        return copy.copy(self)
+
+    def metadata(self):
+        """Describes the model in the same terms as train_model's metadata."""
+        return {
+            'version': f"online_{self.created_at}_{self.updates}",
+            'trained_at': self.updated_at,
+            'features': FEATURES,
+            'contamination': self.contamination,
+            'row_count': self.rows_seen,
+            'members': len(self.members),
+            'window_rows': self.window_rows,
+            'score_range': list(self.score_range_) if self.score_range_ else None,
+        }
+
+def _pooled_scores(members, X):
+    if not members:
+        raise ValueError("SlidingWindowForest has not learned from any rows yet.")
+    X = np.asarray(X, dtype=np.float64)
+    # log2(-score) is minus a member's normalized mean path length; weighting
+    # by tree count averages the path lengths of all trees together.
+    trees = sum(forest.n_estimators for forest, _ in members)
+    log_depth = sum(forest.n_estimators * np.log2(-forest.score_samples(X)) for forest, _ in members)
+    return -np.exp2(log_depth / trees)
+
+_online_models = {}
+
+def get_online_model(df, contamination=0.1, models_dir=MODELS_DIR, data_epoch=None, reset=False):
+    """Returns (forest, metadata) for a process-wide SlidingWindowForest kept current with `df`.
+
+    `df` is the activity log in arrival order, as IncrementalActivityLoader
+    returns it; only rows past those already learned from are fed to the
+    forest. It is rebuilt from the newest rows when `reset` is set, when
+    `data_epoch` changes (rows were deleted) or when `df` shrinks.
+    `models_dir` only separates forests for different views. The forest
+    returned is a snapshot, so its scores always match the metadata's
+    version even if another session updates the shared one meanwhile.
+    """
+    key = (models_dir, contamination)
+    with _model_cache_lock:
+        forest, epoch = _online_models.get(key, (None, None))
+        if reset or forest is None or epoch != data_epoch or len(df) < forest.rows_seen:
+            forest = SlidingWindowForest(contamination)
+        if len(df) > forest.rows_seen:
+            with span('model.update') as s:
+                new_rows = df.iloc[forest.rows_seen:]
+                forest.partial_fit(new_rows[FEATURES].to_numpy())
+                s.add(rows=len(new_rows))
+        _online_models[key] = (forest, data_epoch)
+        snapshot = forest.snapshot()
+    return snapshot, snapshot.metadata()
+
+# --- LOADING ---
+def load_latest_model(contamination=None, models_dir=MODELS_DIR):
+    """Returns (model, metadata) for the newest saved model, or (None, None).
+
+    With `contamination` set, only models trained with that rate are
+    considered. Loaded models are kept in memory, so every session in the
+    process shares one copy.
+    """
+    for meta_path in sorted(glob.glob(os.path.join(models_dir, "isolation_forest_*.json")), reverse=True):
+        with open(meta_path) as f:
+            metadata = json.load(f)
+        if contamination is not None and not np.isclose(metadata['contamination'], contamination):
+            continue
+        base = meta_path[:-len(".json")]
+        with _model_cache_lock:
+            if base not in _model_cache:
+                _model_cache[base] = (joblib.load(base + ".joblib"), metadata)
+            return _model_cache[base]
+    return None, None
+
+def is_stale(metadata, row_count, now=None):
+    """True if a model should be retrained for a log that now holds `row_count` rows."""
+    if metadata is None:
+        return True
+    now = now or datetime.now()
+    if now - datetime.fromisoformat(metadata['trained_at']) > MAX_MODEL_AGE:
+        return True
+    return row_count > metadata['row_count'] * (1 + MAX_ROW_GROWTH)
+
+def get_model(df, contamination=0.1, force_retrain=False, models_dir=MODELS_DIR, n_workers=None):
+    """Returns a fresh enough (model, metadata), training a new one only when needed."""
+    model, metadata = load_latest_model(contamination, models_dir)
+    if force_retrain or model is None or is_stale(metadata, len(df)):
+        model, metadata = train_model(df, contamination, models_dir, n_workers)
+    return model, metadata
+
+# --- SCORING ---
+def anomaly_scores(df, model, score_range=None, n_workers=None):
+    """Returns (positions, columns) for the rows the fitted forest calls anomalous.
+
+    Only calls decision_function; a row is anomalous when its score is
+    negative, which is exactly what IsolationForest.predict reports. Risk
+    scores are rescaled over `score_range` (low, high) when given, otherwise
+    over the scores of `df` itself. With `n_workers` > 1 the scores are
+    computed on a process pool.
+    """
+    scores = parallel_scoring.decision_function(model, df[FEATURES].to_numpy(), n_workers)
+    flagged = np.flatnonzero(scores < 0)
+    # Create a risk score from anomaly scores
+    reference = scores if score_range is None else np.asarray(score_range)
+    return flagged, {
+        'Anomaly': np.full(len(flagged), -1),
+        'Risk_Score': normalize_scores(scores[flagged], reference),
+        'Reason': np.full(len(flagged), 'ML Anomaly Detected', dtype=object),
+    }
+
+def detect_threats_ml(df, model, score_range=None, n_workers=None):
+    """ML-based anomaly detection with an already fitted Isolation Forest.
+
+    Returns the anomalous rows, highest risk first, with Anomaly,
+    Risk_Score and Reason columns; see anomaly_scores. The input DataFrame
+    is left untouched.
+    """
+    from engine import IsolationForestDetector, detect
+
+    return detect(df, [IsolationForestDetector(model, score_range, n_workers=n_workers)])
+
+def normalize_scores(scores, reference):
+    """Rescales decision_function output to a 0-1 risk score over `reference`'s range.
+
+    Scores outside that range (later stream chunks, online updates) are clipped to 0 or 1.
+    """
+    low, high = np.min(reference), np.max(reference)
+    if high == low:
+        return np.zeros(len(scores))
+    return np.clip((low - scores) / (low - high), 0, 1)
+
+if __name__ == '__main__':
+    import argparse
+    from archive import read_activity
+
+    parser = argparse.ArgumentParser(description="Train the IsolationForest on the SQLite activity log.")
+    parser.add_argument('--contamination', type=float, default=0.1)
+    parser.add_argument('--days', type=int, help="Only train on the last N days of activity.")
+    parser.add_argument('--workers', type=int, default=parallel_scoring.DEFAULT_WORKERS)
+    args = parser.parse_args()
+
+    # Reads archived and live activity, decoding only the partitions and columns training needs.
+    cutoff = None
+    if args.days:
+        cutoff = (datetime.now() - timedelta(days=args.days)).strftime("%Y-%m-%d %H:%M:%S")
+    df = read_activity(start=cutoff, columns=['timestamp', *FEATURES])
+    _, metadata = train_model(df, args.contamination, n_workers=args.workers)
+    print(json.dumps(metadata, indent=2))
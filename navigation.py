@@ -23,6 +23,7 @@ def render_sidebar():
             # This path must exactly match the file in your pages folder
             # Change the path to the correct filename
             st.sidebar.page_link("pages/1_Threat_Dashboard.py", label="THREAT DASHBOARD")
+            st.sidebar.page_link("pages/5_Diagnostics.py", label="DIAGNOSTICS")
 
         st.sidebar.markdown("---")
         username = st.session_state.get('username', '')
@@ -0,0 +1,64 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Worker count used when callers don't pass one; set SCORING_WORKERS to use
+# more cores for ML scoring and training.
+DEFAULT_WORKERS = int(os.environ.get("SCORING_WORKERS", "1"))
+
+# Below this many rows the pool start-up costs more than it saves.
+MIN_PARALLEL_ROWS = 50_000
+PARTITIONS_PER_WORKER = 4
+
+_worker_model = None
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+def _score_partition(in_name, out_name, shape, dtype, start, stop):
+    """Scores rows [start, stop) of the shared input into the shared output."""
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        X = np.ndarray(shape, dtype=dtype, buffer=in_shm.buf)
+        out = np.ndarray(shape[0], dtype=np.float64, buffer=out_shm.buf)
+        out[start:stop] = _worker_model.decision_function(X[start:stop])
+    finally:
+        in_shm.close()
+        out_shm.close()
+
+def _to_shared(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+    return shm
+
+def decision_function(model, X, n_workers=None):
+    """Computes model.decision_function(X) across a process pool.
+
+    The feature matrix and the result live in shared memory, so workers
+    only receive row ranges, never pickled frames; the model is sent once
+    per worker. decision_function is computed row by row, so the merged
+    scores are identical to a serial call.
+    """
+    n_workers = n_workers or DEFAULT_WORKERS
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    if n_workers <= 1 or len(X) < MIN_PARALLEL_ROWS:
+        return model.decision_function(X)
+
+    in_shm = _to_shared(X)
+    out_shm = shared_memory.SharedMemory(create=True, size=max(len(X) * 8, 1))
+    try:
+        bounds = np.linspace(0, len(X), n_workers * PARTITIONS_PER_WORKER + 1, dtype=int)
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(model,)) as pool:
+            futures = [pool.submit(_score_partition, in_shm.name, out_shm.name, X.shape, X.dtype.str, start, stop)
+                       for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+            for future in futures:
+                future.result()
+        return np.ndarray(len(X), dtype=np.float64, buffer=out_shm.buf).copy()
+    finally:
+        for shm in (in_shm, out_shm):
+            shm.close()
+            shm.unlink()
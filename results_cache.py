@@ -0,0 +1,118 @@
+import os
+import threading
+from collections import OrderedDict
+
+import instrumentation
+
+# Memory budget for cached detection results, shared by every session.
+DEFAULT_BUDGET_BYTES = int(os.environ.get("RESULTS_CACHE_MB", "256")) * 2**20
+DEFAULT_MAX_ENTRIES = 64
+
+def _size_of(value):
+    if hasattr(value, 'memory_usage'):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, tuple):
+        return sum(_size_of(item) for item in value)
+    return 0
+
+class ResultsCache:
+    """LRU cache of detection results keyed by (data version, engine, parameters).
+
+    Keys start with the data version, so entries for older data are never
+    served; `retain_version` also drops them eagerly once newer rows have
+    been logged, keeping views of the current data (such as archived-history
+    ranges, whose versions carry the range after it) for other sessions. Entries are evicted least-recently-used first when either
+    the entry count or the memory budget is exceeded. Cached frames are
+    shared: callers must treat them as read-only.
+    """
+
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_BYTES, max_entries=DEFAULT_MAX_ENTRIES):
+        self.budget_bytes = budget_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached value for `key`, calling `compute()` on a miss.
+
+        Concurrent misses on the same key compute once; other callers wait.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][0]
+                self.misses += 1
+            value = compute()
+            self._put(key, value)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return value
+
+    def _put(self, key, value):
+        size = _size_of(value)
+        with self._lock:
+            if size > self.budget_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.budget_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def retain_version(self, data_version):
+        """Drops entries computed for data older than `data_version`.
+
+        Versions are compared on their (data epoch, max log_id) prefix, so
+        entries for the same data under another view are kept.
+        """
+        current = tuple(data_version[:2])
+        with self._lock:
+            for key in [key for key in self._entries if tuple(key[0][:2]) < current]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns hit/miss/eviction counters and current usage."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'budget_bytes': self.budget_bytes,
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_results_cache():
+    """Returns the process-wide ResultsCache shared by all Streamlit sessions."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultsCache()
+            # Exported as insider_threat_results_cache_<stat> gauges.
+            instrumentation.register_collector('results_cache', lambda: {
+                key: value for key, value in _cache.stats().items() if key != 'budget_bytes'})
+        return _cache
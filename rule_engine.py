@@ -0,0 +1,102 @@
+import numpy as np
+
+# Each rule compares one activity column against one (or, for 'outside', two)
+# entries of the thresholds dict. Add a rule by appending to RULES; its
+# position in the list is its bit in the Reason_Mask column.
+RULES = [
+    {'reason': 'Unusual Login', 'column': 'Login_Hour', 'op': 'outside', 'threshold': ('early_hour', 'late_hour')},
+    {'reason': 'Excessive Files', 'column': 'Files_Accessed', 'op': '>', 'threshold': 'files_accessed'},
+    {'reason': 'High Emails', 'column': 'Emails_Sent', 'op': '>', 'threshold': 'emails_sent'},
+    {'reason': 'Multiple USBs', 'column': 'USB_Devices_Used', 'op': '>=', 'threshold': 'usb_devices'},
+]
+
+# Defaults match the sidebar sliders in the dashboards.
+DEFAULT_THRESHOLDS = {
+    'late_hour': 22,
+    'early_hour': 5,
+    'files_accessed': 40,
+    'emails_sent': 50,
+    'usb_devices': 2,
+}
+
+OPS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '==': np.equal,
+    # Outside the (low, high) window, inclusive on both ends.
+    'outside': lambda values, bounds: (values <= bounds[0]) | (values >= bounds[1]),
+}
+
+def _mask_dtype(rules):
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if len(rules) <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError(f"At most 64 rules are supported, got {len(rules)}.")
+
+def _threshold_value(rule, thresholds):
+    keys = rule['threshold']
+    if isinstance(keys, tuple):
+        return tuple(thresholds[key] for key in keys)
+    return thresholds[keys]
+
+def evaluate_rules(df, thresholds, rules=RULES):
+    """Evaluates every rule as a NumPy boolean array.
+
+    Returns (mask, hits): `mask` has one bit set per triggered rule and
+    `hits` counts the triggered rules per row. The input is not modified.
+    """
+    dtype = _mask_dtype(rules)
+    mask = np.zeros(len(df), dtype=dtype)
+    hits = np.zeros(len(df), dtype=np.uint8)
+    for bit, rule in enumerate(rules):
+        values = df[rule['column']].to_numpy()
+        triggered = OPS[rule['op']](values, _threshold_value(rule, thresholds))
+        mask |= triggered.astype(dtype) << dtype(bit)
+        hits += triggered
+    return mask, hits
+
+def decode_reasons(mask, rules=RULES):
+    """Turns Reason_Mask values into 'Reason A; Reason B' strings.
+
+    Only distinct mask values are decoded, so the cost depends on the
+    number of rule combinations rather than the number of rows.
+    """
+    mask = np.asarray(mask)
+    if mask.size == 0:
+        return np.array([], dtype=object)
+    unique, inverse = np.unique(mask, return_inverse=True)
+    labels = np.array(['; '.join(rule['reason'] for bit, rule in enumerate(rules) if int(value) >> bit & 1)
+                       for value in unique], dtype=object)
+    return labels[inverse]
+
+def add_reasons(df, rules=RULES):
+    """Returns a copy of a scored frame with a readable Reason column."""
+    df = df.copy()
+    df['Reason'] = decode_reasons(df['Reason_Mask'].to_numpy(), rules)
+    return df
+
+def rule_scores(df, thresholds, rules=RULES):
+    """Returns (positions, columns) for the rows that broke at least one rule.
+
+    `columns` holds Risk_Score and Reason_Mask for those rows, in the same
+    order as `positions`.
+    """
+    mask, hits = evaluate_rules(df, thresholds, rules)
+    # Calculate score based on number of rules broken
+    score_increment = 1.0 / len(thresholds)
+    flagged = np.flatnonzero(hits)
+    return flagged, {'Risk_Score': hits[flagged] * score_increment, 'Reason_Mask': mask[flagged]}
+
+def detect_threats_rules(df, thresholds, rules=RULES, with_reasons=True):
+    """Rule-based detection with risk scoring.
+
+    Returns only the rows that broke at least one rule, highest risk first,
+    with Risk_Score and Reason_Mask columns (and Reason unless
+    `with_reasons` is False, in which case call add_reasons on the rows
+    you display). The input DataFrame is left untouched.
+    """
+    from engine import RuleDetector, detect
+
+    return detect(df, [RuleDetector(thresholds, rules, with_reasons)])
@@ -0,0 +1,99 @@
+import pandas as pd
+
+from engine import build_detectors, score_stream
+
+CHUNK_ROWS = 250_000
+
+# Compact dtypes for activity exports. Hours and USB counts fit in a byte;
+# file and email counters get 32 bits. Columns missing from a file are ignored.
+CSV_DTYPES = {
+    'User_ID': 'category',
+    'username': 'category',
+    'Login_Hour': 'uint8',
+    'Files_Accessed': 'uint32',
+    'Emails_Sent': 'uint32',
+    'USB_Devices_Used': 'uint8',
+}
+# read_csv wraps out-of-range values and rejects blanks in unsigned columns,
+# so numbers are read as inferred and checked by clean_activity before the cast.
+READ_DTYPES = {column: dtype for column, dtype in CSV_DTYPES.items() if dtype == 'category'}
+# Inclusive range of each numeric column.
+COLUMN_RANGES = {
+    'Login_Hour': (0, 23),
+    'Files_Accessed': (0, 2**32 - 1),
+    'Emails_Sent': (0, 2**32 - 1),
+    'USB_Devices_Used': (0, 2**8 - 1),
+}
+
+def clean_activity(df):
+    """Checks the numeric columns and casts them to CSV_DTYPES; raises ValueError on unusable values.
+
+    Blank counters count as 0, as the database's COALESCE does, and counters
+    outside their dtype's range are clipped. Login hours must be present and
+    between 0 and 23.
+    """
+    for column, (low, high) in COLUMN_RANGES.items():
+        if column not in df.columns:
+            continue
+        values = pd.to_numeric(df[column], errors='coerce')
+        text = values.isna() & df[column].notna()
+        if text.any():
+            raise ValueError(f"{column} has non-numeric values such as {df[column][text].iloc[0]!r}")
+        if column == 'Login_Hour':
+            bad = values.isna() | ~values.between(low, high)
+            if bad.any():
+                raise ValueError(f"Login_Hour must be between {low} and {high}; {int(bad.sum())} row(s) are blank "
+                                 "or out of range")
+        else:
+            values = values.fillna(0).clip(low, high)
+        df[column] = values.astype(CSV_DTYPES[column])
+    return df
+
+def read_activity_csv(source, columns=None):
+    """Reads a whole activity CSV with the compact dtypes."""
+    return clean_activity(pd.read_csv(source, dtype=READ_DTYPES, usecols=columns))
+
+def read_activity_chunks(source, chunksize=CHUNK_ROWS):
+    """Yields DataFrame chunks of an activity CSV using the compact dtypes."""
+    for chunk in pd.read_csv(source, dtype=READ_DTYPES, chunksize=chunksize):
+        yield clean_activity(chunk)
+
+def score_chunks(chunks, engine='rules', thresholds=None, model=None, score_range=None, contamination=0.1,
+                 method='max', min_detectors=1):
+    """Scores an iterable of activity chunks and yields (rows_in_chunk, suspicious_rows).
+
+    `engine` is a detector name from engine.DETECTORS ('rules', 'ml',
+    'online', 'baseline') or a list of them, merged by engine.combine with
+    `method` and `min_detectors`.
+    For 'ml', pass a fitted `model`, or one is fitted on the first chunk
+    with `contamination`. 'online' starts from the first chunk and keeps
+    learning from the later ones. Risk scores are rescaled over `score_range`
+    (defaulting to the first chunk's decision_function range) so that every
+    chunk shares one scale. Only one chunk is held in memory at a time.
+    """
+    names = [engine] if isinstance(engine, str) else list(engine)
+    detectors = build_detectors(names, thresholds, model, score_range, contamination)
+    yield from score_stream(chunks, detectors, method, min_detectors=min_detectors)
+
+def score_csv(source, engine='rules', thresholds=None, model=None, score_range=None, contamination=0.1,
+              chunksize=CHUNK_ROWS, method='max', min_detectors=1):
+    """Scores a CSV of any size chunk by chunk.
+
+    Returns (suspicious_df, total_rows). Peak memory is one chunk plus the
+    suspicious rows, regardless of the size of the file.
+    """
+    total_rows = 0
+    suspicious_parts = []
+    # A chunk's empty result still has the result columns, for a file with no alerts.
+    no_alerts = pd.DataFrame(columns=['Risk_Score'])
+    for rows, suspicious in score_chunks(read_activity_chunks(source, chunksize), engine, thresholds,
+                                         model, score_range, contamination, method, min_detectors):
+        total_rows += rows
+        if not suspicious.empty:
+            suspicious_parts.append(suspicious)
+        elif total_rows == rows:
+            no_alerts = suspicious
+    if not suspicious_parts:
+        return no_alerts, total_rows
+    suspicious_df = pd.concat(suspicious_parts, ignore_index=True)
+    return suspicious_df.sort_values(by='Risk_Score', ascending=False, kind='stable'), total_rows
@@ -0,0 +1,210 @@
+"""Synthetic activity for benchmarks and evaluation.
+
+Each user gets a fixed profile: a working day, an event rate and how often
+they email, download or copy to USB. Every event looks like one the
+simulation pages log: an email is (0 files, 1 email, 0 USB), a download is
+1-5 files, a USB copy is 1-5 files on one device. A small share of users
+are insiders who, on one day in the second half of the period, run one of
+SCENARIOS. Their rows are labelled Is_Insider = 1 with the scenario name.
+
+    python synthetic_data.py --users 1000 --days 90 --output activity.parquet
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+ACTIVITY_COLUMNS = ['log_id', 'username', 'timestamp', 'Login_Hour', 'Files_Accessed', 'Emails_Sent',
+                    'USB_Devices_Used']
+LABEL_COLUMNS = ['Is_Insider', 'Scenario']
+# Share of events that fall outside the user's working day (late e-mails and the like).
+OFF_HOURS_SHARE = 0.02
+WEEKEND_ACTIVITY = 0.1
+
+TIME_OF_DAY = np.array([f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in range(86400)], dtype=object)
+
+# --- INSIDER SCENARIOS ---
+# Each returns (seconds into the day, files, emails, usb) arrays for one insider's bad day.
+def _mass_download(rng):
+    """The File Explorer 'Download All Project Files at 3 AM' button: one event, 100-150 files."""
+    return np.array([3 * 3600 + rng.integers(0, 3600)]), rng.integers(100, 151, 1), np.zeros(1, int), np.zeros(1, int)
+
+def _email_burst(rng):
+    """The Email Client 'Send 60 Emails' button: 60 single e-mails logged in the same second."""
+    second = rng.integers(9 * 3600, 18 * 3600)
+    return np.full(60, second), np.zeros(60, int), np.ones(60, int), np.zeros(60, int)
+
+def _usb_exfiltration(rng):
+    """A late-evening run of 'Copy to USB' clicks."""
+    n = int(rng.integers(5, 11))
+    seconds = np.sort(22 * 3600 + rng.integers(0, 2 * 3600 - 1, n))
+    return seconds, rng.integers(1, 6, n), np.zeros(n, int), np.ones(n, int)
+
+SCENARIOS = {
+    'mass_download': _mass_download,
+    'email_burst': _email_burst,
+    'usb_exfiltration': _usb_exfiltration,
+}
+
+# --- GENERATOR ---
+def user_names(n_users):
+    width = len(str(max(n_users - 1, 0)))
+    return np.array([f"user{i:0{width}d}" for i in range(n_users)], dtype=object)
+
+def _profiles(rng, n_users, events_per_day):
+    return {
+        'start': np.clip(rng.normal(8.5, 1.0, n_users), 6, 11) * 3600,
+        'length': rng.uniform(8, 10, n_users) * 3600,
+        'rate': events_per_day * rng.lognormal(0, 0.4, n_users),
+        'email': rng.beta(6, 4, n_users),
+        'usb': rng.uniform(0.005, 0.04, n_users),
+    }
+
+def iter_activity(n_users=100, days=30, events_per_day=20, insider_fraction=0.02, seed=0, start=None,
+                  max_rows=None, chunk_rows=None, scenarios=tuple(SCENARIOS)):
+    """Yields activity frames in timestamp order with ACTIVITY_COLUMNS plus LABEL_COLUMNS.
+
+    Frames cover one day each, or `chunk_rows` rows when it is given.
+    Generation stops after `max_rows` rows. The same arguments always
+    produce the same rows.
+    """
+    rng = np.random.default_rng(seed)
+    start = start or date(2025, 1, 6)
+    names = user_names(n_users)
+    profile = _profiles(rng, n_users, events_per_day)
+    n_insiders = min(n_users, max(1, round(n_users * insider_fraction))) if insider_fraction and scenarios else 0
+    insiders = rng.choice(n_users, n_insiders, replace=False)
+    insider_days = rng.integers(days // 2, days, n_insiders) if n_insiders else np.array([], int)
+    scenario_names = np.array([scenarios[i % len(scenarios)] for i in range(n_insiders)], dtype=object)
+    categories = ['', *SCENARIOS]
+
+    next_id, emitted, pending = 1, 0, []
+    for day in range(days):
+        current = start + timedelta(days=day)
+        day_rng = np.random.default_rng([seed, day])
+        frame = _day_frame(day_rng, current, profile, names,
+                           [(insiders[i], scenario_names[i]) for i in np.flatnonzero(insider_days == day)],
+                           categories)
+        frame.insert(0, 'log_id', np.arange(next_id, next_id + len(frame), dtype=np.int64))
+        next_id += len(frame)
+        if max_rows is not None:
+            frame = frame.iloc[:max_rows - emitted]
+        emitted += len(frame)
+        if chunk_rows is None:
+            if len(frame):
+                yield frame
+        else:
+            pending.append(frame)
+            buffered = sum(len(f) for f in pending)
+            while buffered >= chunk_rows:
+                combined = pd.concat(pending, ignore_index=True)
+                yield combined.iloc[:chunk_rows].reset_index(drop=True)
+                pending = [combined.iloc[chunk_rows:]]
+                buffered -= chunk_rows
+        if max_rows is not None and emitted >= max_rows:
+            break
+    if chunk_rows is not None and pending and sum(len(f) for f in pending):
+        yield pd.concat(pending, ignore_index=True)
+
+def _day_frame(rng, current, profile, names, insider_events, categories):
+    weekend = current.weekday() >= 5
+    counts = rng.poisson(profile['rate'] * (WEEKEND_ACTIVITY if weekend else 1.0))
+    users = np.repeat(np.arange(len(names)), counts)
+    n = len(users)
+    seconds = (profile['start'][users] + rng.uniform(0, 1, n) * profile['length'][users]).astype(np.int64)
+    off_hours = rng.random(n) < OFF_HOURS_SHARE
+    seconds[off_hours] = rng.integers(0, 86400, int(off_hours.sum()))
+    seconds = np.clip(seconds, 0, 86399)
+
+    kind = rng.random(n)
+    is_email = kind < profile['email'][users]
+    is_usb = ~is_email & (rng.random(n) < profile['usb'][users])
+    files = np.where(is_email, 0, rng.integers(1, 6, n))
+    scenario = np.zeros(n, dtype=np.int8)
+    parts = [(users, seconds, files, is_email.astype(int), is_usb.astype(int), scenario)]
+    for user, name in insider_events:
+        s, f, e, u = SCENARIOS[name](rng)
+        parts.append((np.full(len(s), user), s, f, e, u, np.full(len(s), categories.index(name), dtype=np.int8)))
+
+    users, seconds, files, emails, usb, scenario = (np.concatenate(column) for column in zip(*parts))
+    order = np.argsort(seconds, kind='stable')
+    seconds = seconds[order]
+    scenario = scenario[order]
+    return pd.DataFrame({
+        'username': names[users[order]],
+        'timestamp': current.isoformat() + ' ' + TIME_OF_DAY[seconds],
+        'Login_Hour': (seconds // 3600).astype(np.uint8),
+        'Files_Accessed': files[order].astype(np.uint32),
+        'Emails_Sent': emails[order].astype(np.uint32),
+        'USB_Devices_Used': usb[order].astype(np.uint8),
+        'Is_Insider': (scenario > 0).astype(np.int8),
+        'Scenario': pd.Categorical.from_codes(scenario, categories),
+    })
+
+def generate_activity(n_users=100, days=30, events_per_day=20, insider_fraction=0.02, seed=0, **kwargs):
+    """Returns the whole iter_activity output as one frame."""
+    frames = list(iter_activity(n_users, days, events_per_day, insider_fraction, seed, **kwargs))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=ACTIVITY_COLUMNS + LABEL_COLUMNS)
+
+def days_for_rows(n_rows, n_users, events_per_day=20):
+    """Returns how many days of activity give at least `n_rows` rows for `n_users` users."""
+    per_day = n_users * events_per_day * (5 + 2 * WEEKEND_ACTIVITY) / 7
+    return max(1, int(np.ceil(n_rows / per_day * 1.2)))
+
+def activity_tuples(df):
+    """Converts a frame into (username, timestamp, ...) tuples for db_utils.INSERT_ACTIVITY_SQL."""
+    return list(zip(df['username'].astype(str).tolist(), df['timestamp'].tolist(), df['Login_Hour'].tolist(),
+                    df['Files_Accessed'].tolist(), df['Emails_Sent'].tolist(), df['USB_Devices_Used'].tolist()))
+
+# --- OUTPUT ---
+def write_activity(chunks, path):
+    """Writes chunks to a .csv (upload format), .parquet or SQLite .db file; returns the row count."""
+    total = 0
+    if path.endswith('.db'):
+        import baselines
+        from db_utils import INSERT_ACTIVITY_SQL, get_db
+
+        pool = get_db(path)
+        for chunk in chunks:
+            with pool.write() as conn:
+                conn.executemany(INSERT_ACTIVITY_SQL, activity_tuples(chunk))
+            total += len(chunk)
+        with pool.write() as conn:
+            baselines.rebuild_baselines(conn)
+        return total
+    if path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            writer = writer or pq.ParquetWriter(path, table.schema, compression='zstd')
+            writer.write_table(table.cast(writer.schema))
+            total += len(chunk)
+        if writer:
+            writer.close()
+        return total
+    for chunk in chunks:
+        chunk.rename(columns={'username': 'User_ID'}).to_csv(path, mode='a' if total else 'w', header=not total,
+                                                             index=False)
+        total += len(chunk)
+    return total
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--rows', type=int, help="Generate exactly this many rows (sets --days if needed).")
+    parser.add_argument('--events-per-day', type=float, default=20)
+    parser.add_argument('--insider-fraction', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='synthetic_activity.csv', help=".csv, .parquet or .db")
+    args = parser.parse_args()
+
+    days = max(args.days, days_for_rows(args.rows, args.users, args.events_per_day)) if args.rows else args.days
+    chunks = iter_activity(args.users, days, args.events_per_day, args.insider_fraction, args.seed,
+                           max_rows=args.rows)
+    print(f"Wrote {write_activity(chunks, args.output):,} rows to {args.output}")
@@ -0,0 +1,43 @@
+import sqlite3
+
+import pytest
+
+import archive
+import clear_db
+import db_pool
+import db_utils
+
+ROWS = [('alice', '2020-01-01 13:00:00', None, None, -1, 300),
+        ('bob', '2020-01-02 09:00:00', 9, 5, 2, 1),
+        ('carol', '2099-01-01 10:00:00', None, None, None, -5)]
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'archive.db')
+    db_utils.get_db(path)
+    with sqlite3.connect(path) as conn:
+        conn.executemany(db_utils.INSERT_ACTIVITY_SQL, ROWS)
+    yield path
+    db_pool.get_pool(path).close_all()
+
+def test_null_and_out_of_range_counters_are_archived_and_read_back(db, tmp_path):
+    archive_dir = str(tmp_path / 'archive')
+    assert archive.archive_activity(30, db, archive_dir)['rows'] == 2
+
+    df = archive.read_activity(db_name=db, archive_dir=archive_dir)
+
+    assert df['username'].tolist() == ['alice', 'bob', 'carol']
+    assert df['Login_Hour'].tolist() == [13, 9, 10]
+    assert df['Files_Accessed'].tolist() == [0, 5, 0]
+    assert df['Emails_Sent'].tolist() == [0, 2, 0]
+    assert df['USB_Devices_Used'].tolist() == [255, 1, 0]
+
+def test_clearing_the_database_removes_the_archive(db, tmp_path):
+    archive_dir = str(tmp_path / 'archive')
+    archive.archive_activity(30, db, archive_dir)
+    assert archive.archive_date_range(archive_dir) == ('2020-01-01', '2020-01-02')
+
+    clear_db.clear_all_data(db, archive_dir)
+
+    assert archive.archive_date_range(archive_dir) is None
+    assert archive.read_activity(db_name=db, archive_dir=archive_dir).empty
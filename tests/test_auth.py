@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+import auth
+import clear_db
+import db_pool
+import db_utils
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'auth.db')
+    db_utils.get_db(path)
+    yield path
+    db_pool.get_pool(path).close_all()
+
+def test_cleared_accounts_cannot_log_in_from_the_cache(db):
+    assert auth.add_user('alice', 'correct horse', 'Admin', db_name=db)
+    assert auth.verify_user('alice', 'correct horse', db_name=db) == 'Admin'
+
+    clear_db.clear_all_data(db, archive_dir=os.path.dirname(db))
+
+    assert auth.verify_user('alice', 'correct horse', db_name=db) is None
+
+def test_accounts_are_cached_per_database(tmp_path, db):
+    other = str(tmp_path / 'other.db')
+    db_utils.get_db(other)
+    assert auth.add_user('bob', 'first', 'User', db_name=db)
+    assert auth.add_user('bob', 'second', 'Admin', db_name=other)
+
+    assert auth.verify_user('bob', 'first', db_name=db) == 'User'
+    assert auth.verify_user('bob', 'second', db_name=other) == 'Admin'
+    assert auth.verify_user('bob', 'second', db_name=db) is None
+    db_pool.get_pool(other).close_all()
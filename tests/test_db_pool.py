@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+import db_pool
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = db_pool.ConnectionPool(str(tmp_path / 'pool.db'))
+    with pool.write() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    yield pool
+    pool.close_all()
+
+def values(pool):
+    with pool.read() as conn:
+        return [x for x, in conn.execute("SELECT x FROM t ORDER BY x")]
+
+def test_nested_write_commits_with_the_outer_transaction(pool):
+    with pool.write() as outer:
+        outer.execute("INSERT INTO t VALUES (1)")
+        with pool.write() as inner:
+            assert inner is outer
+            inner.execute("INSERT INTO t VALUES (2)")
+        assert outer.in_transaction
+    assert values(pool) == [1, 2]
+
+def test_failed_nested_write_only_undoes_its_own_changes(pool):
+    with pool.write() as outer:
+        outer.execute("INSERT INTO t VALUES (1)")
+        with pytest.raises(ValueError):
+            with pool.write() as inner:
+                inner.execute("INSERT INTO t VALUES (2)")
+                raise ValueError()
+        outer.execute("INSERT INTO t VALUES (3)")
+    assert values(pool) == [1, 3]
+
+def test_failed_outer_write_undoes_committed_nested_writes(pool):
+    with pytest.raises(ValueError):
+        with pool.write() as outer:
+            with pool.write() as inner:
+                inner.execute("INSERT INTO t VALUES (2)")
+            raise ValueError()
+    assert values(pool) == []
+    with pool.write() as conn:
+        conn.execute("INSERT INTO t VALUES (4)")
+    assert values(pool) == [4]
+
+def test_short_lived_threads_reuse_pooled_connections(pool):
+    def work():
+        with pool.read() as conn:
+            conn.execute("SELECT COUNT(*) FROM t").fetchone()
+
+    for _ in range(50):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+    assert pool._idle.qsize() == 1
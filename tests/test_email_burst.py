@@ -0,0 +1,54 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import alerting
+import db_pool
+import db_utils
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ['1_Threat_Dashboard.py', '2_Sign_Up.py', '3_Email_Client.py', '4_File_Explorer.py', '5_Diagnostics.py']
+
+@pytest.fixture
+def app_db(tmp_path, monkeypatch):
+    """Lays the app out as deployed, with pages/, around a fresh insider_threat.db."""
+    for name in ('Login.py', 'Insider_Threat.png'):
+        shutil.copy(os.path.join(ROOT, name), tmp_path)
+    (tmp_path / 'pages').mkdir()
+    for page in PAGES:
+        shutil.copy(os.path.join(ROOT, page), tmp_path / 'pages')
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path / db_pool.DB_NAME
+    # The pool, schema check and alert worker are keyed by the relative DB_NAME.
+    worker = alerting._workers.pop(db_pool.DB_NAME, None)
+    if worker:
+        worker.close()
+    db_utils._migrated.discard(db_pool.DB_NAME)
+    pool = db_pool._pools.pop(db_pool.DB_NAME, None)
+    if pool:
+        pool.close_all()
+
+def test_email_burst_button_raises_a_high_email_alert(app_db):
+    at = AppTest.from_file(str(app_db.parent / 'Login.py'), default_timeout=60)
+    at.run()
+    at.session_state['logged_in'] = True
+    at.session_state['username'] = 'burst_user'
+    at.session_state['role'] = 'User'
+    at.switch_page('pages/3_Email_Client.py')
+    at.run()
+    [button] = [b for b in at.button if b.label.startswith("Send ") and "Emails" in b.label]
+    button.click().run()
+    assert not at.exception
+    # Closing the worker evaluates everything it still has queued.
+    alerting.get_alert_worker(db_pool.DB_NAME).close()
+
+    with sqlite3.connect(app_db) as conn:
+        logged = conn.execute("SELECT COUNT(*), SUM(Emails_Sent) FROM activity_logs").fetchone()
+        alerts = conn.execute("SELECT username, reasons FROM alerts WHERE engine = 'rules'").fetchall()
+    assert logged[1] > 50
+    assert {username for username, _ in alerts} == {'burst_user'}
+    # Run at night, the rows are also flagged as unusual logins; the burst must add High Emails.
+    assert any('High Emails' in reasons for _, reasons in alerts)
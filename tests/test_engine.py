@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import baselines
+import db_pool
+import engine
+import ml_engine
+import synthetic_data
+from rule_engine import DEFAULT_THRESHOLDS
+
+CHUNK_ROWS = 1_000
+
+@pytest.fixture(scope='module')
+def activity():
+    df = synthetic_data.generate_activity(40, 8, insider_fraction=0.1)
+    return df.drop(columns=synthetic_data.LABEL_COLUMNS)
+
+@pytest.fixture(scope='module')
+def model(activity):
+    return ml_engine.fit_model(activity, 0.05, n_workers=1)
+
+def original_rules(df, thresholds):
+    """The dashboard's rule scoring before engine.py, kept as the reference."""
+    df = df.copy()
+    df['Risk_Score'] = 0.0
+    df['Reason'] = ''
+    score_increment = 1.0 / len(thresholds)
+    rule1 = (df['Login_Hour'] >= thresholds['late_hour']) | (df['Login_Hour'] <= thresholds['early_hour'])
+    df.loc[rule1, 'Risk_Score'] += score_increment; df.loc[rule1, 'Reason'] += 'Unusual Login; '
+    rule2 = df['Files_Accessed'] > thresholds['files_accessed']
+    df.loc[rule2, 'Risk_Score'] += score_increment; df.loc[rule2, 'Reason'] += 'Excessive Files; '
+    rule3 = df['Emails_Sent'] > thresholds['emails_sent']
+    df.loc[rule3, 'Risk_Score'] += score_increment; df.loc[rule3, 'Reason'] += 'High Emails; '
+    rule4 = df['USB_Devices_Used'] >= thresholds['usb_devices']
+    df.loc[rule4, 'Risk_Score'] += score_increment; df.loc[rule4, 'Reason'] += 'Multiple USBs; '
+    suspicious_df = df[df['Risk_Score'] > 0].copy()
+    suspicious_df['Reason'] = suspicious_df['Reason'].str.strip().str.rstrip(';')
+    return suspicious_df
+
+def chunks_of(df):
+    return (df.iloc[i:i + CHUNK_ROWS] for i in range(0, len(df), CHUNK_ROWS))
+
+# --- DETECTORS ---
+@pytest.mark.parametrize('thresholds', [DEFAULT_THRESHOLDS, {**DEFAULT_THRESHOLDS, 'files_accessed': 20, 'usb_devices': 1}])
+def test_rules_match_the_original_scoring_row_for_row(activity, thresholds):
+    expected = original_rules(activity, thresholds)
+    found = engine.detect(activity, [engine.RuleDetector(thresholds)]).sort_index()
+
+    assert len(expected) > 0
+    assert found.index.tolist() == expected.index.tolist()
+    np.testing.assert_allclose(found['Risk_Score'].to_numpy(dtype=float), expected['Risk_Score'].to_numpy())
+    assert found['Reason'].tolist() == expected['Reason'].tolist()
+
+def test_isolation_forest_flags_exactly_the_rows_the_model_predicts_as_outliers(activity, model):
+    scored = engine.score_batch(activity, [engine.IsolationForestDetector(model)])
+    outliers = np.flatnonzero(model.predict(activity[ml_engine.FEATURES].to_numpy()) == -1)
+
+    np.testing.assert_array_equal(scored.positions, outliers)
+    assert ((scored.risk >= 0) & (scored.risk <= 1)).all()
+
+def test_baseline_detector_matches_score_event(activity, tmp_path):
+    db_path = str(tmp_path / 'baselines.db')
+    synthetic_data.write_activity([activity], db_path)
+    pool = db_pool.get_pool(db_path)
+    try:
+        with pool.read() as conn:
+            stats = baselines.get_baselines(conn)
+            scored = engine.score_batch(activity, [engine.BaselineDetector(*stats, z_threshold=2.0)])
+            found = dict(zip(scored.positions, scored.reasons()))
+            sample = np.linspace(0, len(activity) - 1, 300, dtype=int)
+            expected = {}
+            for position in sample:
+                row = activity.iloc[position]
+                event = {column: int(row[column]) for column in ml_engine.FEATURES}
+                result = baselines.score_event(conn, row['username'], event, z_threshold=2.0)
+                if result and result['Reason']:
+                    expected[position] = result['Reason']
+    finally:
+        pool.close_all()
+
+    assert expected
+    assert {p: found[p] for p in sample if p in found} == expected
+
+# --- COMBINING ---
+def test_combine_with_one_detector_keeps_its_scores(activity):
+    rules = engine.score_batch(activity, [engine.RuleDetector()])
+    single = engine.combine([rules])
+
+    np.testing.assert_array_equal(single.positions, rules.positions)
+    np.testing.assert_allclose(single.risk, rules.risk)
+
+def test_combine_max_takes_the_highest_score_per_row(activity, model):
+    rules = engine.score_batch(activity, [engine.RuleDetector()])
+    ml = engine.score_batch(activity, [engine.IsolationForestDetector(model)])
+    both = engine.combine([rules, ml], 'max')
+
+    risk = pd.Series(0.0, index=np.union1d(rules.positions, ml.positions))
+    for result in (rules, ml):
+        risk.loc[result.positions] = np.maximum(risk.loc[result.positions].to_numpy(), result.risk)
+    np.testing.assert_array_equal(both.positions, risk.index.to_numpy())
+    np.testing.assert_allclose(both.risk, risk.to_numpy())
+
+def test_combine_min_detectors_keeps_rows_every_detector_flagged(activity, model):
+    rules = engine.score_batch(activity, [engine.RuleDetector()])
+    ml = engine.score_batch(activity, [engine.IsolationForestDetector(model)])
+    agreed = engine.combine([rules, ml], 'mean', min_detectors=2)
+
+    np.testing.assert_array_equal(agreed.positions, np.intersect1d(rules.positions, ml.positions))
+    assert (agreed.columns['Detectors'] == 'rules, ml').all()
+
+# --- STREAMING ---
+@pytest.mark.parametrize('make', [
+    lambda model: [engine.RuleDetector()],
+    # A stream shares one score scale across chunks; give the batch the same one.
+    lambda model: [engine.IsolationForestDetector(model, (-0.5, 0.5))],
+    lambda model: [engine.RuleDetector(), engine.IsolationForestDetector(model, (-0.5, 0.5))],
+], ids=['rules', 'ml', 'rules+ml'])
+def test_streaming_matches_batch_scoring(activity, model, make):
+    results = list(engine.score_stream(chunks_of(activity), make(model)))
+    streamed = pd.concat([part for _, part in results]).sort_values(by='Risk_Score', ascending=False, kind='stable')
+
+    assert sum(rows for rows, _ in results) == len(activity)
+    # Chunks with no alerts concatenate to object columns, so only values are compared.
+    pd.testing.assert_frame_equal(engine.detect(activity, make(model)), streamed, check_dtype=False)
@@ -0,0 +1,33 @@
+import pandas as pd
+
+import insider_threat
+
+QUIET_THRESHOLDS = ['--late-hour', '23', '--early-hour', '0', '--files-accessed', '1000', '--emails-sent', '1000',
+                    '--usb-devices', '100']
+
+def write_csv(path, rows):
+    pd.DataFrame(rows, columns=['User_ID', 'Login_Hour', 'Files_Accessed', 'Emails_Sent',
+                                'USB_Devices_Used']).to_csv(path, index=False)
+
+def test_score_writes_an_empty_alerts_file_when_nothing_is_flagged(tmp_path, capsys):
+    source = tmp_path / 'clean.csv'
+    write_csv(source, [('U1', 9, 10, 5, 0), ('U2', 14, 20, 10, 1)])
+    output = tmp_path / 'alerts.parquet'
+
+    insider_threat.main(['score', str(source), '--engine', 'rules', *QUIET_THRESHOLDS, '--output', str(output)])
+
+    alerts = pd.read_parquet(output)
+    assert alerts.empty
+    assert 'Risk_Score' in alerts.columns
+    assert "0 alerts written" in capsys.readouterr().out
+
+def test_score_writes_flagged_rows_highest_risk_first(tmp_path):
+    source = tmp_path / 'mixed.csv'
+    write_csv(source, [('U1', 9, 10, 5, 0), ('U2', 14, 1500, 10, 1), ('U3', 15, 2000, 2000, 200)])
+    output = tmp_path / 'alerts.csv'
+
+    insider_threat.main(['score', str(source), '--engine', 'rules', *QUIET_THRESHOLDS, '--output', str(output)])
+
+    alerts = pd.read_csv(output)
+    assert alerts['User_ID'].tolist() == ['U3', 'U2']
+    assert alerts['Risk_Score'].is_monotonic_decreasing
@@ -0,0 +1,27 @@
+from results_cache import ResultsCache
+
+def cached(cache, *keys):
+    for key in keys:
+        cache.get_or_compute(key, lambda: key)
+    return cache
+
+def test_retain_version_keeps_other_views_of_the_current_data():
+    live = ((3, 100), 'rules')
+    history = ((3, 100, '2025-01-01', '2025-02-01'), 'history')
+    cache = cached(ResultsCache(), live, history)
+
+    cache.retain_version((3, 100, '2025-03-01', '2025-04-01'))
+    cache.retain_version((3, 100))
+
+    assert cache.stats()['entries'] == 2
+    assert cache.get_or_compute(history, lambda: None) == history
+
+def test_retain_version_drops_entries_for_older_data():
+    stale = [((3, 99), 'rules'), ((2, 500), 'rules'), ((3, 99, '2025-01-01', '2025-02-01'), 'history')]
+    current = ((3, 100), 'rules')
+    cache = cached(ResultsCache(), *stale, current)
+
+    cache.retain_version((3, 100, '2025-01-01', '2025-02-01'))
+
+    assert cache.stats()['entries'] == 1
+    assert cache.get_or_compute(current, lambda: None) == current
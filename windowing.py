@@ -0,0 +1,97 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+
+# Counters summed over each user's trailing window. Login_Hour stays per event.
+WINDOW_COLUMNS = ['Files_Accessed', 'Emails_Sent', 'USB_Devices_Used']
+WINDOWS = {'1h': 3600, '24h': 86400}
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def _epoch_seconds(timestamps):
+    return pd.to_datetime(timestamps, format=TIMESTAMP_FORMAT).to_numpy().astype('datetime64[s]').astype(np.int64)
+
+def build_window_features(df, windows=WINDOWS):
+    """Adds <column>_<window> trailing sums per user to a copy of `df`.
+
+    Each window covers (t - length, t] for an event at time t, like pandas'
+    time-based rolling. Rows are sorted once by (user, time); each window is
+    then a cumulative-sum difference with its left edge found by
+    searchsorted, so the cost is O(n log n) for any number of windows.
+    """
+    out = df.copy()
+    if df.empty:
+        for label in windows:
+            for column in WINDOW_COLUMNS:
+                out[f"{column}_{label}"] = pd.Series(dtype='int64')
+        return out
+
+    user_codes = pd.factorize(df['username'])[0].astype(np.int64)
+    seconds = _epoch_seconds(df['timestamp'])
+    # Shift so that t - length never borrows from the user bits below.
+    seconds = seconds - seconds.min() + max(windows.values())
+    # One sortable key per row: user in the high bits, seconds in the low 34 bits.
+    keys = (user_codes << 34) | seconds
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    for label, length in windows.items():
+        left = np.searchsorted(sorted_keys, sorted_keys - length, side='right')
+        for column in WINDOW_COLUMNS:
+            values = df[column].fillna(0).to_numpy(dtype=np.int64)[order]
+            cumulative = np.concatenate(([0], np.cumsum(values)))
+            sums = np.empty(len(df), dtype=np.int64)
+            sums[order] = cumulative[np.arange(1, len(df) + 1)] - cumulative[left]
+            out[f"{column}_{label}"] = sums
+    return out
+
+def windowed_view(features_df, window):
+    """Swaps the per-event counters for their `window` sums so detectors score the burst."""
+    view = features_df.copy()
+    for column in WINDOW_COLUMNS:
+        view[column] = features_df[f"{column}_{window}"]
+    return view
+
+class WindowAggregator:
+    """Maintains window features for an append-only activity frame.
+
+    `update` receives the full frame from IncrementalActivityLoader and only
+    computes features for rows past its log_id watermark, using a tail of
+    recent events (the longest window) as context. Rows that arrive out of
+    order by more than the longest window only see the retained tail.
+    """
+
+    def __init__(self, windows=WINDOWS):
+        self.windows = windows
+        self.horizon = max(windows.values())
+        self.version = None
+        self.watermark = 0
+        self._features = None
+        self._tail = None
+        self._lock = threading.Lock()
+
+    def update(self, df, data_version=None):
+        """Returns window features aligned with `df` (ordered by log_id)."""
+        with self._lock, span('features.window'):
+            epoch = data_version[0] if data_version else None
+            last_id = int(df['log_id'].iloc[-1]) if len(df) else 0
+            if (self._features is None or epoch != self.version or last_id < self.watermark
+                    or len(df) < len(self._features)):
+                self._features = build_window_features(df, self.windows)
+                self._tail = self._recent(self._features)
+            elif last_id > self.watermark:
+                new_rows = df.iloc[len(self._features):]
+                combined = build_window_features(pd.concat([self._tail[df.columns], new_rows], ignore_index=True),
+                                                 self.windows)
+                new_features = combined.iloc[len(self._tail):]
+                self._features = pd.concat([self._features, new_features], ignore_index=True)
+                self._tail = self._recent(pd.concat([self._tail, new_features], ignore_index=True))
+            self.version, self.watermark = epoch, last_id
+            return self._features.copy(deep=False)
+
+    def _recent(self, features):
+        if features.empty:
+            return features
+        seconds = _epoch_seconds(features['timestamp'])
+        return features[seconds > seconds.max() - self.horizon].reset_index(drop=True)